@@ -12,7 +12,7 @@ gi.require_version('Gst', '1.0')
 from hailo_apps.hailo_app_python.core.gstreamer.gstreamer_app import app_callback_class, GStreamerApp, dummy_callback
 from hailo_apps.hailo_app_python.core.gstreamer.gstreamer_helper_pipelines import DISPLAY_PIPELINE, INFERENCE_PIPELINE, INFERENCE_PIPELINE_WRAPPER, SOURCE_PIPELINE, USER_CALLBACK_PIPELINE
 from hailo_apps.hailo_app_python.core.common.core import get_default_parser, get_resource_path
-from hailo_apps.hailo_app_python.core.common.installation_utils import detect_hailo_arch
+from hailo_apps.hailo_app_python.core.common.installation_utils import detect_hailo_arch_cached
 from hailo_apps.hailo_app_python.core.common.defines import DEPTH_POSTPROCESS_FUNCTION, RESOURCES_SO_DIR_NAME, DEPTH_POSTPROCESS_SO_FILENAME, RESOURCES_MODELS_DIR_NAME, DEPTH_PIPELINE, DEPTH_APP_TITLE
 # endregion imports
 
@@ -28,7 +28,7 @@ class GStreamerDepthApp(GStreamerApp):
 
         # Determine the architecture if not specified
         if self.options_menu.arch is None:
-            detected_arch = detect_hailo_arch()
+            detected_arch = detect_hailo_arch_cached()
             if detected_arch is None:
                 raise ValueError('Could not auto-detect Hailo architecture. Please specify --arch manually.')
             self.arch = detected_arch
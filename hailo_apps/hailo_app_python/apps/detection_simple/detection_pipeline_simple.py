@@ -7,7 +7,7 @@ import threading
 from gi.repository import Gst, GLib
 
 # Local application-specific imports
-from hailo_apps.hailo_app_python.core.common.installation_utils import detect_hailo_arch
+from hailo_apps.hailo_app_python.core.common.installation_utils import detect_hailo_arch_cached
 from hailo_apps.hailo_app_python.core.common.core import get_default_parser, get_resource_path
 from hailo_apps.hailo_app_python.core.common.defines import RESOURCES_VIDEOS_DIR_NAME, SIMPLE_DETECTION_VIDEO_NAME, SIMPLE_DETECTION_APP_TITLE, SIMPLE_DETECTION_PIPELINE, RESOURCES_MODELS_DIR_NAME, RESOURCES_SO_DIR_NAME, SIMPLE_DETECTION_POSTPROCESS_SO_FILENAME, SIMPLE_DETECTION_POSTPROCESS_FUNCTION
 from hailo_apps.hailo_app_python.core.gstreamer.gstreamer_helper_pipelines import SOURCE_PIPELINE, INFERENCE_PIPELINE, CPU_INFERENCE_PIPELINE, USER_CALLBACK_PIPELINE, DISPLAY_PIPELINE
@@ -58,7 +58,7 @@ class GStreamerDetectionApp(GStreamerApp):
             )
         # Determine the architecture if not specified
         if self.options_menu.arch is None:
-            detected_arch = detect_hailo_arch()
+            detected_arch = detect_hailo_arch_cached()
             # if detected_arch is None:
             #     raise ValueError("Could not auto-detect Hailo architecture as No Hailo hardware is available. Please specify --arch manually.")
             self.arch = detected_arch
@@ -140,7 +140,8 @@ class GStreamerDetectionApp(GStreamerApp):
                 input_width=self.video_width,
                 input_height=self.video_height,
                 confidence_threshold=0.3,  # Using nms_score_threshold value
-                nms_threshold=0.45  # Using nms_iou_threshold value
+                nms_threshold=0.45,  # Using nms_iou_threshold value
+                motion_gate=self.options_menu.motion_gate
             )
         else:
             detection_pipeline = INFERENCE_PIPELINE(
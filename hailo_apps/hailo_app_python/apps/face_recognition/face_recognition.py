@@ -1,7 +1,5 @@
 # region imports
 # Standard library imports
-import datetime
-from datetime import datetime
 import threading
 from pathlib import Path
 
@@ -15,13 +13,14 @@ import hailo
 from hailo_apps.hailo_app_python.core.gstreamer.gstreamer_app import app_callback_class
 from hailo_apps.hailo_app_python.apps.face_recognition.face_recognition_pipeline import GStreamerFaceRecognitionApp
 from hailo_apps.hailo_app_python.core.common.telegram_handler import TelegramHandler
+from hailo_apps.hailo_app_python.core.common.notification_dispatcher import NotificationDispatcher
+from hailo_apps.hailo_app_python.core.common.detection_log import DetectionLog
 from hailo_apps.hailo_app_python.core.common.defines import HAILO_LOGO_PHOTO_NAME
 from hailo_apps.hailo_app_python.apps.face_recognition.face_ui_elements import UIElements
 from hailo_apps.hailo_app_python.apps.face_recognition.face_ui_callbacks import UICallbacks
 # endregion
 
 # region Constants
-MAX_UI_TEXT_MESSAGES = 10  # Maximum number of UI text messages to store
 TELEGRAM_ENABLED = False  # Enable Telegram notifications
 TELEGRAM_TOKEN = ''  # Telegram bot token
 TELEGRAM_CHAT_ID = ''  # Telegram chat ID
@@ -32,7 +31,7 @@ class user_callbacks_class(app_callback_class):
         super().__init__()
         self.frame = None
         self.latest_track_id = -1
-        self.ui_text_message = []  # Store detected persons
+        self.detection_log = DetectionLog()  # Recognition events, formatted by the UI when it reads them
 
         # Telegram settings as instance attributes
         self.telegram_enabled = TELEGRAM_ENABLED
@@ -41,20 +40,22 @@ class user_callbacks_class(app_callback_class):
 
         # Initialize TelegramHandler if Telegram is enabled
         self.telegram_handler = None
+        self.notification_dispatcher = None  # Sends the notifications from its own thread
         if self.telegram_enabled and self.telegram_token and self.telegram_chat_id:
             self.telegram_handler = TelegramHandler(self.telegram_token, self.telegram_chat_id)
+            self.notification_dispatcher = NotificationDispatcher(self.telegram_handler)
 
     # region Core application functions that are part of the main program logic and are called directly during pipeline execution, but are not GStreamer callback handlers themselves
     def send_notification(self, name, global_id, confidence, frame):
         """
-        Check if Telegram is enabled and send a notification via the TelegramHandler.
+        Check if Telegram is enabled and queue a notification on the NotificationDispatcher (returns at once).
         """
-        if not self.telegram_enabled or not self.telegram_handler:
+        if not self.telegram_enabled or not self.notification_dispatcher:
             return
 
-        # Check if the notification should be sent
+        # Check if the notification should be sent (per-identity rate limit, before the frame is queued)
         if self.telegram_handler.should_send_notification(global_id):
-            self.telegram_handler.send_notification(name, global_id, confidence, frame)
+            self.notification_dispatcher.submit(name, global_id, confidence, frame)
     # endregion
 
 def app_callback(pad, info, user_data):
@@ -72,19 +73,12 @@ def app_callback(pad, info, user_data):
             track = detection.get_objects_typed(hailo.HAILO_UNIQUE_ID)
             if len(track) > 0:
                 track_id = track[0].get_id()
-            string_to_print = f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}]: Face detection ID: {track_id} (Confidence: {detection_confidence:.1f}), '
             classifications = detection.get_objects_typed(hailo.HAILO_CLASSIFICATION)
             if len(classifications) > 0:
                 for classification in classifications:
-                    if classification.get_label() == 'Unknown':
-                        string_to_print += 'Unknown person detected'
-                    else:
-                        string_to_print += f'Person recognition: {classification.get_label()} (Confidence: {classification.get_confidence():.1f})'
-                    if track_id > user_data.latest_track_id:
+                    if track_id > user_data.latest_track_id:  # Log only the first appearance of a track
                         user_data.latest_track_id = track_id
-                        if len(user_data.ui_text_message) >= MAX_UI_TEXT_MESSAGES:
-                            user_data.ui_text_message.pop(0)  # Remove the oldest entry to maintain size
-                        user_data.ui_text_message.append(string_to_print)
+                        user_data.detection_log.add(track_id, classification.get_label(), classification.get_confidence(), detection_confidence)
     return Gst.PadProbeReturn.OK
 
 def main():  
@@ -100,8 +94,10 @@ def main():
         pipeline.run()
     else:  # must be then run in GUI interface
         ui_elements = UIElements()  # Instantiate the UIElements and UICallbacks classes
-        ui_interface = ui_elements.create_interface(UICallbacks(pipeline), pipeline)  # Create the Gradio interface
-        ui_thread = threading.Thread(target=lambda: ui_interface.launch(allowed_paths=[Path(Path(__file__).parent, HAILO_LOGO_PHOTO_NAME)]), daemon=False)  # Launch the stream UI in a separate thread from the GStreamer pipeline
+        ui_callbacks = UICallbacks(pipeline)
+        ui_interface = ui_elements.create_interface(ui_callbacks, pipeline)  # Create the Gradio interface
+        ui_thread = threading.Thread(target=lambda: ui_interface.launch(allowed_paths=[Path(Path(__file__).parent, HAILO_LOGO_PHOTO_NAME)],
+                                                                        app_kwargs={'routes': ui_callbacks.stream_routes()}), daemon=False)  # Launch the stream UI in a separate thread from the GStreamer pipeline
         ui_thread.start()
         ui_thread.join()  # otherwise not working
 
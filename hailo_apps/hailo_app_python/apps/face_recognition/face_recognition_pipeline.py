@@ -10,13 +10,15 @@ import signal
 import uuid
 import setproctitle
 import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # Third-party imports
 import gi
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst
 import numpy as np
-from PIL import Image
+from PIL import Image, ImageOps
 import matplotlib
 matplotlib.use('TkAgg')  # Use TkAgg backend for interactive display
 import matplotlib.pyplot as plt
@@ -25,8 +27,12 @@ import matplotlib.pyplot as plt
 import hailo
 from hailo_apps.hailo_app_python.core.common.db_handler import DatabaseHandler, Record
 from hailo_apps.hailo_app_python.core.common.db_visualizer import DatabaseVisualizer
-from hailo_apps.hailo_app_python.core.common.core import FIFODropQueue, get_default_parser, detect_hailo_arch, get_resource_path
+from hailo_apps.hailo_app_python.core.common.core import LatestFrameSlot, get_default_parser, detect_hailo_arch_cached, get_resource_path
 from hailo_apps.hailo_app_python.core.common.buffer_utils import get_numpy_from_buffer_efficient, get_caps_from_pad
+from hailo_apps.hailo_app_python.core.common.db_writer import DatabaseWriter
+from hailo_apps.hailo_app_python.core.common.sample_writer import SampleWriter, SAMPLE_FORMATS, SAMPLE_FORMAT_DEFAULT, SAMPLE_QUALITY_DEFAULT, SAMPLE_WRITER_THREADS_DEFAULT
+from hailo_apps.hailo_app_python.core.common.sample_selection import deduplicate, farthest_point_selection
+from hailo_apps.hailo_app_python.core.common.track_identity_cache import TrackIdentityCache
 from hailo_apps.hailo_app_python.core.gstreamer.gstreamer_app import GStreamerApp
 from hailo_apps.hailo_app_python.core.common.defines import (
     RESOURCES_SO_DIR_NAME, 
@@ -49,11 +55,56 @@ from hailo_apps.hailo_app_python.core.common.defines import (
     FACE_RECON_DATABASE_DIR_NAME,
     TRACKER_UPDATE_POSTPROCESS_SO_FILENAME,
     FACE_RECON_LOCAL_SAMPLES_DIR_NAME,
-    BASIC_PIPELINES_VIDEO_EXAMPLE_NAME
+    BASIC_PIPELINES_VIDEO_EXAMPLE_NAME,
+    FACE_RECON_DEDUP_SIMILARITY_DEFAULT,
+    FACE_RECON_MAX_SAMPLES_DEFAULT,
+    FACE_RECON_TRACK_CACHE_MAX_TRACKS,
+    FACE_RECON_TRACK_CACHE_TTL,
+    FACE_RECON_TRACK_DRIFT_SIMILARITY_DEFAULT,
+    FACE_RECON_TRACK_CONFIDENCE_HALF_LIFE_DEFAULT,
+    UI_STREAM_FORMATS,
+    UI_STREAM_FORMAT_RAW,
+    UI_STREAM_JPEG_QUALITY_DEFAULT
 )
 from hailo_apps.hailo_app_python.core.gstreamer.gstreamer_helper_pipelines import QUEUE, SOURCE_PIPELINE, INFERENCE_PIPELINE, INFERENCE_PIPELINE_WRAPPER, TRACKER_PIPELINE, USER_CALLBACK_PIPELINE, DISPLAY_PIPELINE, CROPPER_PIPELINE, UI_APPSINK_PIPELINE
 # endregion
 
+RECOGNITION_LATENCY_REPORT_INTERVAL = 300  # Frames with faces between recognition latency reports
+TRAIN_DECODE_THREADS = min(8, os.cpu_count() or 4)  # Training images decoded in parallel
+TRAIN_DECODE_AHEAD = 16  # Decoded training images waiting to be pushed to the pipeline
+TRAIN_SOURCE_QUEUE_FRAMES = 4  # Frames buffered in the training appsrc before push-buffer blocks
+TRAIN_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+TRAIN_STALL_TIMEOUT = 30  # Seconds without a training frame pushed or processed before the training gives up
+TRAIN_BUS_POLL_INTERVAL = 1  # Seconds between two checks of the training progress
+NOTIFICATION_CLOSE_TIMEOUT = 10  # Seconds the shutdown waits for the queued notifications to be sent
+
+class RecognitionLatencyStats:
+    """Per-frame recognition (database search) latency, grouped by the number of faces resolved in the frame."""
+    def __init__(self, report_interval=RECOGNITION_LATENCY_REPORT_INTERVAL):
+        self.lock = threading.Lock()
+        self.report_interval = report_interval
+        self.frames = 0
+        self.by_face_count = {}  # face count -> [total seconds, frames]
+
+    def add(self, face_count, seconds):
+        with self.lock:
+            totals = self.by_face_count.setdefault(face_count, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+            self.frames += 1
+            report = self.report_interval and self.frames % self.report_interval == 0
+        if report:
+            self.report()
+
+    def report(self):
+        with self.lock:
+            stats = sorted((count, total / frames, frames) for count, (total, frames) in self.by_face_count.items())
+        if not stats:
+            return
+        print("Recognition latency per frame:")
+        for face_count, seconds, frames in stats:
+            print(f"  {face_count:>3} faces: {seconds * 1000:.3f} ms/frame ({seconds * 1000 / face_count:.3f} ms/face, {frames} frames)")
+
 class GStreamerFaceRecognitionApp(GStreamerApp):
     def __init__(self, app_callback, user_data, parser=None):
         setproctitle.setproctitle("Hailo Face Recognition App")
@@ -62,6 +113,15 @@ class GStreamerFaceRecognitionApp(GStreamerApp):
         parser.add_argument("--mode", default='run', help="The mode of the application: run, train, delete")
         parser.add_argument("--visualize", action="store_true", help="In run mode & CLI only, whether display the live visualization of the embeddings")
         parser.add_argument("--ui", action="store_true", help="Whether display the Gradio UI or just CLI")
+        parser.add_argument("--sample-format", choices=list(SAMPLE_FORMATS), default=SAMPLE_FORMAT_DEFAULT, help=f"In train mode, the format of the saved face samples (default: {SAMPLE_FORMAT_DEFAULT})")
+        parser.add_argument("--sample-quality", type=int, default=SAMPLE_QUALITY_DEFAULT, help=f"In train mode, the encoding quality of the saved face samples (0-100, default: {SAMPLE_QUALITY_DEFAULT})")
+        parser.add_argument("--sample-max-size", type=int, default=0, help="In train mode, downscale the saved face samples to this longest side in pixels (default: 0, full size)")
+        parser.add_argument("--sample-writer-threads", type=int, default=SAMPLE_WRITER_THREADS_DEFAULT, help=f"In train mode, the threads encoding the face samples (default: {SAMPLE_WRITER_THREADS_DEFAULT})")
+        parser.add_argument("--ui-stream-format", choices=UI_STREAM_FORMATS, default=UI_STREAM_FORMAT_RAW,
+                            help="With --ui, how the video is streamed: 'raw' (RGB frames encoded by the WebRTC component) or 'jpeg' (encoded in the pipeline, shown as is)")
+        parser.add_argument("--ui-stream-width", type=int, default=None, help="With --ui, the width of the streamed video (default: the video width)")
+        parser.add_argument("--ui-stream-height", type=int, default=None, help="With --ui, the height of the streamed video (default: the video height)")
+        parser.add_argument("--ui-stream-quality", type=int, default=UI_STREAM_JPEG_QUALITY_DEFAULT, help=f"With --ui-stream-format jpeg, the JPEG quality (0-100, default: {UI_STREAM_JPEG_QUALITY_DEFAULT})")
         super().__init__(parser, user_data)
 
         self.embedding_queue = multiprocessing.Queue()  # Create a queue for sending embeddings to the visualization process
@@ -69,12 +129,15 @@ class GStreamerFaceRecognitionApp(GStreamerApp):
         # Criteria for when a candidate frame is good enough to try recognize a person from it (e.g., skip the first few frames since in them person only entered the frame and usually is blurry)
         self.json_file = open(get_resource_path(pipeline_name=None, resource_type=RESOURCES_JSON_DIR_NAME, model=FACE_ALGO_PARAMS_JSON_NAME), "r+")
         self.algo_params = json.load(self.json_file)
-        # 1. How many frames to skip between detection attempts: avoid porocessing first frames since usually they are blurry since person just entered the frame, see self.track_id_frame_count
+        # 1. How many frames to skip between detection attempts: avoid porocessing first frames since usually they are blurry since person just entered the frame, see self.track_identities
         self.skip_frames = self.algo_params['skip_frames']
         # 2. Confidence threshold for face classification: if the confidence is below this value, the face will not be recognized
         self.lance_db_vector_search_classificaiton_confidence_threshold = self.algo_params['lance_db_vector_search_classificaiton_confidence_threshold']
         # Both for face detection & recognition networks (not tunable from the UI)
         self.batch_size = self.algo_params['batch_size']
+        # 3. Enrollment (train mode): near-duplicate samples of a person are dropped, and at most max_samples_per_person diverse samples are kept
+        self.dedup_similarity = self.algo_params.get('enrollment_dedup_similarity', FACE_RECON_DEDUP_SIMILARITY_DEFAULT)
+        self.max_samples_per_person = self.algo_params.get('enrollment_max_samples_per_person', FACE_RECON_MAX_SAMPLES_DEFAULT)
 
         # Initialize the database and table
         self.db_handler = DatabaseHandler(db_name='persons.db', 
@@ -83,10 +146,11 @@ class GStreamerFaceRecognitionApp(GStreamerApp):
                                           threshold=self.lance_db_vector_search_classificaiton_confidence_threshold,
                                           database_dir=get_resource_path(pipeline_name=None, resource_type=FACE_RECON_DIR_NAME, model=FACE_RECON_DATABASE_DIR_NAME),
                                           samples_dir = get_resource_path(pipeline_name=None, resource_type=FACE_RECON_DIR_NAME, model=FACE_RECON_SAMPLES_DIR_NAME))
+        self.db_writer = DatabaseWriter(self.db_handler)  # The pad probes submit their mutations, committed in batches by a background thread
 
         # Determine the architecture if not specified
         if self.options_menu.arch is None:
-            detected_arch = detect_hailo_arch()
+            detected_arch = detect_hailo_arch_cached()
             if detected_arch is None:
                 raise ValueError("Could not auto-detect Hailo architecture. Please specify --arch manually.")
             self.arch = detected_arch
@@ -97,9 +161,11 @@ class GStreamerFaceRecognitionApp(GStreamerApp):
             self.video_source = get_resource_path(pipeline_name=None, resource_type=RESOURCES_VIDEOS_DIR_NAME, model=FACE_RECOGNITION_VIDEO_NAME)
         
         self.train_images_dir = get_resource_path(pipeline_name=None, resource_type=FACE_RECON_DIR_NAME, model=FACE_RECON_TRAIN_DIR_NAME) 
-        self.current_file = None  # for train mode
-        self.processed_names = set()  # ((key-name, val-global_id)) for train mode - pipeline will be playing for 2 seconds, so we need to ensure each person will be processed only once
-        self.processed_files = set()  # for train mode - pipeline will be playing for 2 seconds, so we need to ensure each file will be processed only once
+        # Train mode: all the images are streamed through one pipeline, each frame is identified by its PTS
+        self.train_frames = {}  # PTS -> (person name, image path) of the frames pushed and not yet seen by train_vector_db_callback
+        self.train_frames_pushed = 0
+        self.train_persons = {}  # person name -> {'global_id', 'embeddings' (kept samples), 'duplicates'}, the samples are submitted to self.db_writer as they arrive
+        self.train_images_without_face = []
 
         # Set the HEF file path based on the arch
         self.hef_path_detection = get_resource_path(pipeline_name=FACE_DETECTION_PIPELINE, resource_type=RESOURCES_MODELS_DIR_NAME)
@@ -128,54 +194,32 @@ class GStreamerFaceRecognitionApp(GStreamerApp):
             self.plot_thread = None
             self.connect_vector_db_callback()
             if self.options_menu.ui:
-                self.webrtc_frames_queue = FIFODropQueue(maxsize=2)  # smaller sizes are better for live stream
+                self.webrtc_frames_queue = LatestFrameSlot()  # the UI only gets the newest frame
                 app_sink = self.pipeline.get_by_name('ui_appsink')
                 app_sink.set_property('emit-signals', True)
                 app_sink.connect('new-sample', self.appsink_callback)
         else:  # train
             self.connect_train_vector_db_callback()
-        self.track_id_frame_count = {}  # Dictionary to track frame counts for each track ID - avoid porocessing first frames since usually they are blurry since person just entered the frame 
+        # Identity of each track: a track is searched after skip_frames (avoid porocessing first frames since usually they are blurry since person just entered the frame),
+        # then again only when its embedding drifts or its confidence decays ('Unknown' tracks are retried every 4 * skip_frames,
+        # the previous cadence: the frame count was reset to -3 * skip_frames after a search)
+        self.track_identities = TrackIdentityCache(
+            skip_frames=self.skip_frames, unknown_retry_frames=4 * self.skip_frames,
+            max_tracks=FACE_RECON_TRACK_CACHE_MAX_TRACKS, ttl=FACE_RECON_TRACK_CACHE_TTL,
+            drift_similarity=self.algo_params.get('track_drift_similarity', FACE_RECON_TRACK_DRIFT_SIMILARITY_DEFAULT),
+            confidence_half_life=self.algo_params.get('track_confidence_half_life', FACE_RECON_TRACK_CONFIDENCE_HALF_LIFE_DEFAULT))
+        self.recognition_latency = RecognitionLatencyStats()  # All the faces of a frame are resolved with one batched search
 
         self.visualization_process = None # Process for displaying the matplotlib embedding visualization in a separate process
 
-        # region worker queue threads for saving images
-        # Create a queue to hold the tasks
-        self.task_queue = queue.Queue()
-
-        # Define the worker function
-        def worker():
-            while True:  # while pipeline playing
-                task = self.task_queue.get()
-                if task is None:  # Exit signal
-                    break
-
-                # Check the task type and process accordingly
-                if task['type'] == 'save_image':
-                    frame, image_path = task['frame'], task['image_path']
-                    self.save_image_file(frame, image_path)
-                elif task['type'] == 'send_notification':
-                    user_data.send_notification(
-                        name=task['name'],
-                        global_id=task['global_id'],
-                        confidence=task['confidence'],
-                        frame=task['frame']
-                    )
-                self.task_queue.task_done()
-
-        # Start worker threads
-        self.num_worker_threads = 1
-        self.threads = []
-        for i in range(self.num_worker_threads):
-            t = threading.Thread(target=worker)
-            t.daemon = True
-            t.start()
-            self.threads.append(t)
-        # endregion
+        if self.options_menu.mode == 'train':  # The sample crops are encoded and written by a pool of threads, behind a bounded queue
+            self.sample_writer = SampleWriter(num_threads=self.options_menu.sample_writer_threads, image_format=self.options_menu.sample_format,
+                                              quality=self.options_menu.sample_quality, max_size=self.options_menu.sample_max_size or None)
         
     def get_pipeline_string(self):
         source_pipeline = SOURCE_PIPELINE(self.video_source, self.video_width, self.video_height, frame_rate=self.frame_rate, sync=self.sync)
         detection_pipeline = INFERENCE_PIPELINE(hef_path=self.hef_path_detection, post_process_so=self.post_process_so_scrfd, post_function_name=self.detection_func, batch_size=self.batch_size, config_json=get_resource_path(pipeline_name=None, resource_type=RESOURCES_JSON_DIR_NAME, model=FACE_DETECTION_JSON_NAME))
-        detection_pipeline_wrapper = INFERENCE_PIPELINE_WRAPPER(detection_pipeline)
+        detection_pipeline_wrapper = INFERENCE_PIPELINE_WRAPPER(detection_pipeline, decimation_so=self.decimation_so)
         tracker_pipeline = TRACKER_PIPELINE(class_id=-1, kalman_dist_thr=0.7, iou_thr=0.8, init_iou_thr=0.9, keep_new_frames=2, keep_tracked_frames=6, keep_lost_frames=8, keep_past_metadata=True, name='hailo_face_tracker')
         mobile_facenet_pipeline = INFERENCE_PIPELINE(hef_path=self.hef_path_recognition, post_process_so=self.post_process_so_face_recognition, post_function_name=self.recognition_func, batch_size=self.batch_size, config_json=None, name='face_recognition_inference')
         cropper_pipeline = CROPPER_PIPELINE(inner_pipeline=(f'hailofilter so-path={self.post_process_so_face_align} '
@@ -187,15 +231,29 @@ class GStreamerFaceRecognitionApp(GStreamerApp):
         update_tracker = f"hailofilter so-path={self.post_process_so_tracker_update} function-name={self.tracker_update_func} name=update_tracker "
         user_callback_pipeline = USER_CALLBACK_PIPELINE()
         if self.options_menu.ui:
-            display_pipeline = UI_APPSINK_PIPELINE(name='ui_appsink')
+            display_pipeline = UI_APPSINK_PIPELINE(name='ui_appsink', encoding=self.options_menu.ui_stream_format,
+                                                   width=self.options_menu.ui_stream_width, height=self.options_menu.ui_stream_height,
+                                                   quality=self.options_menu.ui_stream_quality)
         else:
             display_pipeline = DISPLAY_PIPELINE(video_sink=self.video_sink, sync=self.sync, show_fps=self.show_fps)
 
-        if self.options_menu.mode == 'train':
-            source_pipeline = (f"multifilesrc location={self.current_file} loop=true num-buffers=30 ! "  # each image 30 times
-                               f"decodebin ! videoconvert n-threads=4 qos=false ! video/x-raw, format=RGB, pixel-aspect-ratio=1/1 ")
+        if self.options_menu.mode == 'train':  # the images are decoded and letterboxed to the video size by feed_training_images
+            source_pipeline = (f"appsrc name=train_source format=time block=true "
+                               f"max-bytes={TRAIN_SOURCE_QUEUE_FRAMES * self.video_width * self.video_height * 3} "
+                               f"caps=\"video/x-raw, format=RGB, width={self.video_width}, height={self.video_height}, "
+                               f"framerate=30/1, pixel-aspect-ratio=1/1\" ! "
+                               f"{QUEUE(name='train_source_q')}")
             vector_db_callback_pipeline = USER_CALLBACK_PIPELINE(name=self.train_vector_db_callback_name)
-            display_pipeline = DISPLAY_PIPELINE(video_sink=self.video_sink, sync=self.sync, show_fps=self.show_fps)
+            display_pipeline = DISPLAY_PIPELINE(video_sink=self.video_sink, sync='false', show_fps=self.show_fps)  # as fast as the inference allows
+            # Every training image is independent: no tracker, so no track or past metadata carries over to the next image
+            return (
+                f'{source_pipeline} ! '
+                f'{detection_pipeline_wrapper} ! '
+                f'{cropper_pipeline} ! '
+                f'{vector_db_callback_pipeline} ! '
+                f'{user_callback_pipeline} ! '
+                f'{display_pipeline}'
+            )
 
         return (
             f'{source_pipeline} ! '
@@ -235,27 +293,143 @@ class GStreamerFaceRecognitionApp(GStreamerApp):
                     shutil.copy2(source_path, destination_path)
 
         print(f"Training on images from {self.train_images_dir}")
-        for person_name in os.listdir(self.train_images_dir):  # Iterate over subfolders in the training directory
-            person_folder = os.path.join(self.train_images_dir, person_name)
-            if self.db_handler.get_record_by_label(label=person_name):  # Ensure the person exists in the database, or create a new record
+        images = self.list_training_images()
+        if not images:
+            print("No new persons to train on")
+            return
+        start_time = time.time()
+        self.train_frames.clear()
+        self.train_frames_pushed = 0
+        self.train_persons.clear()
+        self.train_images_without_face = []
+        bus = self.pipeline.get_bus()
+        self.pipeline.set_state(Gst.State.PLAYING)
+        feeder = threading.Thread(target=self.feed_training_images, args=(images,), daemon=True)
+        feeder.start()
+        self.wait_training_end(bus)
+        self.pipeline.set_state(Gst.State.NULL)  # Unblocks the feeder if it is still pushing
+        feeder.join(timeout=TRAIN_STALL_TIMEOUT)
+        for _, image_path in self.train_frames.values():
+            print(f"Not processed: {image_path}")
+        self.sample_writer.flush()  # The sample crops are saved
+        self.db_writer.flush()  # Barrier: all the samples are committed
+        capped = self.cap_training_samples()
+        for name, person in self.train_persons.items():
+            print(f"New person added with ID: {person['global_id']} ({name}, {len(person['embeddings']) - capped.get(name, 0)} samples)")
+        elapsed = time.time() - start_time
+        enrolled = sum(len(person['embeddings']) for person in self.train_persons.values()) - sum(capped.values())
+        pruned = sum(person['duplicates'] for person in self.train_persons.values()) + sum(capped.values())
+        print(f"Training completed: {enrolled}/{len(images)} images enrolled for {len(self.train_persons)} persons, {pruned} samples pruned, "
+              f"in {elapsed:.1f} s ({len(images) / elapsed:.1f} images/s)")
+        for image_path in self.train_images_without_face:
+            print(f"No face found in {image_path}")
+        self.db_writer.report()
+        self.sample_writer.report()
+
+    def wait_training_end(self, bus):
+        """
+        Waits for the end of the training stream (EOS: all the images went through the pipeline) or an error.
+        Gives up if no frame was pushed nor processed for TRAIN_STALL_TIMEOUT seconds (e.g. a stalled inference).
+        """
+        progress, progress_time = None, time.monotonic()
+        while True:
+            message = bus.timed_pop_filtered(TRAIN_BUS_POLL_INTERVAL * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+            if message is not None:
+                if message.type == Gst.MessageType.ERROR:
+                    err, debug = message.parse_error()
+                    print(f"Error during training: {err}, {debug}")
+                return
+            current = (self.train_frames_pushed, len(self.train_frames))
+            if current != progress:
+                progress, progress_time = current, time.monotonic()
+            elif time.monotonic() - progress_time > TRAIN_STALL_TIMEOUT:
+                print(f"Training stalled: no image pushed or processed for {TRAIN_STALL_TIMEOUT} s, giving up")
+                return
+
+    def cap_training_samples(self):
+        """
+        Keeps at most max_samples_per_person diverse samples per enrolled person (see farthest_point_selection),
+        the near-duplicates were already dropped by train_vector_db_callback. Runs after the samples are committed.
+
+        Returns:
+            Dict[str, int]: Per person name, the number of samples removed by the cap.
+        """
+        capped = {}
+        for name, person in self.train_persons.items():
+            if len(person['embeddings']) <= self.max_samples_per_person:
                 continue
+            samples = self.db_handler.get_record_samples(person['global_id'])
+            kept = set(farthest_point_selection(np.stack([sample['embedding'] for sample in samples]), self.max_samples_per_person))
+            self.db_handler.remove_samples(person['global_id'], [sample['id'] for i, sample in enumerate(samples) if i not in kept])
+            capped[name] = len(samples) - len(kept)
+            print(f"{name}: {person['duplicates']} near-duplicate samples and {capped[name]} samples over the cap of {self.max_samples_per_person} pruned")
+        return capped
+
+    def list_training_images(self):
+        """
+        Returns:
+            List[Tuple[str, str]]: (person name, image path) of the training images, person by person.
+                                   Persons that already exist in the database are skipped.
+        """
+        images = []
+        for person_name in sorted(os.listdir(self.train_images_dir)):  # Subfolders in the training directory are the persons
+            person_folder = os.path.join(self.train_images_dir, person_name)
             if not os.path.isdir(person_folder):  # Skip if not a directory
                 continue
-            print(f"Processing person: {person_name}")
-            for image_file in os.listdir(person_folder):  # Iterate over images in the person's folder
-                print(f"Processing image: {image_file}")
-                self.current_file = os.path.join(person_folder, image_file)  # Set the current file for pipeline processing, used internally in get_pipeline_string
-                self.create_pipeline()  # Initialize the pipeline with the updated file path
-                self.connect_train_vector_db_callback()  # Connect the callback after pipeline initialization
-                try:  # Set the pipeline to PLAYING to process the image
-                    self.pipeline.set_state(Gst.State.PLAYING)
-                    time.sleep(2)  # Wait for processing to complete
-                except Exception as e:
-                    print(f"Error processing image {image_file}: {e}")
-                finally:  # Stop and clean up the pipeline
-                    if self.pipeline:
-                        self.pipeline.set_state(Gst.State.NULL)
-        print("Training completed")
+            if self.db_handler.get_record_by_label(label=person_name):  # Already in the database
+                continue
+            images.extend((person_name, os.path.join(person_folder, image_file)) for image_file in sorted(os.listdir(person_folder))
+                          if image_file.lower().endswith(TRAIN_IMAGE_EXTENSIONS))
+        return images
+
+    def decode_training_image(self, image_path):
+        """Decodes an image and letterboxes it to the video size. Returns an RGB array, or None if the image can't be read."""
+        try:
+            with Image.open(image_path) as image:
+                image = ImageOps.pad(image.convert('RGB'), (self.video_width, self.video_height), method=Image.BILINEAR, color=(0, 0, 0))
+            return np.asarray(image)
+        except Exception as e:
+            print(f"Error reading image {image_path}: {e}")
+            return None
+
+    def feed_training_images(self, images):
+        """
+        Decodes the training images with a thread pool and pushes them in order to the train_source appsrc,
+        one frame per image, then ends the stream. The frame's PTS identifies the image in train_vector_db_callback.
+        """
+        appsrc = self.pipeline.get_by_name('train_source')
+        frame_duration = Gst.util_uint64_scale_int(1, Gst.SECOND, 30)
+        pending = deque()
+
+        def push_oldest():
+            index, person_name, image_path, future = pending.popleft()
+            frame = future.result()
+            if frame is None:
+                return True
+            buffer = Gst.Buffer.new_wrapped(frame.tobytes())
+            buffer.pts = index * frame_duration
+            buffer.duration = frame_duration
+            self.train_frames[buffer.pts] = (person_name, image_path)
+            pushed = appsrc.emit('push-buffer', buffer) == Gst.FlowReturn.OK  # Blocks while the appsrc queue is full
+            self.train_frames_pushed += 1
+            return pushed
+
+        try:
+            with ThreadPoolExecutor(max_workers=TRAIN_DECODE_THREADS) as executor:
+                try:
+                    for index, (person_name, image_path) in enumerate(images):
+                        pending.append((index, person_name, image_path, executor.submit(self.decode_training_image, image_path)))
+                        if len(pending) >= TRAIN_DECODE_AHEAD and not push_oldest():
+                            break
+                    while pending and push_oldest():
+                        pass
+                finally:
+                    for _, _, _, future in pending:  # After a push failure (pipeline stopped) or an error
+                        future.cancel()
+        except Exception as e:
+            print(f"Error feeding the training images: {e}")
+        finally:
+            appsrc.emit('end-of-stream')  # Always ends the stream, run_training waits for it
     
     def start_visualization_process(self):
         """Start the visualization process in a separate process."""
@@ -275,9 +449,19 @@ class GStreamerFaceRecognitionApp(GStreamerApp):
         while True:  # Append the new embeddings to the plot
             try:
                 embedding_vector, label = embedding_queue.get(timeout=0.1)  # Get new embedding from the queue
-                visualizer.add_embeddings_to_existing_plot(embeddings=[embedding_vector], labels=[label])
+                embeddings, labels = [embedding_vector], [label]
+                while not embedding_queue.empty():  # All the queued embeddings are added at once
+                    embedding_vector, label = embedding_queue.get_nowait()
+                    embeddings.append(embedding_vector)
+                    labels.append(label)
+                visualizer.add_embeddings_to_existing_plot(embeddings=embeddings, labels=labels)  # Redraws at a capped rate
             except queue.Empty:  # No embedding available in the queue
-                plt.pause(0.1)  # Add a small pause to prevent high CPU usage
+                if visualizer.refresh_pending:
+                    visualizer.refresh()  # Draw the embeddings added since the last (throttled) redraw
+                if visualizer.global_fig is not None:
+                    visualizer.global_fig.canvas.start_event_loop(0.1)  # Handle GUI events; unlike plt.pause, does not force a full redraw
+                else:  # Empty database: visualize created no figure
+                    time.sleep(0.1)
             except Exception as e:
                 print(f"Error in visualization process: {e}")
                 break
@@ -294,10 +478,6 @@ class GStreamerFaceRecognitionApp(GStreamerApp):
             identity_pad = identity.get_static_pad("src")  # src is the output of an element
             identity_pad.add_probe(Gst.PadProbeType.BUFFER, self.train_vector_db_callback, self.user_data)  # trigger - when the pad gets buffer
 
-    def save_image_file(self, frame, image_path):
-        image = Image.fromarray(frame)  # Convert the frame to an image
-        image.save(image_path, format="JPEG", quality=85)  # Save as a compressed JPEG with quality 85
-    
     def crop_frame(self, frame, bbox, width, height):
         # Retrieve the bounding box of the detection to save only the cropped area - useful in case there are more than 1 person in the frame
         # Add extra padding 0.15 to each side of the bounding box
@@ -330,50 +510,21 @@ class GStreamerFaceRecognitionApp(GStreamerApp):
             except Exception as e:
                 print(f"Error terminating visualization process: {e}")
                 self.visualization_process = None  # Clear reference anyway
+        if hasattr(self, 'recognition_latency'):
+            self.recognition_latency.report()
+        if hasattr(self, 'track_identities'):
+            self.track_identities.report()
+        self.report_ui_stream_stats(force=True)
+        if hasattr(self, 'sample_writer'):
+            self.sample_writer.close()  # Writes the queued samples
+        if hasattr(self, 'db_writer'):
+            self.db_writer.close()  # Commits the pending mutations
+        if getattr(self.user_data, 'notification_dispatcher', None):
+            self.user_data.notification_dispatcher.close(timeout=NOTIFICATION_CLOSE_TIMEOUT)  # Sends the queued notifications
+            self.user_data.notification_dispatcher.report()
         # Call the parent class shutdown method to clean up the GStreamer pipeline and other resources
         super().shutdown(signum=None, frame=None)  
 
-    def add_task(self, task_type, **kwargs):
-        """
-        Add a task to the queue.
-
-        Args:
-            task_type (str): The type of task (e.g., 'save_image').
-            kwargs: Additional arguments for the task.
-        """
-        task = {'type': task_type, **kwargs}
-        self.task_queue.put(task)
-
-    def get_processed_names_by_name(self, key):
-        """
-        Retrieve a value from the processed_names set by its key.
-
-        Args:
-            key (str): The key to search for.
-
-        Returns:
-            Any: The value associated with the key, or None if the key is not found.
-        """
-        for k, v in self.processed_names:
-            if k == key:
-                return v
-        return None
-    
-    def is_name_processed(self, key):
-        """
-        Check if a key exists in the processed_names set.
-
-        Args:
-            key (str): The key to check.
-
-        Returns:
-            bool: True if the key exists, False otherwise.
-        """
-        for k, _ in self.processed_names:
-            if k == key:
-                return True
-        return False
-
     def vector_db_callback(self, pad, info, user_data):
         buffer = info.get_buffer()
         if buffer is None:
@@ -381,17 +532,16 @@ class GStreamerFaceRecognitionApp(GStreamerApp):
         format, width, height = get_caps_from_pad(pad)
         roi = hailo.get_roi_from_buffer(buffer)
         
-        # for each face detection
+        # for each face detection: collect the faces ready for recognition, they are resolved together
+        pending_faces = []  # (detection, track_id, embedding_vector, search_vector)
         for detection in (d for d in roi.get_objects_typed(hailo.HAILO_DETECTION) if d.get_label() == 'face'):
             track_id = detection.get_objects_typed(hailo.HAILO_UNIQUE_ID)[0].get_id() if detection.get_objects_typed(hailo.HAILO_UNIQUE_ID) else None
             
             # still in the skip frames period -skip
-            if self.track_id_frame_count.get(track_id, 0) < self.skip_frames:
-                self.track_id_frame_count[track_id] = self.track_id_frame_count.get(track_id, 0) + 1
+            if track_id is not None and not self.track_identities.touch(track_id):
                 continue
             
             # after self.skip_frames  
-            frame = get_numpy_from_buffer_efficient(buffer, format, width, height)
             embedding = detection.get_objects_typed(hailo.HAILO_MATRIX)  # face recognition embedding
             if len(embedding) == 0:
                 continue  # if cropper pipeline element decided to pass the detection - it will arrive to this stage of the pipeline without face embedding
@@ -401,7 +551,23 @@ class GStreamerFaceRecognitionApp(GStreamerApp):
                 continue
             # exactly single embedding is expected, so we can safely remove it from the detection
             embedding_vector = np.array(embedding[0].get_data())
-            person = self.db_handler.search_record(embedding=embedding_vector)  # most time consuming operation - search the database for the person with the closest embedding
+            search_vector = embedding_vector
+            if track_id is not None:
+                search_vector = self.track_identities.needs_search(track_id, embedding_vector)  # the track's smoothed embedding
+                if search_vector is None:
+                    continue  # the cached identity of the track holds, the tracker keeps its classification
+            pending_faces.append((detection, track_id, embedding_vector, search_vector))
+
+        if not pending_faces:
+            return Gst.PadProbeReturn.OK
+
+        start_time = time.perf_counter()
+        # most time consuming operation - search the database for the persons with the closest embeddings, all faces in one call
+        all_matches = self.db_handler.search_records_batch(np.stack([search_vector for _, _, _, search_vector in pending_faces]))
+        persons = [self.db_handler.resolve_match(matches) for matches in all_matches]
+        self.recognition_latency.add(len(pending_faces), time.perf_counter() - start_time)
+        frame = get_numpy_from_buffer_efficient(buffer, format, width, height) if self.user_data.telegram_enabled else None  # once per frame, not per face
+        for (detection, track_id, embedding_vector, _), person in zip(pending_faces, persons):
             new_confidence = (1-person['_distance'])
             classification = detection.get_objects_typed(hailo.HAILO_CLASSIFICATION)
             if classification:
@@ -411,8 +577,8 @@ class GStreamerFaceRecognitionApp(GStreamerApp):
             else:
                 detection.add_object(hailo.HailoClassification(type='face_recon', label=person['label'], confidence=new_confidence))
             
-            # anyway re-process for "double-check" after self.skip_frames X 3
-            self.track_id_frame_count[track_id] = -3 * self.skip_frames  
+            if track_id is not None:
+                self.track_identities.store(track_id, person, new_confidence)
             
             if self.options_menu.visualize and person['label'] != 'Unknown':  # If visualization is active, send the embedding to the visualization process - in case of new uknown person, don't plot - since the Uknown might be become later recognized in better frame after self.skip_frames try
                 try:
@@ -420,37 +586,41 @@ class GStreamerFaceRecognitionApp(GStreamerApp):
                 except:
                     pass  # Ignore if queue is full or other issues
             
-            if self.user_data.telegram_enabled:  # adding task to the worker queue
-                self.add_task('send_notification', name=person['label'], global_id=track_id, confidence=new_confidence, frame=frame)
+            if self.user_data.telegram_enabled:  # queued on the notification dispatcher, not on the sample saving worker
+                self.user_data.send_notification(name=person['label'], global_id=track_id, confidence=new_confidence, frame=frame)
 
         return Gst.PadProbeReturn.OK
     
     def train_vector_db_callback(self, pad, info, user_data):
-        if self.current_file in self.processed_files:
-            return Gst.PadProbeReturn.OK
         buffer = info.get_buffer()
         if buffer is None:
             return Gst.PadProbeReturn.OK
+        name, image_path = self.train_frames.pop(buffer.pts, (None, None))  # Each training image is pushed once, see feed_training_images
+        if name is None:
+            return Gst.PadProbeReturn.OK
         format, width, height = get_caps_from_pad(pad)
-        frame = get_numpy_from_buffer_efficient(buffer, format, width, height)
         roi = hailo.get_roi_from_buffer(buffer)
         for detection in (d for d in roi.get_objects_typed(hailo.HAILO_DETECTION) if d.get_label() == "face"):
             embedding = detection.get_objects_typed(hailo.HAILO_MATRIX)
             if len(embedding) != 1:  # we will continue if new embedding exists - might be new person, or another image of existing person
                 continue  # if cropper pipeline element decided to pass the detection - it will arrive to this stage of the pipeline without face embedding.
             detection.remove_object(embedding[0])  # in case the detection pointer tracker pipeline element (from earlier side of the pipeline) holds is the same as the one we have, remove the embedding, so embedding similarity won't be part of the decision criteria
-            cropped_frame = self.crop_frame(frame, detection.get_bbox(), width, height)
             embedding_vector = np.array(embedding[0].get_data())
-            image_path = os.path.join(get_resource_path(pipeline_name=None, resource_type=FACE_RECON_DIR_NAME, model=FACE_RECON_SAMPLES_DIR_NAME), f"{uuid.uuid4()}.jpeg")
-            self.add_task('save_image', frame=cropped_frame, image_path=image_path)  # Add the frame to the queue for processing
-            name = os.path.basename(os.path.dirname(self.current_file))
-            if self.is_name_processed(name):
-                self.db_handler.insert_new_sample(record=self.db_handler.get_record_by_id(self.get_processed_names_by_name(name)), embedding=embedding_vector, sample=image_path, timestamp=int(time.time())) 
-                print(f"Adding face to: {name}")
-            else: 
-                person = self.db_handler.create_record(embedding=embedding_vector, sample=image_path, timestamp=int(time.time()), label=name)
-                print(f"New person added with ID: {person['global_id']}")
-                self.processed_names.add((name, person['global_id']))
-            self.processed_files.add(self.current_file)
-            return Gst.PadProbeReturn.OK  # in case of training - iterate exactly once per image
+            person = self.train_persons.setdefault(name, {'global_id': None, 'embeddings': [], 'duplicates': 0})
+            if person['embeddings'] and not deduplicate(embedding_vector.reshape(1, -1), self.dedup_similarity, existing=np.stack(person['embeddings'])):
+                person['duplicates'] += 1  # Near-duplicate of a sample already enrolled for this person
+                return Gst.PadProbeReturn.OK
+            frame = get_numpy_from_buffer_efficient(buffer, format, width, height)
+            cropped_frame = self.crop_frame(frame, detection.get_bbox(), width, height)
+            sample_path = os.path.join(get_resource_path(pipeline_name=None, resource_type=FACE_RECON_DIR_NAME, model=FACE_RECON_SAMPLES_DIR_NAME), f"{uuid.uuid4()}{self.sample_writer.extension}")
+            self.sample_writer.submit(cropped_frame, sample_path)  # Blocks while the encoders are behind (backpressure on the training pipeline)
+            timestamp = int(time.time())
+            if person['global_id'] is None:  # Returns at once, the writer commits in the background
+                person['global_id'] = self.db_writer.create_record(embedding_vector, sample=sample_path, timestamp=timestamp, label=name)
+            else:
+                self.db_writer.insert_new_sample(person['global_id'], embedding_vector, sample=sample_path, timestamp=timestamp)
+            person['embeddings'].append(embedding_vector)
+            print(f"Adding face to: {name}")
+            return Gst.PadProbeReturn.OK  # in case of training - exactly one face per image
+        self.train_images_without_face.append(image_path)
         return Gst.PadProbeReturn.OK
\ No newline at end of file
@@ -1,5 +1,6 @@
 # region imports
 # Standard library imports
+import io
 import time
 import threading
 import multiprocessing
@@ -12,18 +13,22 @@ import json
 import gi
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst
+from PIL import Image
         
 # Local application-specific imports
 from hailo_apps.hailo_app_python.core.common.base_ui_callbacks import BaseUICallbacks
 from hailo_apps.hailo_app_python.core.common.db_handler import Record
 from hailo_apps.hailo_app_python.core.common.db_visualizer import DatabaseVisualizer
+from hailo_apps.hailo_app_python.core.common.detection_log import DetectionLog
 # endregion imports
 
 # region constants
 EMBEDDING_TIMEOUT = 0.5
 RESULT_QUEUE_TIMEOUT = 2
 WORKER_SLEEP_INTERVAL = 3 
-PROCESS_UI_TEXT_MESSAGE_INTERVAL = 2
+UI_TEXT_MESSAGE_TIMEOUT = 1  # Seconds a blocked UI generator waits for a new message before checking the stop event and the label filter
+UI_TEXT_MAX_LINES = 200  # Lines of the detection log shown, trimmed to half when exceeded (the updates in between are appends)
+ALL_LABELS = "All"  # Label filter value that shows all the detections
 PROCESSING_STARTED_MESSAGE = "Processing started."
 PROCESSING_STOPPED_MESSAGE = "Processing stopped."
 
@@ -33,8 +38,10 @@ DB_TABLE_NAME = 'persons'
 DB_SCHEMA = Record
 
 # Visualization Process
-VISUALIZATION_SLEEP_INTERVAL = 0.1  # Sleep interval for visualization loop
-EMBEDDING_QUEUE_TIMEOUT = 0.1  # Timeout for embedding queue operations
+EMBEDDING_QUEUE_TIMEOUT = 1  # Seconds a blocked get waits for new embeddings before checking that processing is still started
+PLOT_QUEUE_TIMEOUT = 1  # Seconds the UI waits for a new plot before checking the stop event
+PLOT_MIN_INTERVAL = 0.2  # Minimum seconds between two plot renders, the embeddings received meanwhile are rendered together
+PLOT_STATS_REPORT_INTERVAL = 60  # Seconds between the plot rendering reports
 
 # Pipeline States
 PIPELINE_PLAYING_STATE = Gst.State.PLAYING
@@ -46,12 +53,14 @@ THREAD_DAEMON = False  # Daemon flag for threads
 
 class UICallbacks(BaseUICallbacks):
     is_started = Value('b', False)  # Shared boolean value across all instances
-    plot_queue = multiprocessing.Queue()  # used only if self.pipeline.options_menu.visualize, create a queue to store plot_fig objects
+    started_event = multiprocessing.Event()  # Set with is_started, the visualization process blocks on it until the first start
+    plot_queue = multiprocessing.Queue(maxsize=1)  # used only if self.pipeline.options_menu.visualize, the latest plot as encoded image bytes (see put_latest_plot)
     is_first_start = True  # Flag to indicate if this is the first start of the pipeline
 
     def __init__(self, pipeline):
         super().__init__(pipeline)
         self.latest_plot_image = None
+        self.label_filter = None  # The label the detection log shows, None for all
         if self.pipeline.options_menu.visualize:
             self.start_visualization_process()
 
@@ -63,60 +72,118 @@ class UICallbacks(BaseUICallbacks):
         p.start()
         self.pipeline.visualization_process = p 
 
+    @staticmethod
+    def put_latest_plot(image, stats):
+        """
+        Puts a plot image on plot_queue, replacing the one not consumed yet: the UI only shows the latest plot.
+        None (no plot to add the embeddings to, e.g. an empty database) is skipped.
+        """
+        if image is None:
+            return
+        while True:
+            try:
+                UICallbacks.plot_queue.put_nowait(image)
+                break
+            except queue.Full:
+                try:
+                    UICallbacks.plot_queue.get_nowait()  # Drop the stale plot
+                    stats['dropped'] += 1
+                except queue.Empty:
+                    pass
+        stats['plots'] += 1
+        stats['bytes'] += len(image)
+        stats['max_bytes'] = max(stats['max_bytes'], len(image))
+
+    @staticmethod
+    def report_plot_stats(stats):
+        elapsed = time.monotonic() - stats['start_time']
+        if not stats['plots'] or elapsed <= 0:
+            return
+        print(f"Embeddings plot: {stats['plots']} images ({stats['plots'] / elapsed:.2f}/s, {stats['bytes'] / elapsed / 1024:.1f} KB/s), "
+              f"render {stats['render_seconds'] * 1000 / stats['plots']:.0f} ms/image, {stats['bytes'] / stats['plots'] / 1024:.1f} KB/image "
+              f"(max {stats['max_bytes'] / 1024:.1f} KB), {stats['dropped']} stale images dropped")
+
     @staticmethod
     def display_visualization_process(db_records, embedding_queue):
-        """Run visualization in a separate process and yield embeddings."""
+        """
+        Run visualization in a separate process: the plot is rasterized off-screen and only the encoded image
+        is sent to the UI process (see DatabaseVisualizer.render_image).
+        """
         signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ignore SIGINT in child processes
-        while True:
-            if UICallbacks.is_started.value:  # Check if processing has started
-                visualizer = DatabaseVisualizer()  # Create a new visualizer in this process
-                visualizer.set_db_records(db_records)
-                UICallbacks.plot_queue.put(visualizer.visualize(mode='ui'))  # Initialize the plot for UI mode & Enqueue the plot
-                break  # Exit after one iteration
-            else:
-                time.sleep(VISUALIZATION_SLEEP_INTERVAL)  # Add a small pause to prevent high CPU usage
+        stats = {'plots': 0, 'bytes': 0, 'max_bytes': 0, 'dropped': 0, 'render_seconds': 0.0, 'start_time': time.monotonic()}
+        UICallbacks.started_event.wait()  # Blocks until processing starts
+        visualizer = DatabaseVisualizer()  # Create a new visualizer in this process
+        visualizer.set_db_records(db_records)
+        start_time = time.perf_counter()
+        image = visualizer.visualize(mode='ui')  # Initialize the plot for UI mode
+        stats['render_seconds'] += time.perf_counter() - start_time
+        UICallbacks.put_latest_plot(image, stats)  # Enqueue the plot
+        last_report_time = last_render_time = time.monotonic()
         while UICallbacks.is_started.value:  # Append the new embeddings to the plot
             try:
-                embeddings = []
-                labels = []
-
-                # Retrieve all items from the queue
-                while not embedding_queue.empty():
-                    embedding_vector, label = embedding_queue.get_nowait()
+                embedding_vector, label = embedding_queue.get(timeout=EMBEDDING_QUEUE_TIMEOUT)  # Blocks until a new embedding arrives
+                embeddings, labels = [embedding_vector], [label]
+                # Collect the embeddings arriving until PLOT_MIN_INTERVAL after the last render, they are rendered in one image
+                deadline = last_render_time + PLOT_MIN_INTERVAL
+                while True:
+                    try:
+                        embedding_vector, label = embedding_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
                     embeddings.append(embedding_vector)
                     labels.append(label)
-                if embeddings:  # Only update the plot if there are new embeddings
-                    UICallbacks.plot_queue.put(
-                        visualizer.add_embeddings_to_existing_plot(
-                            embeddings=embeddings, labels=labels, mode='ui'
-                        ),
-                        timeout=EMBEDDING_QUEUE_TIMEOUT
-                    )
-                time.sleep(1)
-            except queue.Empty:  # No embedding available in the queue
-                time.sleep(1)  # Add a small pause to prevent high CPU usage
+                start_time = time.perf_counter()
+                image = visualizer.add_embeddings_to_existing_plot(embeddings=embeddings, labels=labels, mode='ui')
+                stats['render_seconds'] += time.perf_counter() - start_time
+                UICallbacks.put_latest_plot(image, stats)
+                last_render_time = time.monotonic()
+            except queue.Empty:  # No embedding within the timeout
+                pass
             except Exception as e:
                 print(f"Error in visualization process: {e}")
                 break
+            if time.monotonic() - last_report_time >= PLOT_STATS_REPORT_INTERVAL:
+                UICallbacks.report_plot_stats(stats)
+                last_report_time = time.monotonic()
+        UICallbacks.report_plot_stats(stats)
 
     def consume_plot_queue(self):
-        """Consume plot_fig from the queue and process it."""
+        """Consume the plot images from the queue and decode them for the UI, as soon as they are rendered."""
         while True:  # can't be self.stop_event.is_set() because not responding to start button click, rather page init (gradio interface load)
             try:
+                image = UICallbacks.plot_queue.get(timeout=PLOT_QUEUE_TIMEOUT)  # Blocks until the next plot image (the queue holds only the latest)
                 if not self.stop_event.is_set():
-                    yield UICallbacks.plot_queue.get_nowait()  # Get plot_fig from the queue
-                    time.sleep(VISUALIZATION_SLEEP_INTERVAL)  # when there are too many plot_figs in the queue, wait a bit before consuming more
-            except queue.Empty:  # No plot_fig available in the queue
-                time.sleep(VISUALIZATION_SLEEP_INTERVAL)  # Add a small pause to prevent high CPU usage
+                    yield Image.open(io.BytesIO(image))
+            except queue.Empty:  # No new plot within the timeout
+                pass
             except Exception as e:
                 print(f"Error in consume_plot_queue: {e}")
-                time.sleep(VISUALIZATION_SLEEP_INTERVAL)  # Add a small pause to prevent high CPU usage
 
     def process_ui_text_message(self):
+        """
+        Streams the detection log and the detection counts per label. Only the events added since the last read are
+        formatted and appended to the text, so Gradio sends the appended lines instead of the whole log.
+        """
         self.start_processing()  # Start processing, because this responds to start button click
+        detection_log = self.pipeline.user_data.detection_log
+        lines, last_seq, label_filter, rebuild = [], 0, None, True
         while not self.stop_event.is_set():
-            yield "\n".join(self.pipeline.user_data.ui_text_message)  # Format the list as a string. self.pipeline.user_data.ui_text_message updated continuously in the pipeline via appcallback regardless of stop_event status
-            time.sleep(PROCESS_UI_TEXT_MESSAGE_INTERVAL)
+            if rebuild or self.label_filter != label_filter:  # The whole log, with the current filter
+                label_filter, rebuild = self.label_filter, False
+                lines = []
+                events, last_seq = detection_log.read(0, label=label_filter, timeout=0)
+            else:
+                events, new_seq = detection_log.read(last_seq, label=label_filter, timeout=UI_TEXT_MESSAGE_TIMEOUT)  # Blocks until the pipeline adds an event
+                if new_seq == last_seq:
+                    continue
+                last_seq = new_seq
+            lines.extend(DetectionLog.format_event(event) for event in events)
+            if len(lines) > UI_TEXT_MAX_LINES:
+                lines = lines[-(UI_TEXT_MAX_LINES // 2):]
+            yield "\n".join(lines), detection_log.get_label_counts()
+
+    def on_label_filter_change(self, value):
+        self.label_filter = None if value in (None, ALL_LABELS) else value
 
     def start_processing(self):
         """
@@ -130,6 +197,7 @@ class UICallbacks(BaseUICallbacks):
             self.pipeline.pipeline.set_state(PIPELINE_PLAYING_STATE)
         self.stop_event.clear()  # Unset the stop_event
         UICallbacks.is_started.value = True  # Set the flag to indicate processing has started
+        UICallbacks.started_event.set()
         print(PROCESSING_STARTED_MESSAGE)
 
     def on_lance_db_vector_search_classificaiton_confidence_threshold_change(self, value):
@@ -5,7 +5,8 @@ from pathlib import Path
 # Local application-specific imports
 from hailo_apps.hailo_app_python.core.common.base_ui_elements import BaseUIElements
 from hailo_apps.hailo_app_python.core.common.core import get_resource_path
-from hailo_apps.hailo_app_python.core.common.defines import DEFAULT_LOCAL_RESOURCES_PATH, HAILO_LOGO_PHOTO_NAME
+from hailo_apps.hailo_app_python.core.common.defines import DEFAULT_LOCAL_RESOURCES_PATH, HAILO_LOGO_PHOTO_NAME, UI_STREAM_FORMAT_JPEG
+from hailo_apps.hailo_app_python.apps.face_recognition.face_ui_callbacks import ALL_LABELS
 
 # Third-party imports
 from fastrtc import WebRTC
@@ -36,9 +37,10 @@ class UIElements(BaseUIElements):
         self.start_btn = gr.Button("Start", variant="primary", elem_id="start-btn")
         # Video Stream
         self.live_video_stream = WebRTC(modality="video", mode="receive", height="480px")
+        self.live_video_jpeg = gr.HTML(elem_id="live-video-jpeg")  # --ui-stream-format jpeg: an image showing the MJPEG stream of the frames encoded in the pipeline
 
         # Embeddings
-        self.embeddings_stream = gr.Plot(label="Embeddings Plot")
+        self.embeddings_stream = gr.Image(label="Embeddings Plot", type="pil", interactive=False)  # Rendered off-screen by the visualization process
 
         # Sliders
         self.lance_db_vector_search_classificaiton_confidence_threshold = gr.Slider(
@@ -49,6 +51,8 @@ class UIElements(BaseUIElements):
         )
         # Text Areas
         self.ui_text_message = gr.TextArea(label="Detected Persons", interactive=False, elem_id="detected-persons-textarea")  # ID for custom styling
+        self.label_filter = gr.Dropdown(label="Filter by label", allow_custom_value=True, elem_id="label-filter-dropdown")
+        self.label_counts = gr.JSON(label="Detections per label", elem_id="label-counts-json")
 
         self.save_btn = gr.Button("Save", variant="primary", elem_id="save-btn")
 
@@ -78,6 +82,7 @@ class UIElements(BaseUIElements):
             loader_color=SECONDARY_HUE_COLOR, 
             slider_color=SECONDARY_HUE_COLOR)
         # UI elements to callbacks connection happens here because event listeners must be declared within gr.Blocks context
+        jpeg_stream = pipeline.options_menu.ui_stream_format == UI_STREAM_FORMAT_JPEG
         with gr.Blocks(css=self.ui_css, theme=custom_theme) as interface:
             # region rendering
             with gr.Row():
@@ -89,7 +94,10 @@ class UIElements(BaseUIElements):
             # Row for live video stream and embeddings_stream
             with gr.Row():
                 with gr.Column(elem_classes=["fixed-size"]):  # Apply fixed size for live_video_stream
-                    self.live_video_stream.render()
+                    if jpeg_stream:
+                        self.live_video_jpeg.render()
+                    else:
+                        self.live_video_stream.render()
                 with gr.Column(elem_classes=["fixed-size"]):  # Apply fixed size for embeddings_stream
                     self.embeddings_stream.render()
             # Row for sliders and detected persons
@@ -105,6 +113,11 @@ class UIElements(BaseUIElements):
                             self.save_btn.render()
                 with gr.Column():
                     self.ui_text_message.render()
+                    with gr.Row():
+                        with gr.Column():
+                            self.label_filter.render()
+                        with gr.Column():
+                            self.label_counts.render()
             with gr.Row():
                 # Add the logo just above the footer
                 # Define the original file and the alias (symlink) paths
@@ -121,16 +134,23 @@ class UIElements(BaseUIElements):
             # endregion rendrering
 
             # region Event handlers: must be declared within gr.Blocks context
-            self.live_video_stream.stream(  
-                fn=ui_callbacks.process_frames,
-                outputs=self.live_video_stream,
-                trigger=self.start_btn.click
-            )
+            if jpeg_stream:
+                self.start_btn.click(
+                    fn=ui_callbacks.process_jpeg_frames,
+                    inputs=None,
+                    outputs=self.live_video_jpeg
+                )
+            else:
+                self.live_video_stream.stream(  
+                    fn=ui_callbacks.process_frames,
+                    outputs=self.live_video_stream,
+                    trigger=self.start_btn.click
+                )
 
             self.start_btn.click(
                 fn=ui_callbacks.process_ui_text_message,
                 inputs=None,
-                outputs=self.ui_text_message
+                outputs=[self.ui_text_message, self.label_counts]
             )
 
             self.save_btn.click(
@@ -149,9 +169,12 @@ class UIElements(BaseUIElements):
             # Dynamically adjust initial values for sliders from pipeline
             self.lance_db_vector_search_classificaiton_confidence_threshold.value = pipeline.lance_db_vector_search_classificaiton_confidence_threshold
             self.skip_frames.value = pipeline.skip_frames
+            self.label_filter.choices = [(label, label) for label in [ALL_LABELS] + sorted(set(pipeline.db_handler.get_embedding_cache().labels) | {'Unknown'})]
+            self.label_filter.value = ALL_LABELS
 
             self.lance_db_vector_search_classificaiton_confidence_threshold.change(ui_callbacks.on_lance_db_vector_search_classificaiton_confidence_threshold_change, inputs=self.lance_db_vector_search_classificaiton_confidence_threshold)
             self.skip_frames.change(ui_callbacks.on_skip_frames_change, inputs=self.skip_frames)
+            self.label_filter.change(ui_callbacks.on_label_filter_change, inputs=self.label_filter)
             # endregion event handlers
 
         return interface
@@ -21,7 +21,7 @@ from hailo_apps.hailo_app_python.apps.instance_segmentation.instance_segmentatio
 class user_app_callback_class(app_callback_class):
     def __init__(self):
         super().__init__()
-        self.frame_skip = 2  # Process every 2nd frame to reduce compute
+        self.frame_skip = 2  # Process every 2nd frame in this callback to reduce compute (inference still runs on every frame, use --decimation to skip it)
 
 # Predefined colors (BGR format)
 COLORS = [
@@ -6,7 +6,7 @@ from pathlib import Path
 import sys
 
 # Local application-specific imports
-from hailo_apps.hailo_app_python.core.common.installation_utils import detect_hailo_arch
+from hailo_apps.hailo_app_python.core.common.installation_utils import detect_hailo_arch_cached
 from hailo_apps.hailo_app_python.core.common.core import get_default_parser, get_resource_path
 from hailo_apps.hailo_app_python.core.common.defines import RESOURCES_JSON_DIR_NAME, HAILO_ARCH_KEY, INSTANCE_SEGMENTATION_APP_TITLE, INSTANCE_SEGMENTATION_PIPELINE, RESOURCES_MODELS_DIR_NAME, RESOURCES_SO_DIR_NAME, INSTANCE_SEGMENTATION_MODEL_NAME_H8, INSTANCE_SEGMENTATION_MODEL_NAME_H8L, INSTANCE_SEGMENTATION_POSTPROCESS_SO_FILENAME, INSTANCE_SEGMENTATION_POSTPROCESS_FUNCTION, DEFAULT_LOCAL_RESOURCES_PATH, JSON_FILE_EXTENSION
 from hailo_apps.hailo_app_python.core.gstreamer.gstreamer_helper_pipelines import SOURCE_PIPELINE, INFERENCE_PIPELINE, INFERENCE_PIPELINE_WRAPPER, TRACKER_PIPELINE, USER_CALLBACK_PIPELINE, DISPLAY_PIPELINE
@@ -31,7 +31,7 @@ class GStreamerInstanceSegmentationApp(GStreamerApp):
 
         # Detect architecture if not provided
         if self.options_menu.arch is None:
-            detected_arch = os.getenv(HAILO_ARCH_KEY, detect_hailo_arch())
+            detected_arch = os.getenv(HAILO_ARCH_KEY) or detect_hailo_arch_cached()
             if detected_arch is None:
                 raise ValueError("Could not auto-detect Hailo architecture. Please specify --arch manually.")
             self.arch = detected_arch
@@ -85,7 +85,7 @@ class GStreamerInstanceSegmentationApp(GStreamerApp):
             batch_size=self.batch_size,
             config_json=self.config_file,
         )
-        infer_pipeline_wrapper = INFERENCE_PIPELINE_WRAPPER(infer_pipeline)
+        infer_pipeline_wrapper = INFERENCE_PIPELINE_WRAPPER(infer_pipeline, decimation_so=self.decimation_so)
         tracker_pipeline = TRACKER_PIPELINE(class_id=1)
         user_callback_pipeline = USER_CALLBACK_PIPELINE()
         display_pipeline = DISPLAY_PIPELINE(
@@ -6,7 +6,7 @@ from pathlib import Path
 import sys
 
 # Local application-specific imports
-from hailo_apps.hailo_app_python.core.common.installation_utils import detect_hailo_arch
+from hailo_apps.hailo_app_python.core.common.installation_utils import detect_hailo_arch_cached
 from hailo_apps.hailo_app_python.core.common.core import get_default_parser, get_resource_path
 from hailo_apps.hailo_app_python.core.common.defines import POSE_ESTIMATION_APP_TITLE, POSE_ESTIMATION_PIPELINE, RESOURCES_MODELS_DIR_NAME, RESOURCES_SO_DIR_NAME, POSE_ESTIMATION_POSTPROCESS_SO_FILENAME, POSE_ESTIMATION_POSTPROCESS_FUNCTION, HAILO_ARCH_KEY
 from hailo_apps.hailo_app_python.core.gstreamer.gstreamer_helper_pipelines import SOURCE_PIPELINE, INFERENCE_PIPELINE, INFERENCE_PIPELINE_WRAPPER, TRACKER_PIPELINE, USER_CALLBACK_PIPELINE, DISPLAY_PIPELINE
@@ -34,7 +34,7 @@ class GStreamerPoseEstimationApp(GStreamerApp):
 
         # Determine the architecture if not specified
         if self.options_menu.arch is None:
-            detected_arch = os.getenv(HAILO_ARCH_KEY, detect_hailo_arch())
+            detected_arch = os.getenv(HAILO_ARCH_KEY) or detect_hailo_arch_cached()
             if detected_arch is None:
                 raise ValueError("Could not auto-detect Hailo architecture. Please specify --arch manually.")
             self.arch = detected_arch
@@ -74,7 +74,7 @@ class GStreamerPoseEstimationApp(GStreamerApp):
             post_function_name=self.post_process_function,
             batch_size=self.batch_size
         )
-        infer_pipeline_wrapper = INFERENCE_PIPELINE_WRAPPER(infer_pipeline)
+        infer_pipeline_wrapper = INFERENCE_PIPELINE_WRAPPER(infer_pipeline, decimation_so=self.decimation_so)
         tracker_pipeline = TRACKER_PIPELINE(class_id=0)
         user_callback_pipeline = USER_CALLBACK_PIPELINE()
 
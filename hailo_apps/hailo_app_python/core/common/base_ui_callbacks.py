@@ -1,7 +1,14 @@
 import threading
 import queue
+import time
+
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+
+from hailo_apps.hailo_app_python.core.common.defines import UI_MJPEG_STREAM_PATH
 
 FRAME_TIMEOUT = 0.5
+MJPEG_BOUNDARY = "frame"
 
 class BaseUICallbacks:
     def __init__(self, pipeline):
@@ -18,4 +25,29 @@ class BaseUICallbacks:
                 yield self.pipeline.webrtc_frames_queue.get(timeout=self.FRAME_TIMEOUT)  # Get a frame from the queue (blocking)
             except queue.Empty:  # No frame available in the queue
                 if self.stop_event.is_set():
-                    break
\ No newline at end of file
+                    break
+
+    def mjpeg_stream(self):
+        """
+        Generator of the JPEG frames (UI_APPSINK_PIPELINE jpeg encoding) as a multipart MJPEG stream: the frames are sent
+        as encoded in the pipeline, nothing is decoded, re-encoded or copied here.
+        """
+        for frame in self.process_frames():
+            yield f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(frame)}\r\n\r\n".encode()
+            yield frame
+            yield b"\r\n"
+
+    def stream_routes(self):
+        """
+        Routes to add to the Gradio server (launch(app_kwargs={'routes': ...})): UI_MJPEG_STREAM_PATH serves mjpeg_stream.
+        """
+        async def mjpeg_endpoint(request):
+            return StreamingResponse(self.mjpeg_stream(), media_type=f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}")
+        return [Route(UI_MJPEG_STREAM_PATH, mjpeg_endpoint)]
+
+    def process_jpeg_frames(self):
+        """
+        Returns the HTML image showing the MJPEG stream (see stream_routes): the browser decodes the frames and updates
+        the same image in place, without a Gradio event or a base64 copy per frame.
+        """
+        return f'<img src="{UI_MJPEG_STREAM_PATH}?start={time.time()}" style="width: 100%;">'  # A new connection on every start
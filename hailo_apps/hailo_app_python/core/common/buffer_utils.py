@@ -4,6 +4,7 @@ from gi.repository import Gst
 import numpy as np
 from .defines import (
     HAILO_RGB_VIDEO_FORMAT,
+    HAILO_BGR_VIDEO_FORMAT,
     HAILO_NV12_VIDEO_FORMAT,
     HAILO_YUYV_VIDEO_FORMAT
 )
@@ -98,3 +99,40 @@ def get_numpy_from_buffer_efficient(buffer, format, width, height):
     finally:
         # Unmap the buffer to release resources
         buffer.unmap(map_info)
+
+
+def get_luma_from_buffer(buffer, format, width, height, step=1):
+    """
+    Extracts a downscaled luma (grayscale) plane from a GstBuffer.
+    Only every step-th pixel in both axes is read, the full frame is never copied.
+
+    Args:
+        buffer (GstBuffer): The GStreamer Buffer to read.
+        format (str): The video format ('RGB', 'BGR', 'NV12' or 'YUYV').
+        width (int): The width of the video frame.
+        height (int): The height of the video frame.
+        step (int): The subsampling step. Defaults to 1 (full resolution).
+
+    Returns:
+        np.ndarray: A uint8 array of shape (ceil(height / step), ceil(width / step)).
+    """
+    success, map_info = buffer.map(Gst.MapFlags.READ)
+    if not success:
+        raise ValueError("Buffer mapping failed")
+
+    try:
+        if format in (HAILO_RGB_VIDEO_FORMAT, HAILO_BGR_VIDEO_FORMAT):
+            frame = np.ndarray(shape=(height, width, 3), dtype=np.uint8, buffer=map_info.data)[::step, ::step]
+            red, blue = (0, 2) if format == HAILO_RGB_VIDEO_FORMAT else (2, 0)
+            # BT.601 integer weights (77, 150, 29) / 256
+            luma = (frame[..., red].astype(np.uint16) * 77 +
+                    frame[..., 1].astype(np.uint16) * 150 +
+                    frame[..., blue].astype(np.uint16) * 29) >> 8
+            return luma.astype(np.uint8)
+        if format == HAILO_NV12_VIDEO_FORMAT:
+            return np.ndarray(shape=(height, width), dtype=np.uint8, buffer=map_info.data[:width * height])[::step, ::step].copy()
+        if format == HAILO_YUYV_VIDEO_FORMAT:
+            return np.ndarray(shape=(height, width, 2), dtype=np.uint8, buffer=map_info.data)[::step, ::step, 0].copy()
+        raise ValueError(f"Unsupported format: {format}")
+    finally:
+        buffer.unmap(map_info)
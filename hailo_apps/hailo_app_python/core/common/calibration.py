@@ -0,0 +1,116 @@
+"""
+Vectorized calibration of the per-record classification confidence thresholds.
+
+The samples of all the records are given as one contiguous (N, dim) array, the samples of record i being
+embeddings[offsets[i]:offsets[i + 1]], so the whole gallery is processed with batched NumPy operations.
+"""
+# region imports
+# Third-party imports
+import numpy as np
+
+# Local application-specific imports
+from hailo_apps.hailo_app_python.core.common.defines import NORM_EPSILON
+# endregion imports
+
+CALIBRATION_METHODS = ['area', 'margin']
+THRESHOLD_MIN = 0.1
+THRESHOLD_MAX = 0.9
+CALIBRATION_CHUNK_VALUES = 1 << 24  # Padded sample values (records x max samples x dim) processed at once, bounds the memory
+
+def segment_means(embeddings, offsets):
+    """
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The mean of the samples of each record (zeros for a record without samples),
+                                       shape (R, dim), and the number of samples per record, shape (R,).
+    """
+    counts = np.diff(offsets)
+    sums = np.zeros((len(counts), embeddings.shape[1]), dtype=np.float32)  # float32 is enough for the sum of a record's samples
+    non_empty = counts > 0
+    if np.any(non_empty):
+        sums[non_empty] = np.add.reduceat(embeddings, offsets[:-1][non_empty], axis=0)
+    return sums / np.maximum(counts, 1).astype(np.float32)[:, None], counts
+
+def spread_areas(embeddings, offsets):
+    """
+    Area of the 2-D confidence ellipse of each record: pi times the standard deviations of its samples along their
+    two principal components (the samples projected on a per-record 2-D PCA).
+
+    The top eigenvalues of a record's (dim x dim) covariance are those of the (n x n) Gram matrix of its centered
+    samples, so the records are padded to the same number of samples (zero rows add no variance) and all the Gram
+    matrices of a chunk of records are built with one einsum and decomposed with one batched eigvalsh.
+
+    Args:
+        embeddings (np.ndarray): The samples of all the records, shape (N, dim).
+        offsets (np.ndarray): The segment offsets, shape (R + 1,).
+
+    Returns:
+        np.ndarray: The area per record, 0 for records with less than 2 samples, shape (R,).
+    """
+    means, counts = segment_means(embeddings, offsets)
+    areas = np.zeros(len(counts))
+    records = np.flatnonzero(counts >= 2)
+    if len(records) == 0:
+        return areas
+    max_count = int(counts[records].max())
+    chunk = max(1, CALIBRATION_CHUNK_VALUES // (max_count * embeddings.shape[1]))
+    positions = np.arange(max_count)
+    for start in range(0, len(records), chunk):
+        chunk_records = records[start:start + chunk]
+        chunk_counts = counts[chunk_records]
+        valid = positions[None, :] < chunk_counts[:, None]  # (r, max_count)
+        rows = np.where(valid, offsets[chunk_records][:, None] + positions[None, :], 0)
+        centered = (embeddings[rows] - means[chunk_records][:, None, :]) * valid[:, :, None]
+        grams = np.einsum('rid,rjd->rij', centered, centered, optimize=True)
+        eigenvalues = np.linalg.eigvalsh(grams)[:, ::-1][:, :2].clip(min=0)  # The two largest, descending
+        variances = eigenvalues / chunk_counts[:, None]  # Variance of the projections on the principal components
+        areas[chunk_records] = np.pi * np.sqrt(variances[:, 0]) * np.sqrt(variances[:, 1])
+    return areas
+
+def area_thresholds(embeddings, offsets):
+    """
+    Calibration by spread: the records with the smallest confidence areas get the highest thresholds,
+    linearly from THRESHOLD_MAX (smallest area) to THRESHOLD_MIN (largest area).
+
+    Returns:
+        np.ndarray: The threshold per record, shape (R,).
+    """
+    areas = spread_areas(embeddings, offsets)
+    if len(areas) and np.max(areas) != np.min(areas):
+        norm_areas = (areas - np.min(areas)) / (np.max(areas) - np.min(areas))
+    else:
+        norm_areas = np.zeros_like(areas)
+    return THRESHOLD_MIN + (THRESHOLD_MAX - THRESHOLD_MIN) * (1 - norm_areas)
+
+def margin_thresholds(embeddings, offsets, default_threshold):
+    """
+    Calibration by inter-class margin: the threshold of a record is halfway between the mean cosine similarity of its
+    samples to its centroid and the cosine similarity of its centroid to the nearest other centroid, so its own faces
+    are accepted and the faces of its nearest neighbour rejected. The nearest other centroids of all the records come
+    from one centroid Gram matrix, computed in blocks of rows.
+
+    Args:
+        embeddings (np.ndarray): The samples of all the records, shape (N, dim).
+        offsets (np.ndarray): The segment offsets, shape (R + 1,).
+        default_threshold (float): The threshold of the records without samples, or of a single record.
+
+    Returns:
+        np.ndarray: The threshold per record, shape (R,).
+    """
+    means, counts = segment_means(embeddings, offsets)
+    thresholds = np.full(len(counts), float(default_threshold))
+    records = np.flatnonzero(counts > 0)
+    if len(records) < 2:
+        return thresholds
+    centroids = means[records] / np.maximum(np.linalg.norm(means[records], axis=1, keepdims=True), NORM_EPSILON)
+    nearest_other = np.empty(len(records), dtype=np.float32)
+    block = max(1, CALIBRATION_CHUNK_VALUES // (4 * len(records)))  # Rows of the Gram matrix computed at once
+    for start in range(0, len(records), block):
+        gram = centroids[start:start + block] @ centroids.T
+        gram[np.arange(len(gram)), start + np.arange(len(gram))] = -np.inf  # Not the record itself
+        nearest_other[start:start + block] = gram.max(axis=1)
+    # Mean similarity of the samples to their centroid = (mean of the normalized samples) . centroid
+    samples = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), NORM_EPSILON)
+    sample_means, _ = segment_means(samples, offsets)
+    own = np.einsum('rd,rd->r', sample_means[records], centroids)
+    thresholds[records] = np.clip((own + nearest_other) / 2, THRESHOLD_MIN, THRESHOLD_MAX)
+    return thresholds
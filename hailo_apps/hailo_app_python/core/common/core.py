@@ -5,9 +5,11 @@ import os
 from pathlib import Path
 import argparse
 import queue
+import threading
+import time
 from dotenv import load_dotenv
 
-from .installation_utils import detect_hailo_arch
+from .installation_utils import detect_hailo_arch_cached
 
 from .defines import (
     DEFAULT_DOTENV_PATH,
@@ -126,6 +128,35 @@ def get_default_parser():
         "--frame-rate", "-r", type=int, default=30,
         help="Frame rate of the video source. Default is 30."
     )
+    parser.add_argument(
+        "--decimation", type=int, default=1,
+        help="Run inference only on every Nth frame, the tracker carries the detections across the skipped frames. \
+        Keep N below the tracker keep-tracked-frames. Default is 1 (inference on every frame)."
+    )
+    parser.add_argument(
+        "--adaptive-decimation", action="store_true",
+        help="Adapt the decimation factor to the pipeline load, from 1 up to --decimation (or 4 if --decimation is not set)."
+    )
+    parser.add_argument(
+        "--loop-mode", choices=["segment", "rewind"], default="segment",
+        help="How file sources are looped: 'segment' (gapless segment seeks) or 'rewind' (pause and seek to the start at end of stream). Default is segment."
+    )
+    parser.add_argument(
+        "--profile-startup", action="store_true",
+        help="Print the time spent in each startup phase (imports, environment, arch detection, pipeline creation, preroll) up to the first frame."
+    )
+    parser.add_argument(
+        "--motion-gate", action="store_true",
+        help="Skip inference on frames without motion, using a cheap frame difference on a downscaled luma plane. Intended for fixed cameras."
+    )
+    parser.add_argument(
+        "--motion-threshold", type=float, default=0.01,
+        help="Fraction of changed pixels (0-1) above which a frame counts as motion. Default is 0.01."
+    )
+    parser.add_argument(
+        "--motion-heartbeat", type=int, default=30,
+        help="With --motion-gate, run inference at least every N frames even without motion. Default is 30 (0 disables)."
+    )
     return parser
 
 def get_model_name(pipeline_name: str, arch: str) -> str:
@@ -187,7 +218,7 @@ def get_resource_path(pipeline_name: str,
         return (root / DEFAULT_LOCAL_RESOURCES_PATH / model)
 
     # 2) Hailo architecture (for model directory)
-    arch = os.getenv(HAILO_ARCH_KEY, detect_hailo_arch())
+    arch = os.getenv(HAILO_ARCH_KEY) or detect_hailo_arch_cached()
     if not arch:
         return None
         
@@ -207,4 +238,58 @@ class FIFODropQueue(queue.Queue):  # helper class implementing a FIFO queue that
     def put(self, item, block=False, timeout=None):
         if self.full():
             self.get_nowait()  # remove the oldest frame
-        super().put(item, block, timeout)
\ No newline at end of file
+        super().put(item, block, timeout)
+
+class LatestFrameSlot:
+    """
+    Holds only the newest frame for a single consumer (the UI): put() replaces the pending frame, which is dropped
+    if the consumer did not take it, and get() blocks until a frame newer than the last one taken arrives.
+    Same put/get interface as queue.Queue (get raises queue.Empty on timeout), so it replaces FIFODropQueue for live streams
+    without the stale frames a FIFO delivers after a stall.
+    It also counts the delivered frames and bytes (the array size for raw frames, the length for encoded ones) for get_stats.
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.frame = None
+        self.stats = {'frames': 0, 'bytes': 0, 'taken': 0, 'replaced': 0}
+        self.start_time = time.monotonic()
+
+    def put(self, item, block=False, timeout=None):
+        with self.condition:
+            if self.frame is not None:
+                self.stats['replaced'] += 1
+            self.frame = item
+            self.stats['frames'] += 1
+            self.stats['bytes'] += item.nbytes if hasattr(item, 'nbytes') else len(item)
+            self.condition.notify()
+
+    def get(self, block=True, timeout=None):
+        with self.condition:
+            if block and self.frame is None:
+                self.condition.wait_for(lambda: self.frame is not None, timeout)
+            if self.frame is None:
+                raise queue.Empty
+            item, self.frame = self.frame, None
+            self.stats['taken'] += 1
+            return item
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: The counters, with the rates since the creation or the last reset (fps, bytes per frame, bytes per second).
+        """
+        with self.condition:
+            stats = dict(self.stats)
+            elapsed = time.monotonic() - self.start_time
+        stats['fps'] = stats['frames'] / elapsed if elapsed > 0 else 0.0
+        stats['bytes_per_frame'] = stats['bytes'] / stats['frames'] if stats['frames'] else 0.0
+        stats['bytes_per_second'] = stats['bytes'] / elapsed if elapsed > 0 else 0.0
+        return stats
+
+    def reset_stats(self):
+        with self.condition:
+            self.stats = dict.fromkeys(self.stats, 0)
+            self.start_time = time.monotonic()
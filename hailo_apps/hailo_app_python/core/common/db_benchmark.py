@@ -0,0 +1,256 @@
+"""
+Benchmarks for the face recognition database (DatabaseHandler).
+Run with: python -m hailo_apps.hailo_app_python.core.common.db_benchmark --benchmark search
+The databases are created in a temporary directory with random embeddings.
+"""
+# region imports
+# Standard library imports
+import argparse
+import tempfile
+import time
+import os
+import uuid
+import datetime
+
+# Third-party imports
+import numpy as np
+
+# Local application-specific imports
+from hailo_apps.hailo_app_python.core.common.db_handler import DatabaseHandler, Record, Sample
+from hailo_apps.hailo_app_python.core.common.calibration import CALIBRATION_METHODS, spread_areas, area_thresholds, margin_thresholds
+from hailo_apps.hailo_app_python.core.common.defines import EMBEDDING_DIM
+# endregion imports
+
+QUERY_NOISE = 0.3  # Noise added to the stored embeddings to build queries (relative to unit vectors)
+
+def random_embeddings(num, seed=0):
+    """Returns num random unit vectors (float32, shape (num, EMBEDDING_DIM))."""
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((num, EMBEDDING_DIM)).astype(np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+def noisy_queries(embeddings, num_queries, seed=1):
+    """Returns queries close to randomly chosen embeddings, and the indices of these embeddings."""
+    rng = np.random.default_rng(seed)
+    indices = rng.integers(0, len(embeddings), size=num_queries)
+    noise = rng.standard_normal((num_queries, EMBEDDING_DIM)).astype(np.float32) * QUERY_NOISE / np.sqrt(EMBEDDING_DIM)
+    return embeddings[indices] + noise, indices
+
+def create_benchmark_db(num_records, database_dir, threshold=0.3, seed=0, samples_per_record=1):
+    """
+    Creates a database with num_records records, written in one batch. With several samples per record,
+    the samples are noisy copies of the record embedding and the record holds their mean.
+
+    Returns:
+        Tuple[DatabaseHandler, np.ndarray, List[str]]: The handler, the record embeddings and their global ids.
+    """
+    db_handler = DatabaseHandler(db_name='benchmark.db', table_name='persons', schema=Record, threshold=threshold,
+                                 database_dir=database_dir, samples_dir=database_dir)
+    embeddings = random_embeddings(num_records, seed=seed)
+    if samples_per_record > 1:
+        rng = np.random.default_rng(seed + 1)
+        noise = rng.standard_normal((num_records, samples_per_record, EMBEDDING_DIM)).astype(np.float32)
+        samples = embeddings[:, None, :] + noise * rng.uniform(0.5, 2.0, (num_records, 1, 1)).astype(np.float32) * QUERY_NOISE / np.sqrt(EMBEDDING_DIM)
+    else:
+        samples = embeddings[:, None, :]
+    global_ids = [str(uuid.uuid4()) for _ in range(num_records)]
+    now = int(time.time())
+    db_handler.tbl_records.add([
+        Record(global_id=global_id, label=f"person_{i}", avg_embedding=record_samples.mean(axis=0).tolist(), last_sample_recieved_time=now,
+               embedding_sum=record_samples.astype(np.float64).sum(axis=0).tolist(), num_samples=len(record_samples),
+               classificaiton_confidence_threshold=threshold)
+        for i, (global_id, record_samples) in enumerate(zip(global_ids, samples))
+    ])
+    db_handler.tbl_samples.add([
+        Sample(id=str(uuid.uuid4()), global_id=global_id, embedding=embedding.tolist(), sample_path="", timestamp=now)
+        for global_id, record_samples in zip(global_ids, samples) for embedding in record_samples
+    ])
+    db_handler.embedding_cache.invalidate()  # Written directly to the table
+    return db_handler, embeddings, global_ids
+
+def time_calls(function, queries):
+    """Returns the average latency of function(query) in milliseconds and the results."""
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append(function(query))
+    return (time.perf_counter() - start) * 1000 / len(queries), results
+
+def benchmark_search(sizes=(100, 1000, 5000), num_queries=200):
+    """Compares search_record (in-memory embedding cache) with the LanceDB query path."""
+    print(f"{'records':>8} {'lancedb ms':>11} {'cache ms':>9} {'speedup':>8} {'top-1 agreement':>16}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as database_dir:
+            db_handler, embeddings, global_ids = create_benchmark_db(size, database_dir)
+            queries, _ = noisy_queries(embeddings, num_queries)
+            db_handler.get_embedding_cache()  # Load outside the timed loop, as after the first search in the app
+            lancedb_ms, lancedb_results = time_calls(db_handler.search_record_lancedb, queries)
+            cache_ms, cache_results = time_calls(db_handler.search_record, queries)
+            agreement = np.mean([a['label'] == b['label'] for a, b in zip(lancedb_results, cache_results)])
+            print(f"{size:>8} {lancedb_ms:>11.3f} {cache_ms:>9.3f} {lancedb_ms / cache_ms:>7.1f}x {agreement * 100:>15.1f}%")
+
+def benchmark_batch_search(size=1000, face_counts=(1, 5, 10, 20), num_frames=200):
+    """Per-frame recognition latency: one search_record per face vs one search_records_batch per frame."""
+    print(f"{'faces':>6} {'sequential ms':>14} {'batched ms':>11} {'speedup':>8} {'agreement':>10}")
+    with tempfile.TemporaryDirectory() as database_dir:
+        db_handler, embeddings, _ = create_benchmark_db(size, database_dir)
+        db_handler.get_embedding_cache()
+        for face_count in face_counts:
+            queries, _ = noisy_queries(embeddings, num_frames * face_count)
+            frames = queries.reshape(num_frames, face_count, EMBEDDING_DIM)
+            sequential_ms, sequential_results = time_calls(
+                lambda faces: [db_handler.search_record(face) for face in faces], frames)
+            batched_ms, batched_results = time_calls(
+                lambda faces: [db_handler.resolve_match(matches) for matches in db_handler.search_records_batch(faces)], frames)
+            agreement = np.mean([a['label'] == b['label'] for frame_a, frame_b in zip(sequential_results, batched_results)
+                                 for a, b in zip(frame_a, frame_b)])
+            print(f"{face_count:>6} {sequential_ms:>14.3f} {batched_ms:>11.3f} {sequential_ms / batched_ms:>7.1f}x {agreement * 100:>9.1f}%")
+
+def directory_size(path):
+    """Returns the total size of the files under path, in bytes."""
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def benchmark_samples(num_records=100, samples_per_record=20):
+    """Database size, get_all_records load time and insert_new_sample latency for records with many samples."""
+    with tempfile.TemporaryDirectory() as database_dir:
+        db_handler = DatabaseHandler(db_name='benchmark.db', table_name='persons', schema=Record, threshold=0.3,
+                                     database_dir=database_dir, samples_dir=database_dir)
+        global_ids = [db_handler.create_record(embedding=embedding, sample="", timestamp=0, label=f"person_{i}")['global_id']
+                      for i, embedding in enumerate(random_embeddings(num_records))]
+        latencies = []
+        for sample_index in range(1, samples_per_record):
+            for global_id, embedding in zip(global_ids, random_embeddings(num_records, seed=sample_index)):
+                record = db_handler.get_record_by_id(global_id)
+                start = time.perf_counter()
+                db_handler.insert_new_sample(record=record, embedding=embedding, sample="", timestamp=sample_index)
+                latencies.append(time.perf_counter() - start)
+        for table in (db_handler.tbl_records, db_handler.tbl_samples):  # Keep only the latest version of the tables
+            table.optimize(cleanup_older_than=datetime.timedelta(0))
+        size = directory_size(os.path.join(database_dir, 'benchmark.db'))
+        db_handler = DatabaseHandler(db_name='benchmark.db', table_name='persons', schema=Record, threshold=0.3,
+                                     database_dir=database_dir, samples_dir=database_dir)
+        start = time.perf_counter()
+        db_handler.get_all_records()
+        load_ms = (time.perf_counter() - start) * 1000
+    print(f"{num_records} records x {samples_per_record} samples: size {size / 1e6:.2f} MB, get_all_records {load_ms:.1f} ms, "
+          f"insert_new_sample avg {np.mean(latencies) * 1000:.2f} ms (last round {np.mean(latencies[-num_records:]) * 1000:.2f} ms)")
+
+def benchmark_centroid(sample_counts=(10, 100, 1000), num_updates=200):
+    """Per-sample avg_embedding update: mean over all the samples vs the running sum (DatabaseHandler.next_centroid)."""
+    print(f"{'samples':>8} {'recompute ms':>13} {'running sum ms':>15} {'max abs diff':>13}")
+    with tempfile.TemporaryDirectory() as database_dir:
+        db_handler = DatabaseHandler(db_name='benchmark.db', table_name='persons', schema=Record, threshold=0.3,
+                                     database_dir=database_dir, samples_dir=database_dir)
+        for sample_count in sample_counts:
+            embeddings = random_embeddings(sample_count + num_updates)
+            samples = [embedding.tolist() for embedding in embeddings[:sample_count]]  # As stored in samples_json
+            start = time.perf_counter()
+            for embedding in embeddings[sample_count:]:  # Each update is timed at sample_count + 1 samples
+                recomputed = np.mean([np.array(sample) for sample in samples + [embedding.tolist()]], axis=0)
+            recompute_ms = (time.perf_counter() - start) * 1000 / num_updates
+            embedding_sum = embeddings[:sample_count].astype(np.float64).sum(axis=0)
+            start = time.perf_counter()
+            for embedding in embeddings[sample_count:]:
+                avg_embedding, _, _ = db_handler.next_centroid(None, embedding_sum, sample_count, added=embedding)
+            running_ms = (time.perf_counter() - start) * 1000 / num_updates
+            print(f"{sample_count:>8} {recompute_ms:>13.3f} {running_ms:>15.4f} {np.abs(avg_embedding - recomputed).max():>13.2e}")
+
+def benchmark_index(sizes=(1000, 10000), num_queries=100, recall_k=10):
+    """LanceDB search with the managed ANN index vs exhaustive search: latency and recall@1 / recall@k."""
+    print(f"{'records':>8} {'index':>28} {'build ms':>9} {'exact ms':>9} {'ann ms':>7} {'recall@1':>9} {f'recall@{recall_k}':>10}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as database_dir:
+            db_handler, embeddings, _ = create_benchmark_db(size, database_dir)
+            queries, _ = noisy_queries(embeddings, num_queries)
+            table = db_handler.tbl_records
+            def search(query, exact):
+                builder = table.search(query.tolist(), vector_column_name='avg_embedding').metric('cosine').limit(recall_k).select(['global_id', '_distance'])
+                builder = builder.bypass_vector_index() if exact else db_handler.vector_index.configure(builder)
+                return [row['global_id'] for row in builder.to_list()]
+            exact_ms, exact_results = time_calls(lambda query: search(query, exact=True), queries)
+            db_handler.vector_index.rebuild()
+            stats = db_handler.vector_index.get_stats()
+            ann_ms, ann_results = time_calls(lambda query: search(query, exact=False), queries)
+            recall_1 = np.mean([a[0] == b[0] for a, b in zip(exact_results, ann_results)])
+            recall_k_value = np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(exact_results, ann_results)])
+            params = stats['index_params']
+            index = f"{params['index_type']} p={params['num_partitions']} nprobes={params['nprobes']}"
+            print(f"{size:>8} {index:>28} {stats['last_build_ms']:>9.0f} {exact_ms:>9.2f} {ann_ms:>7.2f} {recall_1 * 100:>8.1f}% {recall_k_value * 100:>9.1f}%")
+
+def benchmark_bulk(size=10000, unknown_fraction=0.3, sampled_updates=100):
+    """Table maintenance with the bulk primitives vs one operation per record (extrapolated from sampled_updates)."""
+    with tempfile.TemporaryDirectory() as database_dir:
+        db_handler, _, global_ids = create_benchmark_db(size, database_dir)
+        unknown_ids = global_ids[:int(size * unknown_fraction)]
+        start = time.perf_counter()
+        db_handler.update_records({global_id: {'label': 'Unknown'} for global_id in unknown_ids})
+        print(f"update_records: {len(unknown_ids)} labels in {(time.perf_counter() - start) * 1000:.0f} ms")
+        start = time.perf_counter()
+        for global_id in global_ids[-sampled_updates:]:
+            db_handler.tbl_records.update(where=f"global_id = '{global_id}'", values={'classificaiton_confidence_threshold': 0.5})
+        per_record_ms = (time.perf_counter() - start) * 1000 / sampled_updates
+        start = time.perf_counter()
+        db_handler.update_classification_confidence_threshold_for_all(0.4)
+        print(f"threshold for all {size} records: update_all {(time.perf_counter() - start) * 1000:.0f} ms, "
+              f"one update per record {per_record_ms * size / 1000:.1f} s (extrapolated from {per_record_ms:.1f} ms/record)")
+        start = time.perf_counter()
+        db_handler.clear_unknown_labels()
+        print(f"clear_unknown_labels: {len(unknown_ids)} records in {(time.perf_counter() - start) * 1000:.0f} ms, "
+              f"{db_handler.tbl_records.count_rows()} records left")
+        db_handler.vector_index.wait()  # The changes start a background index rebuild, let it finish before the directory is removed
+
+def benchmark_calibration(sizes=(1000, 10000), samples_per_record=10, sampled_records=100):
+    """
+    Threshold calibration of the whole gallery (read, compute, bulk write-back) per method, vs the per-record
+    covariance eigendecomposition (perform_pca) it replaces, extrapolated from sampled_records.
+    """
+    print(f"{'records':>8} {'method':>7} {'read ms':>8} {'compute ms':>11} {'total ms':>9} {'per-record PCA s':>17} {'max diff':>9}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as database_dir:
+            db_handler, _, _ = create_benchmark_db(size, database_dir, samples_per_record=samples_per_record)
+            start = time.perf_counter()
+            global_ids, embeddings, offsets = db_handler.get_sample_matrix()
+            read_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            areas = spread_areas(embeddings, offsets)
+            reference_areas = []
+            for i in range(sampled_records):
+                reduced_embeddings, _, _ = db_handler.perform_pca(embeddings[offsets[i]:offsets[i + 1]], n_components=2)
+                std_dev = np.std(reduced_embeddings, axis=0)
+                reference_areas.append(np.pi * std_dev[0] * std_dev[1])
+            per_record_s = (time.perf_counter() - start) * size / sampled_records
+            area_diff = np.abs(areas[:sampled_records] - reference_areas).max()
+            for method in CALIBRATION_METHODS:
+                db_handler.vector_index.wait()  # The previous write-back starts an index rebuild, not part of the timing
+                start = time.perf_counter()
+                if method == 'area':
+                    area_thresholds(embeddings, offsets)
+                else:
+                    margin_thresholds(embeddings, offsets, db_handler.classificaiton_confidence_threshold)
+                compute_ms = (time.perf_counter() - start) * 1000
+                start = time.perf_counter()
+                db_handler.calibrate_classification_confidence_threshold(method=method)
+                total_ms = (time.perf_counter() - start) * 1000
+                pca = f"{per_record_s:>17.1f}" if method == 'area' else f"{'':>17}"
+                diff = f"{area_diff:>9.1e}" if method == 'area' else f"{'':>9}"
+                print(f"{size:>8} {method:>7} {read_ms:>8.0f} {compute_ms:>11.0f} {total_ms:>9.0f} {pca} {diff}")
+            db_handler.vector_index.wait()
+
+BENCHMARKS = {
+    'search': benchmark_search,
+    'batch': benchmark_batch_search,
+    'samples': benchmark_samples,
+    'centroid': benchmark_centroid,
+    'index': benchmark_index,
+    'bulk': benchmark_bulk,
+    'calibration': benchmark_calibration,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Face recognition database benchmarks")
+    parser.add_argument("--benchmark", choices=list(BENCHMARKS.keys()) + ['all'], default='all')
+    args = parser.parse_args()
+    for name, benchmark in BENCHMARKS.items():
+        if args.benchmark in (name, 'all'):
+            print(f"--- {name} ---")
+            benchmark()
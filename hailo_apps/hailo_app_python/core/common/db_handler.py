@@ -3,20 +3,37 @@
 import os
 import json
 import uuid
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Tuple
 import time
 
 # Third-party imports
 import numpy as np
+import pyarrow as pa
 from lancedb.pydantic import Vector, LanceModel
 import lancedb
 
 # Local application-specific imports
 from hailo_apps.hailo_app_python.core.common.core import get_resource_path
-from hailo_apps.hailo_app_python.core.common.defines import FACE_RECON_DIR_NAME, FACE_RECON_SAMPLES_DIR_NAME, FACE_RECON_DATABASE_DIR_NAME
+from hailo_apps.hailo_app_python.core.common.defines import FACE_RECON_DIR_NAME, FACE_RECON_SAMPLES_DIR_NAME, FACE_RECON_DATABASE_DIR_NAME, EMBEDDING_DIM
 from hailo_apps.hailo_app_python.core.common.db_visualizer import DatabaseVisualizer
+from hailo_apps.hailo_app_python.core.common.embedding_cache import EmbeddingCache
+from hailo_apps.hailo_app_python.core.common.vector_index import VectorIndexManager
+from hailo_apps.hailo_app_python.core.common.calibration import CALIBRATION_METHODS, area_thresholds, margin_thresholds
 # endregion
 
+CACHE_COLUMNS = ['global_id', 'label', 'avg_embedding', 'classificaiton_confidence_threshold', 'last_sample_recieved_time']
+SAMPLES_TABLE_SUFFIX = '_samples'  # The samples of the records table 'persons' are stored in 'persons_samples'
+CENTROID_MODES = ['mean', 'ema']  # avg_embedding: exact mean of the samples, or exponential moving average (adapts to appearance drift)
+DEFAULT_EMA_WEIGHT = 0.1  # Weight of a new sample in the 'ema' centroid mode
+
+def sql_literal(value: str) -> str:
+    """Quotes a string for a LanceDB (SQL) filter."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+def sql_in(column: str, values: List[str]) -> str:
+    """Returns the SQL filter 'column IN (values)'."""
+    return f"{column} IN ({', '.join(sql_literal(value) for value in values)})"
+
 # Define the LanceModel schema for the records table
 class Record(LanceModel):
     # mandatory fields
@@ -24,13 +41,22 @@ class Record(LanceModel):
     label: str  # unique (but same IRL record might have multiple e.g., "Bob", "Bob glasses" etc.) with default "None" value
     avg_embedding: Vector(512) # type: ignore the warning
     last_sample_recieved_time: int  # epoch timestamp: In case the last sample removed - not maintend to previous sample time...
-    samples_json: str  # Store samples as a JSON string  # [{"embedding", "sample_path", "id"}] (path to sample)
+    embedding_sum: Vector(512, value_type=pa.float64())  # type: ignore  # running sum of the sample embeddings: avg_embedding is maintained in O(1) per sample
+    num_samples: int  # number of samples in the running sum
     classificaiton_confidence_threshold: float
     # optional fields, but default values are set
     value: float = 0.0  # in some cases numeric value might be relevant 
 
+# Define the LanceModel schema for the samples table: one row per sample, the samples of a record share its global_id
+class Sample(LanceModel):
+    id: str  # unique sample id
+    global_id: str  # the record the sample belongs to
+    embedding: Vector(512)  # type: ignore the warning  # float32
+    sample_path: str  # path to the sample image, might be empty
+    timestamp: int  # epoch timestamp of the sample, samples of a record are returned in this order
+
 class DatabaseHandler:
-    def __init__(self, db_name, table_name, schema, threshold, database_dir, samples_dir):
+    def __init__(self, db_name, table_name, schema, threshold, database_dir, samples_dir, centroid_mode='mean', ema_weight=DEFAULT_EMA_WEIGHT):
         self.db = self.__init_database(db_name=db_name, database_dir=database_dir, samples_dir=samples_dir)
         self.tbl_records = self.__init_table(
             self.db,
@@ -38,7 +64,23 @@ class DatabaseHandler:
             schema=schema,
             indexes=[('global_id', 'BTREE'), ('label', 'BTREE')]
         )
+        self.tbl_samples = self.__init_table(
+            self.db,
+            table_name=f"{table_name}{SAMPLES_TABLE_SUFFIX}",
+            schema=Sample,
+            indexes=[('global_id', 'BTREE'), ('id', 'BTREE')]
+        )
+        if 'samples_json' in self.tbl_records.schema.names:  # Database created before the samples table
+            self.__migrate_samples_json()
+        if 'num_samples' not in self.tbl_records.schema.names:  # Database created before the running sums
+            self.__migrate_running_sums()
+        if centroid_mode not in CENTROID_MODES:
+            raise ValueError(f"Invalid centroid mode '{centroid_mode}', expected one of {CENTROID_MODES}")
+        self.centroid_mode = centroid_mode
+        self.ema_weight = ema_weight
         self.classificaiton_confidence_threshold = threshold  # Default classification confidence threshold
+        self.embedding_cache = EmbeddingCache()  # RAM copy of the avg embeddings for search_record, loaded on first use
+        self.vector_index = VectorIndexManager(self.tbl_records, vector_column='avg_embedding', metric='cosine', dim=EMBEDDING_DIM)  # ANN index of the LanceDB search path
 
     def __init_database(self, db_name: str, database_dir: str, samples_dir: str):
         """
@@ -82,6 +124,145 @@ class DatabaseHandler:
                     table.create_scalar_index(column, index_type=index_type)
         return table
 
+    def __migrate_samples_json(self) -> None:
+        """
+        One-shot migration of the samples_json column (JSON list of the samples of each record) to the samples table.
+        The samples are inserted by id, so an interrupted migration can be run again, and the column is dropped at the end.
+        The original sample times are not known, all the samples get the record's last sample time (their order is kept).
+        """
+        start_time = time.perf_counter()
+        records = self.tbl_records.to_arrow().select(['global_id', 'samples_json', 'last_sample_recieved_time']).to_pylist()
+        samples = [
+            {'id': sample['id'], 'global_id': record['global_id'], 'embedding': sample['embedding'],
+             'sample_path': sample['sample_path'] or '', 'timestamp': record['last_sample_recieved_time']}
+            for record in records for sample in json.loads(record['samples_json'] or '[]')
+        ]
+        if samples:
+            self.tbl_samples.merge_insert('id').when_not_matched_insert_all().execute(samples)
+        self.tbl_records.drop_columns(['samples_json'])
+        print(f"Migrated {len(samples)} samples of {len(records)} records to the '{self.tbl_samples.name}' table "
+              f"in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+
+    def __migrate_running_sums(self) -> None:
+        """
+        One-shot migration: adds the embedding_sum and num_samples columns and fills them from the samples table.
+        """
+        self.tbl_records.add_columns([pa.field('embedding_sum', pa.list_(pa.float64(), EMBEDDING_DIM)), pa.field('num_samples', pa.int64())])
+        samples = self.get_samples()
+        global_ids = self.tbl_records.to_arrow().column('global_id').to_pylist()
+        sums = [np.sum([sample['embedding'] for sample in samples.get(global_id, [])], axis=0, dtype=np.float64) if samples.get(global_id)
+                else np.zeros(EMBEDDING_DIM) for global_id in global_ids]
+        if global_ids:
+            self.tbl_records.merge_insert('global_id').when_matched_update_all().execute(pa.table({
+                'global_id': global_ids,
+                'embedding_sum': pa.FixedSizeListArray.from_arrays(pa.array(np.concatenate(sums)), EMBEDDING_DIM),
+                'num_samples': pa.array([len(samples.get(global_id, [])) for global_id in global_ids], pa.int64())
+            }))
+        print(f"Added the running embedding sums of {len(global_ids)} records")
+
+    def next_centroid(self, avg_embedding: np.ndarray, embedding_sum: np.ndarray, num_samples: int,
+                      added: np.ndarray = None, removed: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Updates a record's centroid in O(1) for one added or removed sample.
+
+        In 'mean' mode avg_embedding is embedding_sum / num_samples, the same as the mean of the samples within float tolerance
+        (the sum is kept in float64). In 'ema' mode a new sample moves avg_embedding by ema_weight towards it, and a removal
+        resets it to the exact mean, since the contribution of a sample to the moving average is not known.
+
+        Args:
+            avg_embedding (np.ndarray): The current average embedding.
+            embedding_sum (np.ndarray): The current sum of the sample embeddings.
+            num_samples (int): The current number of samples.
+            added (np.ndarray): The embedding of the added sample.
+            removed (np.ndarray): The embedding of the removed sample.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, int]: The new average embedding (float32), sum (float64) and number of samples.
+        """
+        embedding_sum = np.asarray(embedding_sum, dtype=np.float64)
+        if added is not None:
+            embedding_sum = embedding_sum + np.asarray(added, dtype=np.float32)
+            num_samples += 1
+        if removed is not None:
+            embedding_sum = embedding_sum - np.asarray(removed, dtype=np.float32)
+            num_samples -= 1
+        if num_samples <= 0:
+            return np.zeros(EMBEDDING_DIM, dtype=np.float32), np.zeros(EMBEDDING_DIM), 0
+        if self.centroid_mode == 'ema' and added is not None and num_samples > 1:
+            avg_embedding = np.asarray(avg_embedding, dtype=np.float32)
+            avg_embedding = (1 - self.ema_weight) * avg_embedding + self.ema_weight * np.asarray(added, dtype=np.float32)
+        else:
+            avg_embedding = embedding_sum / num_samples
+        return avg_embedding.astype(np.float32), embedding_sum, num_samples
+
+    def add_sample(self, global_id: str, embedding: np.ndarray, sample: str, timestamp: int) -> Dict[str, Any]:
+        """
+        Adds a sample row to the samples table. The record's average embedding is not updated.
+
+        Args:
+            global_id (str): The global ID of the record the sample belongs to.
+            embedding (np.ndarray): The sample embedding vector.
+            sample (str): The sample file path.
+            timestamp (int): The timestamp of the sample.
+
+        Returns:
+            Dict[str, Any]: The sample with 'id', 'embedding', 'sample_path' and 'timestamp'.
+        """
+        sample_row = Sample(id=str(uuid.uuid4()), global_id=global_id, embedding=np.asarray(embedding, dtype=np.float32).tolist(),
+                            sample_path=sample or '', timestamp=timestamp)
+        self.tbl_samples.add([sample_row])
+        return {'id': sample_row.id, 'embedding': np.asarray(embedding, dtype=np.float32), 'sample_path': sample_row.sample_path, 'timestamp': timestamp}
+
+    def get_samples(self, global_ids: List[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Reads the samples of several records in one scan.
+
+        Args:
+            global_ids (List[str]): The records to read, all the records if None.
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: Per global ID, the samples ordered by time, each with 'id',
+                                             'embedding' (float32 np.ndarray), 'sample_path' and 'timestamp'.
+        """
+        if global_ids is None:
+            table = self.tbl_samples.to_arrow()
+        elif not global_ids:
+            return {}
+        else:
+            table = self.tbl_samples.search().where(sql_in('global_id', global_ids)).select(list(Sample.model_fields.keys())).to_arrow()
+        embeddings = table.column('embedding').combine_chunks().flatten().to_numpy().reshape(-1, EMBEDDING_DIM)
+        ids, owners, paths = table.column('id').to_pylist(), table.column('global_id').to_pylist(), table.column('sample_path').to_pylist()
+        timestamps = table.column('timestamp').to_numpy()
+        samples = {}
+        for row in np.argsort(timestamps, kind='stable'):  # Stable: samples with the same time keep their insertion order
+            samples.setdefault(owners[row], []).append(
+                {'id': ids[row], 'embedding': embeddings[row], 'sample_path': paths[row], 'timestamp': int(timestamps[row])})
+        return samples
+
+    def get_record_samples(self, global_id: str) -> List[Dict[str, Any]]:
+        """
+        Args:
+            global_id (str): The global ID of the record.
+
+        Returns:
+            List[Dict[str, Any]]: The samples of the record ordered by time, see get_samples.
+        """
+        return self.get_samples([global_id]).get(global_id, [])
+
+    def delete_samples_of_records(self, global_ids: List[str]) -> None:
+        """
+        Deletes the sample rows and the sample files of several records.
+
+        Args:
+            global_ids (List[str]): The global IDs of the records.
+        """
+        if not global_ids:
+            return
+        for samples in self.get_samples(global_ids).values():
+            for sample in samples:
+                self.delete_record_sample(sample)
+        self.tbl_samples.delete(sql_in('global_id', global_ids))
+
     def create_record(self, embedding: np.ndarray, sample: str, timestamp: int, label: str = 'Unknown') -> Dict[str, Any]:
         """
         Creates a record in the LanceDB table and generates a global ID.
@@ -97,44 +278,121 @@ class DatabaseHandler:
 
         Note: sample file path id != iamge id
 
-        In case after this insertion there are more than 256 records in the table, the table will be indexed by the embedding column.
+        The avg_embedding index is (re)built in the background by the VectorIndexManager once the table is large enough.
         """
         record = Record(global_id=str(uuid.uuid4()),
                         label=label, 
                         avg_embedding=embedding.tolist(),
                         last_sample_recieved_time=timestamp, 
-                        samples_json=json.dumps([{"embedding": embedding.tolist(),
-                                                  "sample_path": sample,
-                                                  "id": str(uuid.uuid4())}]),
+                        embedding_sum=np.asarray(embedding, dtype=np.float32).astype(np.float64).tolist(),
+                        num_samples=1,
                         classificaiton_confidence_threshold=self.classificaiton_confidence_threshold)
         self.tbl_records.add([record])
-        if len(self.tbl_records.search().to_list()) > 256:
-            self.tbl_records.create_index(vector_column_name='embedding', metric="cosine", replace=True)
-        return record.model_dump()
+        first_sample = self.add_sample(record.global_id, embedding=embedding, sample=sample, timestamp=timestamp)
+        self.embedding_cache.upsert(record.global_id, avg_embedding=embedding, label=label, threshold=record.classificaiton_confidence_threshold, timestamp=timestamp)
+        self.vector_index.note_changes(1)
+        return {**record.model_dump(), 'samples': [first_sample]}
+
+    def add_records_batch(self, new_records: List[Tuple[str, str, List[Tuple[np.ndarray, str, int]]]]) -> List[Dict[str, Any]]:
+        """
+        Writes new records with their samples, with a single add per table. The global IDs are chosen by the caller.
+
+        Args:
+            new_records (List[Tuple[str, str, List[Tuple[np.ndarray, str, int]]]]): (global ID, label, samples) per record,
+                each sample as (embedding, sample path, timestamp), in order. Records without samples are skipped.
+
+        Returns:
+            List[Dict[str, Any]]: The created records (without their samples).
+        """
+        records, samples = [], []
+        for global_id, label, record_samples in new_records:
+            if not record_samples:
+                continue
+            avg_embedding, embedding_sum, num_samples = None, np.zeros(EMBEDDING_DIM), 0
+            for embedding, sample_path, timestamp in record_samples:
+                avg_embedding, embedding_sum, num_samples = self.next_centroid(avg_embedding, embedding_sum, num_samples, added=embedding)
+                samples.append(Sample(id=str(uuid.uuid4()), global_id=global_id, embedding=np.asarray(embedding, dtype=np.float32).tolist(),
+                                      sample_path=sample_path or '', timestamp=timestamp))
+            records.append(Record(global_id=global_id, label=label, avg_embedding=avg_embedding.tolist(),
+                                  last_sample_recieved_time=max(timestamp for _, _, timestamp in record_samples),
+                                  embedding_sum=embedding_sum.tolist(), num_samples=num_samples,
+                                  classificaiton_confidence_threshold=self.classificaiton_confidence_threshold))
+        if not records:
+            return []
+        self.tbl_records.add(records)
+        self.tbl_samples.add(samples)
+        for record in records:
+            self.embedding_cache.upsert(record.global_id, avg_embedding=record.avg_embedding, label=record.label,
+                                        threshold=record.classificaiton_confidence_threshold, timestamp=record.last_sample_recieved_time)
+        self.vector_index.note_changes(len(records))
+        return [record.model_dump() for record in records]
+
+    def insert_samples_batch(self, new_samples: Dict[str, List[Tuple[np.ndarray, str, int]]]) -> List[str]:
+        """
+        Adds samples to several existing records: one read of their running sums, one add to the samples table
+        and one merge-insert of the updated centroids (see next_centroid).
+
+        Args:
+            new_samples (Dict[str, List[Tuple[np.ndarray, str, int]]]): Per global ID, the (embedding, sample path, timestamp)
+                of the added samples, in order.
+
+        Returns:
+            List[str]: The global IDs that are not in the table, their samples were not added.
+        """
+        new_samples = {global_id: samples for global_id, samples in new_samples.items() if samples}
+        if not new_samples:
+            return []
+        records = self.tbl_records.search().where(sql_in('global_id', list(new_samples))).select(
+            ['global_id', 'avg_embedding', 'embedding_sum', 'num_samples']).to_list()
+        rows, updates = [], {}
+        for record in records:
+            avg_embedding, embedding_sum, num_samples = record['avg_embedding'], record['embedding_sum'], record['num_samples']
+            for embedding, sample_path, timestamp in new_samples[record['global_id']]:
+                avg_embedding, embedding_sum, num_samples = self.next_centroid(avg_embedding, embedding_sum, num_samples, added=embedding)
+                rows.append(Sample(id=str(uuid.uuid4()), global_id=record['global_id'], embedding=np.asarray(embedding, dtype=np.float32).tolist(),
+                                   sample_path=sample_path or '', timestamp=timestamp))
+            updates[record['global_id']] = {
+                'avg_embedding': avg_embedding.tolist(),
+                'embedding_sum': embedding_sum.tolist(),
+                'num_samples': num_samples,
+                'last_sample_recieved_time': max(timestamp for _, _, timestamp in new_samples[record['global_id']])
+            }
+        if rows:
+            self.tbl_samples.add(rows)
+            self.update_records(updates)
+            for global_id, values in updates.items():
+                self.embedding_cache.upsert(global_id, avg_embedding=values['avg_embedding'], timestamp=values['last_sample_recieved_time'])
+        return [global_id for global_id in new_samples if global_id not in updates]
 
     def insert_new_sample(self, record: Dict[str, Any], embedding: np.ndarray, sample: str, timestamp: int) -> None:
         """
-        Adds a new sample to a record, creates for the sample id and recalculates the average embedding.
+        Adds a new sample to a record, creates for the sample id and updates the average embedding
+        from the record's running sum (see next_centroid), without reading the other samples.
 
         Args:
-            record (Dict[str, Any]): The record to insert the sample into.
+            record (Dict[str, Any]): The record to insert the sample into, as returned by get_record_by_id (updated in place).
             embedding (np.ndarray): The sample embedding vector.
             sample (str): The sample sample path.
             timestamp (int): The timestamp of the sample.
         """
-        samples = record['samples_json']
-        samples.append({"embedding": embedding.tolist(), "sample_path": sample, "id": str(uuid.uuid4())})
-        all_embeddings = [np.array(sample["embedding"]) for sample in samples]  # Recalculate the average embedding
-        avg_embedding = np.mean(all_embeddings, axis=0)
-        self.tbl_records.update(where=f"global_id = '{record['global_id']}'", values={
-            'avg_embedding': avg_embedding, 
-            'samples_json': json.dumps(samples),
+        new_sample = self.add_sample(record['global_id'], embedding=embedding, sample=sample, timestamp=timestamp)
+        if record.get('samples') is not None:
+            record['samples'].append(new_sample)
+        avg_embedding, embedding_sum, num_samples = self.next_centroid(
+            record['avg_embedding'], record['embedding_sum'], record['num_samples'], added=new_sample['embedding'])
+        self.tbl_records.update(where=f"global_id = {sql_literal(record['global_id'])}", values={
+            'avg_embedding': avg_embedding.tolist(), 
+            'embedding_sum': embedding_sum.tolist(),
+            'num_samples': num_samples,
             'last_sample_recieved_time': timestamp
         })
+        record.update({'avg_embedding': avg_embedding, 'embedding_sum': embedding_sum, 'num_samples': num_samples, 'last_sample_recieved_time': timestamp})
+        self.vector_index.note_changes(1)
+        self.embedding_cache.upsert(record['global_id'], avg_embedding=avg_embedding, timestamp=timestamp)
 
     def remove_sample_by_id(self, global_id: str, sample_id: str) -> bool:
         """
-        Removes a sample from a record & recalculates the average embedding.
+        Removes a sample from a record & updates the average embedding from the running sum.
 
         Args:
             global_id (str): The global ID of the record to remove from.
@@ -143,24 +401,140 @@ class DatabaseHandler:
         Returns:
             bool: True if the record was removed, False otherwise.
         """
-        record = self.tbl_records.search().where(f"global_id = '{global_id}'").to_list()[0]
-        samples = json.loads(record['samples_json'])
-        sample_to_delete = [sample for sample in samples if sample['id'] == sample_id][0]
+        sample_to_delete = self.tbl_samples.search().where(f"id = {sql_literal(sample_id)}").select(['id', 'embedding', 'sample_path']).to_list()[0]
+        record = self.tbl_records.search().where(f"global_id = {sql_literal(global_id)}").select(['avg_embedding', 'embedding_sum', 'num_samples']).to_list()[0]
         self.delete_record_sample(sample_to_delete)
-        new_samples = [sample for sample in samples if sample['id'] != sample_id]
-        if not new_samples:  # If there are no more samples, remove the record from the database
-            self.tbl_records.delete(where=f"global_id = '{global_id}'")
+        self.tbl_samples.delete(f"id = {sql_literal(sample_id)}")
+        avg_embedding, embedding_sum, num_samples = self.next_centroid(
+            record['avg_embedding'], record['embedding_sum'], record['num_samples'], removed=sample_to_delete['embedding'])
+        if num_samples == 0:  # If there are no more samples, remove the record from the database
+            self.tbl_records.delete(where=f"global_id = {sql_literal(global_id)}")
+            self.embedding_cache.remove(global_id)
+            self.vector_index.note_changes(1)
             return True
-        else:  # Update the record's record with the new list of samples and the recalculated average embedding
-            self.tbl_records.update(where=f"global_id = '{global_id}'", values={
-                'avg_embedding': np.mean([np.array(sample['embedding']) for sample in new_samples], axis=0).tolist(), 
-                'samples_json': json.dumps(new_samples)
+        else:  # Update the record with the new average embedding
+            self.tbl_records.update(where=f"global_id = {sql_literal(global_id)}", values={
+                'avg_embedding': avg_embedding.tolist(),
+                'embedding_sum': embedding_sum.tolist(),
+                'num_samples': num_samples
             })
+            self.embedding_cache.upsert(global_id, avg_embedding=avg_embedding)
+            self.vector_index.note_changes(1)
             return False
 
-    def search_record(self, embedding: np.ndarray, top_k: int = 1, metric_type: str = 'cosine') -> Dict[str, Any]:
+    def remove_samples(self, global_id: str, sample_ids: List[str]) -> bool:
+        """
+        Removes several samples of a record (rows and files) & updates the average embedding from the running sum,
+        with one read and one write per table.
+
+        Args:
+            global_id (str): The global ID of the record to remove from.
+            sample_ids (List[str]): The IDs of the samples to remove.
+
+        Returns:
+            bool: True if the record was removed (no samples left), False otherwise.
+        """
+        if not sample_ids:
+            return False
+        predicate = f"global_id = {sql_literal(global_id)} AND {sql_in('id', sample_ids)}"
+        samples_to_delete = self.tbl_samples.search().where(predicate).select(['id', 'embedding', 'sample_path']).to_list()
+        record = self.tbl_records.search().where(f"global_id = {sql_literal(global_id)}").select(['avg_embedding', 'embedding_sum', 'num_samples']).to_list()
+        if not samples_to_delete or not record:
+            return False
+        for sample in samples_to_delete:
+            self.delete_record_sample(sample)
+        self.tbl_samples.delete(predicate)
+        removed_sum = np.sum([np.asarray(sample['embedding'], dtype=np.float32) for sample in samples_to_delete], axis=0, dtype=np.float64)
+        avg_embedding, embedding_sum, num_samples = self.next_centroid(
+            record[0]['avg_embedding'], np.asarray(record[0]['embedding_sum'], dtype=np.float64) - removed_sum,
+            record[0]['num_samples'] - len(samples_to_delete))
+        if num_samples == 0:
+            self.tbl_records.delete(f"global_id = {sql_literal(global_id)}")
+            self.embedding_cache.remove(global_id)
+            self.vector_index.note_changes(1)
+            return True
+        self.update_records({global_id: {'avg_embedding': avg_embedding.tolist(), 'embedding_sum': embedding_sum.tolist(), 'num_samples': num_samples}})
+        self.embedding_cache.upsert(global_id, avg_embedding=avg_embedding)
+        return False
+
+    def get_embedding_cache(self) -> EmbeddingCache:
+        """
+        Returns the in-memory embedding cache, (re)loading it from the table if it was invalidated.
+        """
+        if not self.embedding_cache.valid:
+            self.embedding_cache.load(self.tbl_records.to_arrow().select(CACHE_COLUMNS).to_pylist())
+        return self.embedding_cache
+
+    def search_record(self, embedding: np.ndarray, top_k: int = 1, metric_type: str = 'cosine', with_samples: bool = False) -> Dict[str, Any]:
+        """
+        Searches for the record with the closest average embedding, using the in-memory embedding cache.
+
+        Args:
+            embedding (np.ndarray): The sample embedding vector to search for.
+            top_k (int): The number of top results to consider.
+            metric_type (str): The similarity metric to use. Only "cosine" is served from the cache,
+                               other metrics are searched in LanceDB.
+            with_samples (bool): Also read the samples of the matched record from the table.
+                                 The recognition path does not need them, by default 'samples' and 'avg_embedding' are None.
+
+        Returns:
+            Dict[str, Any]: The search result with classification confidence.
+        """
+        if metric_type != 'cosine':
+            return self.search_record_lancedb(embedding, top_k=top_k, metric_type=metric_type)
+        return self.resolve_match(self.search_records_batch(np.asarray(embedding).reshape(1, -1), top_k=top_k)[0], with_samples=with_samples)
+
+    def search_records_batch(self, embeddings: np.ndarray, top_k: int = 1) -> List[List[Dict[str, Any]]]:
+        """
+        Searches the closest records for several embeddings (e.g. all the faces of a frame) in one vectorized call.
+
+        Args:
+            embeddings (np.ndarray): The sample embedding vectors, shape (N, 512).
+            top_k (int): The number of matches per embedding.
+
+        Returns:
+            List[List[Dict[str, Any]]]: Per embedding, the top_k matches (best first) with their '_distance'
+                                        (cosine distance). No threshold is applied, see resolve_match.
+        """
+        return [[{**match, 'avg_embedding': None, 'samples': None, '_distance': 1 - similarity} for match, similarity in matches]
+                for matches in self.get_embedding_cache().search_batch(embeddings, top_k=top_k)]
+
+    def resolve_match(self, matches: List[Dict[str, Any]], with_samples: bool = False) -> Dict[str, Any]:
+        """
+        Applies the classification confidence threshold of the best match.
+
+        Args:
+            matches (List[Dict[str, Any]]): The matches of one embedding, as returned by search_records_batch.
+            with_samples (bool): Read the samples of the matched record from the table.
+
+        Returns:
+            Dict[str, Any]: The matched record, or an 'Unknown' result if the best match is below its threshold.
+        """
+        if matches:
+            match = matches[0]
+            if (1 - match['_distance']) > match['classificaiton_confidence_threshold']:
+                if with_samples:
+                    return {**self.get_record_by_id(match['global_id']), '_distance': match['_distance']}
+                return match
+        return self.unknown_search_result()
+
+    def unknown_search_result(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: The search result used when there is no match in the database.
+        """
+        return {'global_id': str(uuid.uuid4()),
+                'label': 'Unknown', 
+                'avg_embedding': None,
+                'last_sample_recieved_time': None, 
+                'samples': None,
+                'classificaiton_confidence_threshold': None,
+                '_distance': 0.0}
+
+    def search_record_lancedb(self, embedding: np.ndarray, top_k: int = 1, metric_type: str = 'cosine') -> Dict[str, Any]:
         """
         Searches for a record in the LanceDB table by embedding vector similarity.
+        Reference path for search_record (non-cosine metrics, benchmarking).
 
         Args:
             embedding (np.ndarray): The sample embedding vector to search for.
@@ -170,27 +544,21 @@ class DatabaseHandler:
         Returns:
             Dict[str, Any]: The search result with classification confidence.
         """
-        search_result = (
+        query = (
             self.tbl_records.search(
                 embedding.tolist(),
                 vector_column_name='avg_embedding'
             )
             .metric(metric_type)
             .limit(top_k)
-            .to_list()
         )
+        search_result = self.vector_index.configure(query, metric=metric_type).to_list()  # Brute force if the table is not indexed
         if search_result:
-            search_result[0]['samples_json'] = json.loads(search_result[0]['samples_json'])
+            search_result[0]['samples'] = self.get_record_samples(search_result[0]['global_id'])
             if (1 - search_result[0]['_distance']) > search_result[0]['classificaiton_confidence_threshold']:  # if search_result[0]['_distance']>1 the condition is false by default (1-1.1=-0.1) because default value if 0.3
                 return search_result[0]
         # No match from DB
-        return {'global_id': str(uuid.uuid4()),
-                'label': 'Unknown', 
-                'avg_embedding': None,
-                'last_sample_recieved_time': None, 
-                'samples_json': None,
-                'classificaiton_confidence_threshold': None,
-                '_distance': 0.0}
+        return self.unknown_search_result()
 
     def update_record_label(self, global_id: str, label: str = 'Unknown') -> None:
         """
@@ -200,7 +568,9 @@ class DatabaseHandler:
             global_id (str): The global ID of the record to update.
             label (str): The new label to associate with the record.
         """
-        self.tbl_records.update(where=f"global_id = '{global_id}'", values={'label': label})
+        self.tbl_records.update(where=f"global_id = {sql_literal(global_id)}", values={'label': label})
+        self.embedding_cache.upsert(global_id, label=label)
+        self.vector_index.note_changes(1)  # LanceDB updates rewrite the row
 
     def update_record_classificaiton_confidence_threshold(self, global_id: str, classificaiton_confidence_threshold: float) -> None:
         """
@@ -210,7 +580,9 @@ class DatabaseHandler:
             global_id (str): The global ID of the record to update.
             classificaiton_confidence_threshold (str): The new classificaiton confidence threshold to associate with the record.
         """
-        self.tbl_records.update(where=f"global_id = '{global_id}'", values={'classificaiton_confidence_threshold': classificaiton_confidence_threshold})
+        self.tbl_records.update(where=f"global_id = {sql_literal(global_id)}", values={'classificaiton_confidence_threshold': classificaiton_confidence_threshold})
+        self.embedding_cache.upsert(global_id, threshold=classificaiton_confidence_threshold)
+        self.vector_index.note_changes(1)
 
     def update_classification_confidence_threshold_for_all(self, new_threshold: float) -> None:
         """
@@ -219,15 +591,61 @@ class DatabaseHandler:
         Args:
             new_threshold (float): The new confidence threshold value to set for all records.
         """
-        # Get all records from the database
-        records = self.get_all_records()
-        # Iterate through each record and update the classification_confidence_threshold
-        for record in records:
-            global_id = record['global_id']  # Assuming each record has a unique global_id
-            self.tbl_records.update(
-                where=f"global_id = '{global_id}'",
-                values={'classificaiton_confidence_threshold': new_threshold}
-            )
+        num_records = self.update_all({'classificaiton_confidence_threshold': new_threshold})
+        self.embedding_cache.set_all_thresholds(new_threshold)
+        self.vector_index.note_changes(num_records)
+
+    def update_all(self, values: Dict[str, Any]) -> int:
+        """
+        Sets columns of all the records in a single table operation.
+        The embedding cache is not updated, see the callers.
+
+        Args:
+            values (Dict[str, Any]): Column -> value.
+
+        Returns:
+            int: The number of updated records.
+        """
+        self.tbl_records.update(values=values)
+        return self.tbl_records.count_rows()
+
+    def update_records(self, updates: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Sets per-record values (e.g. labels or thresholds of many records) with one merge-insert per set of columns.
+
+        Args:
+            updates (Dict[str, Dict[str, Any]]): global ID -> {column: value}. Only existing records are updated.
+        """
+        by_columns = {}
+        for global_id, values in updates.items():
+            by_columns.setdefault(tuple(sorted(values)), []).append({'global_id': global_id, **values})
+        schema = self.tbl_records.schema
+        for columns, rows in by_columns.items():
+            fields = [schema.field('global_id')] + [schema.field(column) for column in columns]
+            self.tbl_records.merge_insert('global_id').when_matched_update_all().execute(pa.Table.from_pylist(rows, schema=pa.schema(fields)))
+        for global_id, values in updates.items():
+            self.embedding_cache.upsert(global_id, label=values.get('label'), threshold=values.get('classificaiton_confidence_threshold'))
+        self.vector_index.note_changes(len(updates))
+
+    def delete_where(self, predicate: str) -> List[str]:
+        """
+        Deletes the records matching a predicate, with their samples, in one delete per table.
+
+        Args:
+            predicate (str): A LanceDB (SQL) filter on the records table, e.g. "label = 'Unknown'".
+
+        Returns:
+            List[str]: The global IDs of the deleted records.
+        """
+        global_ids = self.tbl_records.search().where(predicate).select(['global_id']).to_arrow().column('global_id').to_pylist()
+        if not global_ids:
+            return []
+        self.delete_samples_of_records(global_ids)
+        self.tbl_records.delete(predicate)
+        for global_id in global_ids:
+            self.embedding_cache.remove(global_id)
+        self.vector_index.note_changes(len(global_ids))
+        return global_ids
 
     def delete_record(self, global_id: str) -> None:
         """
@@ -236,17 +654,17 @@ class DatabaseHandler:
         Args:
             global_id (str): The global ID of the record to delete.
         """
-        record = self.get_record_by_id(global_id)
-        for sample in record['samples_json']:
-            self.delete_record_sample(sample)
-        self.tbl_records.delete('global_id = "' + global_id + '"')
+        self.delete_where(f"global_id = {sql_literal(global_id)}")
 
     def clear_table(self) -> None:
         """
         Deletes all records from the LanceDB table.
         """
-        to_delete = ', '.join([f"'{record['global_id']}'" for record in self.tbl_records.search().to_list()])  # Get all records
-        self.tbl_records.delete(f"global_id IN ({to_delete})")
+        num_records = self.tbl_records.count_rows()
+        self.tbl_records.delete("true")
+        self.tbl_samples.delete("true")
+        self.embedding_cache.clear()
+        self.vector_index.note_changes(num_records)
         # Clear all files from the 'resources/samples' folder
         samples_dir = get_resource_path(pipeline_name=None, resource_type=FACE_RECON_DIR_NAME, model=FACE_RECON_SAMPLES_DIR_NAME)
         if os.path.exists(samples_dir):
@@ -260,55 +678,32 @@ class DatabaseHandler:
         """
         Deletes all records from the LanceDB table with the label 'Unknown'.
         """
-        records = self.tbl_records.search().where("label = 'Unknown'").to_list()
-        if len(records) > 0:
-            for record in records:
-                for sample in json.loads(record['samples_json']):
-                    self.delete_record_sample(sample)
-            to_delete = ', '.join([f"'{record['global_id']}'" for record in records])
-            self.tbl_records.delete(f"global_id IN ({to_delete})")
+        self.delete_where("label = 'Unknown'")
 
     def clear_unknown_labels_keep_latest(self) -> None:
         """
         Deletes all records from the LanceDB table with the label 'Unknown',
         except the latest one based on the last sample received time.
         """
-        # Fetch all records with the label 'Unknown'
-        records = self.tbl_records.search().where("label = 'Unknown'").to_list()
+        # Fetch the ids and times of the records with the label 'Unknown'
+        records = self.tbl_records.search().where("label = 'Unknown'").select(['global_id', 'last_sample_recieved_time']).to_list()
+        if not records:
+            return
         current_time = int(time.time())
-        if len(records) > 1:  # Only proceed if there are 'Unknown' records
-            # Find the record with the latest 'last_sample_recieved_time'
-            latest_record = max(records, key=lambda record: self.get_records_last_sample_recieved_time(record['global_id']))
-            latest_global_id = latest_record['global_id']
-
-            # if latest timestamp is older than 10 seconds - delete him also: this is the case when start button clicked but no person in front of the camera - so the latest might be from previous run
-            if current_time - latest_record['last_sample_recieved_time'] < 10:
-                # Filter out the latest record and prepare the rest for deletion
-                records_to_delete = [record for record in records if record['global_id'] != latest_global_id]
-            else:
-                records_to_delete = records
-
-            for record in records_to_delete:
-                for sample in json.loads(record['samples_json']):
-                    self.delete_record_sample(sample)
-            
-            to_delete = ', '.join([f"'{record['global_id']}'" for record in records_to_delete])
-            self.tbl_records.delete(f"global_id IN ({to_delete})")
-            self.keep_only_last_sample(latest_global_id)
-        
-        elif len(records) == 1:
-            latest_record = records[0]
-            if current_time - latest_record['last_sample_recieved_time'] < 10:
-                # If there's only one 'Unknown' record, keep it as is
-                latest_global_id = latest_record['global_id']
-                self.keep_only_last_sample(latest_global_id)
-            else:
-                self.delete_record(latest_global_id)  # Delete the only record if it's older than 10 seconds
+        # Find the record with the latest 'last_sample_recieved_time'
+        latest_record = max(records, key=lambda record: record['last_sample_recieved_time'])
+        # if latest timestamp is older than 10 seconds - delete him also: this is the case when start button clicked but no person in front of the camera - so the latest might be from previous run
+        if current_time - latest_record['last_sample_recieved_time'] < 10:
+            if len(records) > 1:
+                self.delete_where(f"label = 'Unknown' AND global_id != {sql_literal(latest_record['global_id'])}")
+            self.keep_only_last_sample(latest_record['global_id'])
+        else:
+            self.delete_where("label = 'Unknown'")
             
     def keep_only_last_sample(self, global_id: str) -> None:
         """
         Updates the record with the given global_id to retain only the last sample
-        in the samples_json field.
+        in the samples table.
         Assumption - samples are added in order of time - the last one is the latest one.
 
         Args:
@@ -319,8 +714,8 @@ class DatabaseHandler:
         if not record:
             return
 
-        # Parse the samples_json field
-        samples = record.get('samples_json', [])
+        # Samples are ordered by time
+        samples = record.get('samples', [])
         if len(samples) > 1:
             # Keep only the last sample
             for sample in samples[:-1]:
@@ -334,15 +729,17 @@ class DatabaseHandler:
             only_unknowns (bool): If True, return only records with the label 'Unknown'.
 
         Returns:
-            List[Dict[str, Any]]: All the records.
+            List[Dict[str, Any]]: All the records, with their 'samples' (see get_samples).
         """
         if only_unknowns:
             records = self.tbl_records.search().where("label = 'Unknown'").to_list()
+            samples = self.get_samples([record['global_id'] for record in records])
         else:
             records = self.tbl_records.search().to_list()
+            samples = self.get_samples()
         
         for record in records:
-            record['samples_json'] = json.loads(record['samples_json'])
+            record['samples'] = samples.get(record['global_id'], [])
         return records
 
     def get_record_by_id(self, global_id: str) -> Dict[str, Any]:
@@ -355,9 +752,10 @@ class DatabaseHandler:
         Returns:
             Dict[str, Any]: The record record.
         """
-        result = self.tbl_records.search().where(f"global_id = '{global_id}'").to_list()[0]
-        if result:
-            result['samples_json'] = json.loads(result['samples_json'])
+        results = self.tbl_records.search().where(f"global_id = {sql_literal(global_id)}").to_list()
+        if results:
+            result = results[0]
+            result['samples'] = self.get_record_samples(global_id)
             return result
         return None
 
@@ -371,7 +769,7 @@ class DatabaseHandler:
         Returns:
             Dict[str, Any]: The record record.
         """
-        results = self.tbl_records.search().where(f"label = '{label}'").to_list()
+        results = self.tbl_records.search().where(f"label = {sql_literal(label)}").to_list()
         if not results:  # Check if the list is empty
             return None  # Return None if no records are found
         return results[0]  # Return the first record if it exists
@@ -386,7 +784,7 @@ class DatabaseHandler:
         Returns:
             int: The number of samples.
         """
-        return len(self.get_record_by_id(global_id)['samples_json'])
+        return self.tbl_samples.count_rows(f"global_id = {sql_literal(global_id)}")
 
     def get_records_classificaiton_confidence_threshold(self, global_id: str) -> float:
         """
@@ -413,9 +811,9 @@ class DatabaseHandler:
         """
         return self.get_record_by_id(global_id)['last_sample_recieved_time']
 
-    def delete_record_sample(self, sample: Tuple[str, str, str]):
+    def delete_record_sample(self, sample: Dict[str, Any]):
         """
-        Deletes the sample sample file.
+        Deletes the sample file (the sample row is deleted by the caller).
 
         Args:
             sample (Dict[str, Any]): The sample record containing the sample file path.
@@ -424,47 +822,50 @@ class DatabaseHandler:
         if sample_path and os.path.exists(sample_path):
             os.remove(sample_path)
 
-    def calibrate_classification_confidence_threshold(self):
+    def get_sample_matrix(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
         """
-        Calibrates the classification confidence threshold based on confidence circles area.
-        Smaller areas result in a smaller classification confidence threshold.
-        """
-        records = self.tbl_records.search().to_list()
-        areas = []
-
-        for record in records:
-            # Get embeddings for the record
-            samples = json.loads(record['samples_json'])
-            embeddings = [np.array(sample['embedding']) for sample in samples]
-
-            if len(embeddings) < 2:
-                # Skip calibration if there are not enough embeddings to calculate variance
-                areas.append(0)
-                continue
+        Reads all the sample embeddings into one contiguous array grouped by record, without per-sample objects.
 
-            # Perform PCA to reduce embeddings to 2D
-            reduced_embeddings, principal_components, mean = self.perform_pca(embeddings, n_components=2)
+        Returns:
+            Tuple[List[str], np.ndarray, np.ndarray]: The global IDs of all the records, the embeddings (float32, shape (N, 512))
+                and the segment offsets (shape (R + 1,)): the samples of global_ids[i] are embeddings[offsets[i]:offsets[i + 1]].
+        """
+        global_ids = self.tbl_records.search().select(['global_id']).to_arrow().column('global_id').to_pylist()
+        table = self.tbl_samples.search().select(['global_id', 'embedding']).to_arrow()
+        embeddings = table.column('embedding').combine_chunks().flatten().to_numpy().reshape(-1, EMBEDDING_DIM)
+        rows = {global_id: i for i, global_id in enumerate(global_ids)}
+        owners = np.array([rows.get(global_id, -1) for global_id in table.column('global_id').to_pylist()], dtype=np.int64)
+        known = owners >= 0  # Samples of deleted records are ignored
+        order = np.argsort(owners[known], kind='stable')
+        counts = np.bincount(owners[known], minlength=len(global_ids))
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return global_ids, np.ascontiguousarray(embeddings[known][order], dtype=np.float32), offsets
 
-            # Calculate standard deviations (semi-major and semi-minor axes)
-            std_dev = np.std(reduced_embeddings, axis=0)
-            semi_major_axis, semi_minor_axis = std_dev[0], std_dev[1]
+    def calibrate_classification_confidence_threshold(self, method: str = 'area') -> Dict[str, float]:
+        """
+        Calibrates the classification confidence threshold of all the records in one pass over the gallery,
+        and writes them back with one bulk operation.
 
-            # Calculate the area of the confidence circle (ellipse)
-            area = np.pi * semi_major_axis * semi_minor_axis
-            areas.append(area)
+        Args:
+            method (str): 'area': based on confidence circles area, smaller areas result in a higher threshold.
+                          'margin': halfway between the similarity of a record's samples to its centroid and the
+                          similarity to the nearest other centroid. See core/common/calibration.py.
 
-        # Normalize areas for threshold calibration
-        areas = np.array(areas)
-        if len(areas) > 0 and np.max(areas) != np.min(areas):  # Avoid division by zero
-            norm_areas = (areas - np.min(areas)) / (np.max(areas) - np.min(areas))
+        Returns:
+            Dict[str, float]: The new threshold per global ID.
+        """
+        if method not in CALIBRATION_METHODS:
+            raise ValueError(f"Invalid calibration method '{method}', expected one of {CALIBRATION_METHODS}")
+        global_ids, embeddings, offsets = self.get_sample_matrix()
+        if not global_ids:
+            return {}
+        if method == 'area':
+            thresholds = area_thresholds(embeddings, offsets)
         else:
-            norm_areas = np.zeros_like(areas)
-
-        for i, record in enumerate(records):
-            # Calculate the new threshold based on normalized area
-            # Ensure the threshold is between 0.1 and 0.9
-            new_threshold = 0.1 + (0.9 - 0.1) * (1 - norm_areas[i])  # Scale to [0.1, 0.9]
-            self.update_record_classificaiton_confidence_threshold(record['global_id'], new_threshold)
+            thresholds = margin_thresholds(embeddings, offsets, self.classificaiton_confidence_threshold)
+        new_thresholds = {global_id: float(threshold) for global_id, threshold in zip(global_ids, thresholds)}
+        self.update_records({global_id: {'classificaiton_confidence_threshold': threshold} for global_id, threshold in new_thresholds.items()})
+        return new_thresholds
 
     def perform_pca(self, embeddings, n_components=2):
         """
@@ -1,6 +1,8 @@
 # region imports
 # Standard library imports
+import io
 import os
+import time
 
 # Third-party imports
 import numpy as np
@@ -8,14 +10,30 @@ from matplotlib.patches import Ellipse
 from matplotlib.offsetbox import OffsetImage, AnnotationBbox
 from PIL import Image, ImageDraw
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# Local application-specific imports
+from hailo_apps.hailo_app_python.core.common.projection_cache import ProjectionCache
 # endregion imports
 
+LIVE_POINTS_CAPACITY = 256  # Live embeddings kept on the plot (ring), the oldest are overwritten
+LIVE_LABELS_CAPACITY = 16  # Labels of the most recent live embeddings
+LIVE_THUMBNAILS_CAPACITY = 8  # Thumbnails of the most recent live embeddings
+LIVE_MAX_FPS = 5  # Maximal redraw rate of the live layer
+UI_IMAGE_FORMAT = 'PNG'  # Encoding of the plots rendered for the UI
+UI_PNG_COMPRESS_LEVEL = 3  # zlib level: a fast encode, most of the size reduction of the default level 6
+
 class DatabaseVisualizer:
     def __init__(self):
         self.db_records = None
         self.global_ax = None
-        self.global_pca = None
+        self.projection = ProjectionCache()  # 2-D PCA basis and per-sample coordinates, updated incrementally between refreshes
         self.global_fig = None
+        self.live_scatter = None  # Live layer, see init_live_layer
+        self.draw_event_canvas = None
+        self.last_refresh_time = 0.0
+        self.refresh_pending = False
 
     def set_db_records(self, db_records):
         """
@@ -26,9 +44,18 @@ class DatabaseVisualizer:
         """
         self.db_records = db_records
 
-    def create_blank_figure(self):
+    def create_figure(self, mode, figsize):
+        """Creates the figure: a pyplot (GUI) figure in 'cli' mode, an off-screen Agg figure in 'ui' mode."""
+        if mode == 'cli':
+            return plt.subplots(figsize=figsize)
+        figure = Figure(figsize=figsize)
+        FigureCanvasAgg(figure)
+        return figure, figure.add_subplot()
+
+    def create_blank_figure(self, mode='ui'):
         # Create a blank figure with a message
-        self.global_fig, ax = plt.subplots(figsize=(10, 8))
+        self.global_fig, ax = self.create_figure(mode, figsize=(10, 8))
+        self.global_ax = None
         ax.set_facecolor("white")  # Set the background color to white
         ax.text(
             0.5, 0.5,  # Position the text in the center
@@ -42,17 +69,43 @@ class DatabaseVisualizer:
         ax.axis("off")  # Turn off the axes
         return self.global_fig  # Return the blank figure
 
+    def render_image(self):
+        """
+        Rasterizes the figure off-screen (Agg) and encodes it, for the UI. After the first (full) draw, the static
+        gallery is cached as the background (see on_draw), and only the live layer is drawn over it.
+
+        Returns:
+            bytes: The encoded image (UI_IMAGE_FORMAT).
+        """
+        canvas = self.global_fig.canvas
+        if self.live_scatter is None or self.live_background is None or (self.live_count and self.expand_limits()):
+            canvas.draw()  # Full draw, the draw_event caches the background and draws the live layer
+        else:
+            canvas.restore_region(self.live_background)
+            self.draw_live_layer()
+        output = io.BytesIO()
+        Image.fromarray(np.asarray(canvas.buffer_rgba())).convert('RGB').save(output, format=UI_IMAGE_FORMAT, compress_level=UI_PNG_COMPRESS_LEVEL)
+        return output.getvalue()
+
     def add_embeddings_to_existing_plot(self, embeddings, labels=None, cropped_frames=None, mode='cli'):
         """
-        Adds multiple embeddings as black points to the existing plot created by visualize.
+        Adds multiple embeddings as black points to the live layer of the plot created by visualize.
+
+        The live layer is a fixed-capacity ring (the last LIVE_POINTS_CAPACITY points, with the labels and thumbnails of the
+        most recent ones) updated in place, so the plot does not accumulate artists over a long session. In 'cli' mode it is
+        redrawn with blitting over the cached static gallery, at most LIVE_MAX_FPS times per second (see refresh),
+        in 'ui' mode rendered to an encoded image (see render_image).
 
         Args:
             embeddings (list of numpy.ndarray): The embeddings to add to the plot.
             labels (list of str, optional): The labels corresponding to the embeddings.
             cropped_frames (list of numpy.ndarray, optional): Cropped frames corresponding to the embeddings.
             mode (str): The mode of visualization ('cli' or 'ui').
+
+        Returns:
+            bytes: In 'ui' mode, the encoded image of the plot.
         """
-        if self.global_ax is None or self.global_pca is None:
+        if self.global_ax is None or self.projection.components is None or self.live_scatter is None:
             print("Error: The plot has not been initialized. Call visualize first.")
             return
 
@@ -62,108 +115,173 @@ class DatabaseVisualizer:
         if cropped_frames is None:
             cropped_frames = [None] * len(embeddings)  # Default to None if no cropped frames are provided
 
-        for embedding, label, cropped_frame in zip(embeddings, labels, cropped_frames):
-            # Transform the embedding to 2D using the existing PCA (NumPy-based)
-            principal_components, mean = self.global_pca  # Unpack the stored PCA components and mean
-            centered_embedding = embedding - mean  # Center the embedding
-            reduced_embedding = np.dot(centered_embedding, principal_components)  # Project onto principal components
-
-            # Add the embedding as a black point to the plot
-            self.global_ax.scatter(
-                reduced_embedding[0],  # X-coordinate
-                reduced_embedding[1],  # Y-coordinate
-                color='black',         # Black color for the point
-                s=100,                 # Size of the point
-                label='New Embedding'  # Label for the legend
-            )
+        # Transform the embeddings to 2D using the cached PCA basis, all at once
+        reduced_embeddings = self.projection.project(np.asarray(embeddings).reshape(len(embeddings), -1))
+        for reduced_embedding, label, cropped_frame in zip(reduced_embeddings, labels, cropped_frames):
+            self.live_points[self.live_next] = reduced_embedding  # Overwrites the oldest point once the ring is full
+            self.live_next = (self.live_next + 1) % LIVE_POINTS_CAPACITY
+            self.live_count = min(self.live_count + 1, LIVE_POINTS_CAPACITY)
 
-            # Add a label near the point if provided
+            # Add a label near the point if provided (reuses the oldest label artist)
             if label is not None and label != 'Unknown':
-                self.global_ax.text(
-                    reduced_embedding[0] + 0.02,  # X-coordinate offset for better visibility
-                    reduced_embedding[1] + 0.02,  # Y-coordinate offset for better visibility
-                    label,                        # The label text
-                    fontsize=10,                  # Font size
-                    color='blue',                 # Label color
-                    weight='bold'                 # Font weight
-                )
-
-            # If a cropped frame is provided, draw the image near the point
-            if cropped_frame is not None:
-                img = Image.fromarray(cropped_frame)
-                img.thumbnail((30, 30))  # Resize the image to a smaller thumbnail
-
-                # Create a circular mask
-                mask = Image.new("L", img.size, 0)
-                draw = ImageDraw.Draw(mask)
-                draw.ellipse((0, 0, img.size[0], img.size[1]), fill=255)
-                img = Image.composite(img, Image.new("RGBA", img.size, (255, 255, 255, 0)), mask)
+                text = self.live_texts[self.live_next_text]
+                self.live_next_text = (self.live_next_text + 1) % len(self.live_texts)
+                text.set_position((reduced_embedding[0] + 0.02, reduced_embedding[1] + 0.02))  # Offset for better visibility
+                text.set_text(label)
+                text.set_visible(True)
 
-                # Offset the image to the side of the point
+            # If a cropped frame is provided, draw the image near the point (reuses the oldest thumbnail artist)
+            if cropped_frame is not None:
                 offset = 0.05  # Adjust this value to control the distance from the point
-                image_position = (reduced_embedding[0] + offset, reduced_embedding[1] + offset)
+                thumbnail = self.live_thumbnails[self.live_next_thumbnail]
+                self.live_next_thumbnail = (self.live_next_thumbnail + 1) % len(self.live_thumbnails)
+                thumbnail.offsetbox.set_data(np.asarray(self.circular_thumbnail(Image.fromarray(cropped_frame))))
+                thumbnail.xybox = thumbnail.xy = (reduced_embedding[0] + offset, reduced_embedding[1] + offset)
+                thumbnail.set_visible(True)
 
-                # Add the circular image to the plot
-                imagebox = OffsetImage(img, zoom=0.5)
-                ab = AnnotationBbox(imagebox, image_position, frameon=False)
-                self.global_ax.add_artist(ab)
+        # Show the ring in insertion order, the oldest point first
+        order = np.roll(np.arange(LIVE_POINTS_CAPACITY), -self.live_next)[LIVE_POINTS_CAPACITY - self.live_count:]
+        self.live_scatter.set_offsets(self.live_points[order])
 
         # Update the plot dynamically
         if mode == 'cli':
-            self.global_fig.canvas.draw_idle()  # Redraw the canvas
+            self.refresh()
         else:  # UI
-            return self.global_fig
+            return self.render_image()
+
+    def init_live_layer(self, ax):
+        """
+        Creates the fixed set of artists of the live layer. They are 'animated': left out of the regular (full) draws
+        and drawn by draw_live_layer, over the background captured after each full draw.
+        """
+        self.live_points = np.zeros((LIVE_POINTS_CAPACITY, 2), dtype=np.float32)
+        self.live_next = self.live_count = 0
+        self.live_scatter = ax.scatter(np.empty(0), np.empty(0), color='black', s=100, animated=True)  # Black color and size of the new points
+        self.live_texts = [ax.text(0, 0, '', fontsize=10, color='blue', weight='bold', visible=False, animated=True)
+                           for _ in range(LIVE_LABELS_CAPACITY)]
+        self.live_next_text = 0
+        self.live_thumbnails = []
+        for _ in range(LIVE_THUMBNAILS_CAPACITY):
+            thumbnail = AnnotationBbox(OffsetImage(np.zeros((1, 1, 4)), zoom=0.5), (0, 0), frameon=False, animated=True)
+            thumbnail.set_visible(False)
+            ax.add_artist(thumbnail)
+            self.live_thumbnails.append(thumbnail)
+        self.live_next_thumbnail = 0
+        self.live_background = None
+        if self.draw_event_canvas is not self.global_fig.canvas:  # Once per canvas
+            self.global_fig.canvas.mpl_connect('draw_event', self.on_draw)
+            self.draw_event_canvas = self.global_fig.canvas
+
+    def live_artists(self):
+        return [self.live_scatter] + self.live_texts + self.live_thumbnails
+
+    def on_draw(self, event):
+        """After a full draw: caches the static gallery as the blitting background and draws the live layer on it."""
+        canvas = self.global_fig.canvas
+        if not hasattr(canvas, 'copy_from_bbox') or self.live_scatter is None:
+            return
+        self.live_background = canvas.copy_from_bbox(self.global_fig.bbox)
+        self.draw_live_layer()
+
+    def draw_live_layer(self):
+        for artist in self.live_artists():
+            if artist.get_visible():
+                self.global_ax.draw_artist(artist)
+
+    def refresh(self, force=False):
+        """
+        Redraws the live layer, at most LIVE_MAX_FPS times per second (a skipped redraw is done by a later call,
+        see display_visualization_process): the cached background is restored and only the live artists are drawn.
+        A point outside the axes limits expands them, which needs a full redraw.
+        """
+        now = time.monotonic()
+        if not force and now - self.last_refresh_time < 1 / LIVE_MAX_FPS:
+            self.refresh_pending = True
+            return
+        self.last_refresh_time = now
+        self.refresh_pending = False
+        canvas = self.global_fig.canvas
+        if self.live_count and self.expand_limits():
+            canvas.draw_idle()  # The draw_event recaptures the background
+            return
+        if self.live_background is None or not hasattr(canvas, 'blit'):
+            canvas.draw_idle()
+            return
+        canvas.restore_region(self.live_background)
+        self.draw_live_layer()
+        canvas.blit(self.global_fig.bbox)
+        canvas.flush_events()
+
+    def expand_limits(self):
+        """Expands the axes limits to the live points if needed, returns True if they changed."""
+        points = self.live_scatter.get_offsets()
+        (x_min, x_max), (y_min, y_max) = self.global_ax.get_xlim(), self.global_ax.get_ylim()
+        margin = 0.05 * max(x_max - x_min, y_max - y_min)
+        new_x = (min(x_min, points[:, 0].min() - margin), max(x_max, points[:, 0].max() + margin))
+        new_y = (min(y_min, points[:, 1].min() - margin), max(y_max, points[:, 1].max() + margin))
+        if new_x == (x_min, x_max) and new_y == (y_min, y_max):
+            return False
+        self.global_ax.set_xlim(new_x)
+        self.global_ax.set_ylim(new_y)
+        return True
+
+    @staticmethod
+    def circular_thumbnail(img):
+        """Returns a small RGBA thumbnail of the image with a circular mask."""
+        img = img.copy()
+        img.thumbnail((30, 30))  # Resize the image to a smaller thumbnail
+        mask = Image.new("L", img.size, 0)
+        draw = ImageDraw.Draw(mask)
+        draw.ellipse((0, 0, img.size[0], img.size[1]), fill=255)
+        return Image.composite(img.convert("RGBA"), Image.new("RGBA", img.size, (255, 255, 255, 0)), mask)
 
     def visualize(self, mode='cli'):
         """
         Creates a 2D visualization of records with their embeddings, confidence circles, and their first sample near the point.
+
+        Returns:
+            bytes: In 'ui' mode, the encoded image of the plot (see render_image).
         """
-        # Extract all embeddings and perform PCA for dimensionality reduction
-        all_embeddings = []
+        # Extract all embeddings, keyed by sample id, for the incremental PCA projection
+        all_samples = {}
         record_data = {}
         for record in self.db_records:
-            samples = record['samples_json']
-            embeddings = [np.array(sample['embedding']) for sample in samples]
-            images = [sample['sample_path'] for sample in samples]
-            all_embeddings.extend(embeddings)
+            samples = record['samples']
+            all_samples.update((sample['id'], sample['embedding']) for sample in samples)
             record_data[record['global_id']] = {
                 'name': record['label'],
                 'avg_embedding': np.array(record['avg_embedding']),
-                'embeddings': embeddings,
-                'images': images
+                'sample_ids': [sample['id'] for sample in samples],
+                'images': [sample['sample_path'] for sample in samples]
             }
         
-        if not all_embeddings:
+        if not all_samples:
             print("No embeddings found. The plot can't be visualized. Run in 'save' or 'train' mode first to populate the database with samples.")
             if mode == 'ui':  # UI
-                return self.create_blank_figure()  # Return the blank figure
+                self.create_blank_figure(mode)
+                return self.render_image()  # Return the blank figure image
             return
         
-        # Perform PCA to reduce embeddings to 2D
-        reduced_embeddings, principal_components, mean = self.perform_pca(all_embeddings, n_components=2)
-        
-        # Create a mapping from original embeddings to reduced embeddings
-        embedding_map = {tuple(embedding): reduced for embedding, reduced in zip(all_embeddings, reduced_embeddings)}
+        # Reduce embeddings to 2D: only the new samples are projected, the basis is refit if it drifted
+        self.projection.update(all_samples)
         
         # Check if global_fig and global_ax are not None
         if self.global_fig is not None and self.global_ax is not None:
             ax = self.global_ax
             ax.clear()  # Clear the existing plot
         else:
-            self.global_fig, ax = plt.subplots(figsize=(15, 6))
+            self.global_fig, ax = self.create_figure(mode, figsize=(15, 6))
             self.global_ax = ax
         
-        self.global_pca = (principal_components, mean)  # Store principal components and mean for later use
         colors = ['blue', 'green', 'red', 'purple', 'orange', 'brown', 'pink', 'gray', 'cyan', 'magenta']
         
         for idx, (record_id, data) in enumerate(record_data.items()):
             avg_embedding = data['avg_embedding']
             # Transform the average embedding using the principal components
-            centered_avg_embedding = avg_embedding - mean
-            reduced_avg_embedding = np.dot(centered_avg_embedding, principal_components)
+            reduced_avg_embedding = self.projection.project(avg_embedding)
             
             # Calculate the standard deviation for the confidence circle
-            reduced_record_embeddings = np.array([embedding_map[tuple(embedding)] for embedding in data['embeddings']])
+            reduced_record_embeddings = self.projection.get_coordinates(data['sample_ids'])
             std_dev = np.std(reduced_record_embeddings, axis=0)
             
             # Add the confidence circle
@@ -178,7 +296,6 @@ class DatabaseVisualizer:
             ax.add_patch(ellipse)
 
             # Draw all embeddings for the record
-            reduced_record_embeddings = np.array([embedding_map[tuple(embedding)] for embedding in data['embeddings']])
             ax.scatter(
                 reduced_record_embeddings[:, 0],  # X-coordinates of all embeddings
                 reduced_record_embeddings[:, 1],  # Y-coordinates of all embeddings
@@ -194,17 +311,10 @@ class DatabaseVisualizer:
             )
             
             # Add the small image near each embedding point
-            for embedding, reduced_point, image_path in zip(data['embeddings'], reduced_record_embeddings, data['images']):
+            for reduced_point, image_path in zip(reduced_record_embeddings, data['images']):
                 if os.path.exists(image_path):
-                    # Open the image
-                    img = Image.open(image_path)
-                    img.thumbnail((30, 30))  # Resize the image to a smaller thumbnail
-
-                    # Create a circular mask
-                    mask = Image.new("L", img.size, 0)
-                    draw = ImageDraw.Draw(mask)
-                    draw.ellipse((0, 0, img.size[0], img.size[1]), fill=255)
-                    img = Image.composite(img, Image.new("RGBA", img.size, (255, 255, 255, 0)), mask)
+                    # Open the image, as a small circular thumbnail
+                    img = self.circular_thumbnail(Image.open(image_path))
 
                     # Offset the image to the side of the point
                     offset = 0.05  # Adjust this value to control the distance from the point
@@ -233,18 +343,15 @@ class DatabaseVisualizer:
         # Place the legend outside the main plotting area
         ax.legend(loc='upper left', bbox_to_anchor=(1.05, 1), fontsize=10)
 
-        plt.grid(True)
-        plt.tight_layout()
+        ax.grid(True)
+        self.global_fig.tight_layout()
+        self.init_live_layer(ax)  # The live embeddings are drawn over the static gallery
 
         if mode == 'cli':
             plt.ion()
             plt.show(block=False)  # Show the plot
         else:  # UI
-            # Ensure grid is always visible (if this is a matplotlib figure)
-            if hasattr(self.global_fig, 'gca'):
-                ax = self.global_fig.gca()
-                ax.grid(True)
-            return self.global_fig
+            return self.render_image()
 
     def perform_pca(self, embeddings, n_components=2):
         """
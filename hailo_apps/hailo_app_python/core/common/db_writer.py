@@ -0,0 +1,218 @@
+# region imports
+# Standard library imports
+import queue
+import threading
+import time
+import uuid
+
+# Third-party imports
+import numpy as np
+
+# Local application-specific imports
+from hailo_apps.hailo_app_python.core.common.db_handler import sql_in
+# endregion imports
+
+WRITE_MAX_BATCH = 256  # Mutations committed together at most
+WRITE_MAX_DELAY = 0.2  # Seconds a mutation waits for others to be coalesced with it
+
+class DatabaseWriter:
+    """
+    Write-behind queue for the mutations of a DatabaseHandler.
+
+    The callers (e.g. GStreamer pad probes) submit mutations, which return at once; a background thread drains the queue
+    and coalesces what is pending into batched commits: the new records with all their samples in one add per table
+    (add_records_batch), the samples of existing records in one read and one write (insert_samples_batch), the label updates
+    in one merge-insert and the deletions in one delete per table.
+
+    Ordering: the mutations of a global ID are applied in submission order. Within a batch the commits run in the order
+    create, add samples, set label, delete, which is the order of any valid sequence of a record; a mutation submitted after
+    the deletion of its record starts a new batch.
+
+    Read-your-writes: the in-memory embedding cache (the recognition search) is updated at submission, so a created,
+    relabeled or deleted record is seen by the next search before it is committed. The average embedding of a record
+    created through the writer follows its pending samples too; for other records it moves when the batch is committed.
+    Table reads (get_record_by_id, get_samples...) see the mutations after flush().
+    """
+    def __init__(self, db_handler, max_batch=WRITE_MAX_BATCH, max_delay=WRITE_MAX_DELAY):
+        self.db_handler = db_handler
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending_centroids = {}  # global_id -> (avg_embedding, embedding_sum, num_samples) of the records created through the writer and not committed
+        self.stats = {'submitted': 0, 'committed': 0, 'batches': 0, 'errors': 0, 'commit_seconds': 0.0, 'max_pending': 0}
+        self.db_handler.get_embedding_cache()  # Loaded now: submissions update it in place
+        self.thread = threading.Thread(target=self._run, name='db_writer', daemon=True)
+        self.thread.start()
+
+    # region submission
+    def _submit(self, kind, global_id, **payload):
+        with self.lock:
+            self.stats['submitted'] += 1
+            self.stats['max_pending'] = max(self.stats['max_pending'], self.queue.qsize() + 1)
+        self.queue.put((kind, global_id, payload))
+
+    def create_record(self, embedding, sample, timestamp, label='Unknown'):
+        """
+        Submits a new record with its first sample.
+
+        Args:
+            embedding (np.ndarray): The first sample embedding vector.
+            sample (str): The sample file path.
+            timestamp (int): The timestamp of the sample.
+            label (str): The label of the record.
+
+        Returns:
+            str: The global ID of the record, valid for the following submissions at once.
+        """
+        global_id = str(uuid.uuid4())
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self.lock:
+            self.pending_centroids[global_id] = self.db_handler.next_centroid(None, np.zeros(embedding.shape[0]), 0, added=embedding)
+        self.db_handler.embedding_cache.upsert(global_id, avg_embedding=embedding, label=label,
+                                               threshold=self.db_handler.classificaiton_confidence_threshold, timestamp=timestamp)
+        self._submit('create', global_id, embedding=embedding, sample=sample, timestamp=timestamp, label=label)
+        return global_id
+
+    def insert_new_sample(self, global_id, embedding, sample, timestamp):
+        """
+        Submits a new sample of a record (see DatabaseHandler.insert_new_sample).
+
+        Args:
+            global_id (str): The global ID of the record.
+            embedding (np.ndarray): The sample embedding vector.
+            sample (str): The sample file path.
+            timestamp (int): The timestamp of the sample.
+        """
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self.lock:
+            centroid = self.pending_centroids.get(global_id)
+            if centroid is not None:
+                centroid = self.pending_centroids[global_id] = self.db_handler.next_centroid(*centroid, added=embedding)
+        self.db_handler.embedding_cache.upsert(global_id, avg_embedding=centroid[0] if centroid is not None else None, timestamp=timestamp)
+        self._submit('sample', global_id, embedding=embedding, sample=sample, timestamp=timestamp)
+
+    def update_record_label(self, global_id, label):
+        """Submits a new label for a record."""
+        self.db_handler.embedding_cache.upsert(global_id, label=label)
+        self._submit('label', global_id, label=label)
+
+    def delete_record(self, global_id):
+        """Submits the deletion of a record with its samples."""
+        with self.lock:
+            self.pending_centroids.pop(global_id, None)
+        self.db_handler.embedding_cache.remove(global_id)
+        self._submit('delete', global_id)
+
+    def flush(self, timeout=None):
+        """
+        Barrier: waits until the mutations submitted before the call are committed.
+
+        Returns:
+            bool: False on timeout.
+        """
+        done = threading.Event()
+        self.queue.put(('flush', None, {'event': done}))
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """Commits the pending mutations and stops the writer thread."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout)
+    # endregion
+
+    # region writer thread
+    def _run(self):
+        stop = False
+        while not stop:
+            operation = self.queue.get()
+            if operation is None:
+                break
+            batch, barriers = [], []
+            deadline = time.monotonic() + self.max_delay
+            while operation is not None:
+                if operation[0] == 'flush':
+                    barriers.append(operation[2]['event'])
+                    break  # Commit now, without waiting for more mutations
+                batch.append(operation)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    operation = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            else:
+                stop = True  # close(): commit what was collected, then exit
+            self._commit(batch)
+            for barrier in barriers:
+                barrier.set()
+
+    def _commit(self, batch):
+        """Commits a batch, cut after the deletions that are followed by another mutation of the same record."""
+        segment, deleted = [], set()
+        for operation in batch:
+            if operation[1] in deleted:
+                self._commit_segment(segment)
+                segment, deleted = [], set()
+            segment.append(operation)
+            if operation[0] == 'delete':
+                deleted.add(operation[1])
+        self._commit_segment(segment)
+
+    def _commit_segment(self, segment):
+        if not segment:
+            return
+        start_time = time.perf_counter()
+        creates, samples, labels, deletes = {}, {}, {}, []
+        for kind, global_id, payload in segment:
+            if kind == 'create':
+                creates[global_id] = [payload['label'], [(payload['embedding'], payload['sample'], payload['timestamp'])]]
+            elif kind == 'sample':
+                sample = (payload['embedding'], payload['sample'], payload['timestamp'])
+                if global_id in creates:
+                    creates[global_id][1].append(sample)  # Written with the new record
+                else:
+                    samples.setdefault(global_id, []).append(sample)
+            elif kind == 'label':
+                if global_id in creates:
+                    creates[global_id][0] = payload['label']
+                else:
+                    labels[global_id] = payload['label']  # The last label wins
+            elif kind == 'delete':
+                deletes.append(global_id)
+        try:
+            self.db_handler.add_records_batch([(global_id, label, record_samples) for global_id, (label, record_samples) in creates.items()])
+            missing = self.db_handler.insert_samples_batch(samples)
+            if missing:
+                print(f"Warning: samples of {len(missing)} unknown records were dropped by the database writer")
+            if labels:
+                self.db_handler.update_records({global_id: {'label': label} for global_id, label in labels.items()})
+            if deletes:
+                self.db_handler.delete_where(sql_in('global_id', deletes))
+        except Exception as e:
+            print(f"Error: the database writer failed to commit {len(segment)} mutations: {e}")
+            self.db_handler.embedding_cache.invalidate()  # The cache was updated at submission, reload it from the table
+            with self.lock:
+                self.stats['errors'] += 1
+        with self.lock:
+            for global_id in creates:
+                self.pending_centroids.pop(global_id, None)  # Committed: the table holds the running sum
+            self.stats['committed'] += len(segment)
+            self.stats['batches'] += 1
+            self.stats['commit_seconds'] += time.perf_counter() - start_time
+    # endregion
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats['pending'] = self.queue.qsize()
+        return stats
+
+    def report(self):
+        stats = self.get_stats()
+        if not stats['batches']:
+            return
+        print(f"Database writer: {stats['committed']} mutations in {stats['batches']} batches "
+              f"({stats['committed'] / stats['batches']:.1f} per batch, {stats['commit_seconds'] * 1000 / stats['batches']:.1f} ms per batch), "
+              f"max {stats['max_pending']} pending, {stats['errors']} errors")
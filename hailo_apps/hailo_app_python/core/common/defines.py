@@ -98,12 +98,24 @@ RESOURCES_PATH_DEFAULT = RESOURCES_ROOT_PATH_DEFAULT
 VIRTUAL_ENV_NAME_DEFAULT = "hailo_infra_venv"
 STORAGE_PATH_DEFAULT = str(Path(RESOURCES_ROOT_PATH_DEFAULT) / "storage_deb_whl_dir")
 # Default Tappas post-processing directory
+import os
 import subprocess
+from .startup_cache import cached_value, files_fingerprint
 
-TAPPAS_POSTPROC_PATH_DEFAULT = subprocess.check_output(
-    ["pkg-config", "--variable=tappas_postproc_lib_dir", "hailo-tappas-core"],
-    text=True
-).strip()
+# The pkg-config files of hailo-tappas-core, in the pkg-config search path: a TAPPAS reinstall rewrites them
+TAPPAS_PKG_CONFIG_PATTERNS = [os.path.join(path, "hailo-tappas-core.pc") for path in os.environ.get("PKG_CONFIG_PATH", "").split(os.pathsep) if path] + [
+    "/usr/lib/pkgconfig/hailo-tappas-core.pc", "/usr/lib/*/pkgconfig/hailo-tappas-core.pc", "/usr/share/pkgconfig/hailo-tappas-core.pc",
+    "/usr/local/lib/pkgconfig/hailo-tappas-core.pc", "/usr/local/lib/*/pkgconfig/hailo-tappas-core.pc"]
+
+def _detect_tappas_postproc_path():
+    return subprocess.check_output(
+        ["pkg-config", "--variable=tappas_postproc_lib_dir", "hailo-tappas-core"],
+        text=True
+    ).strip()
+
+# Cached on disk, pkg-config runs on every import otherwise. Detected again when the .pc file changes or the directory is gone
+TAPPAS_POSTPROC_PATH_DEFAULT = cached_value("tappas_postproc_path", _detect_tappas_postproc_path,
+                                            fingerprint=files_fingerprint(TAPPAS_PKG_CONFIG_PATTERNS), validate=os.path.isdir)
 
 # Resource groups for download_resources
 RESOURCES_GROUP_DEFAULT = "default"
@@ -210,6 +222,36 @@ FACE_RECON_SAMPLES_DIR_NAME = "samples"
 FACE_RECON_LOCAL_SAMPLES_DIR_NAME = "faces"
 FACE_DETECTION_JSON_NAME = "scrfd.json"
 FACE_ALGO_PARAMS_JSON_NAME = "face_recon_algo_params.json"
+FACE_RECON_DEDUP_SIMILARITY_DEFAULT = 0.95  # Enrollment: a sample this similar (cosine) to a kept sample of the person is a duplicate
+FACE_RECON_MAX_SAMPLES_DEFAULT = 50  # Enrollment: samples kept per person, a diverse subset is chosen beyond it
+FACE_RECON_TRACK_CACHE_MAX_TRACKS = 256  # Recognition: tracks whose identity is cached, least recently seen evicted first
+FACE_RECON_TRACK_CACHE_TTL = 2.0  # Recognition: seconds after which a track that is not seen is evicted
+FACE_RECON_TRACK_DRIFT_SIMILARITY_DEFAULT = 0.8  # Recognition: a track is searched again when its embedding EMA drifts below this cosine similarity
+FACE_RECON_TRACK_CONFIDENCE_HALF_LIFE_DEFAULT = 10.0  # Recognition: seconds in which the cached confidence of a track halves
+EMBEDDING_DIM = 512  # Size of the face recognition embeddings (arcface_mobilefacenet)
+NORM_EPSILON = 1e-12  # Lower bound of the norm an embedding is divided by when it is L2-normalized
+
+# Inference decimation defaults
+INFERENCE_DECIMATION_SO_FILENAME = "libdecimation_croppers.so"
+INFERENCE_DECIMATION_FUNCTION = "decimation_crop"
+INFERENCE_DECIMATION_SKIP_TYPE = "inference_decimation"  # Must match DECIMATION_SKIP_TYPE in decimation_croppers.cpp
+INFERENCE_DECIMATION_MAX_FACTOR_DEFAULT = 4  # Keep below the tracker keep-tracked-frames
+INFERENCE_DECIMATION_REPORT_INTERVAL = 300  # frames
+
+# Motion gating defaults
+MOTION_GATE_THRESHOLD_DEFAULT = 0.01  # Fraction of changed pixels to count a frame as motion
+MOTION_GATE_HEARTBEAT_DEFAULT = 30  # frames
+MOTION_GATE_PIXEL_THRESHOLD_DEFAULT = 25  # Luma difference to count a pixel as changed
+MOTION_GATE_LEARNING_RATE_DEFAULT = 0.05  # Background model running average weight
+MOTION_GATE_DOWNSCALE_STEP_DEFAULT = 8  # Take every Nth pixel in both axes
+
+# UI video streaming defaults
+UI_STREAM_FORMAT_RAW = "raw"  # RGB frames, encoded by the WebRTC component
+UI_STREAM_FORMAT_JPEG = "jpeg"  # Encoded by jpegenc in the pipeline, the UI shows the JPEG bytes as is
+UI_STREAM_FORMATS = [UI_STREAM_FORMAT_RAW, UI_STREAM_FORMAT_JPEG]
+UI_STREAM_JPEG_QUALITY_DEFAULT = 80
+UI_STREAM_REPORT_INTERVAL = 30  # seconds
+UI_MJPEG_STREAM_PATH = "/ui_stream.mjpeg"  # Route of the Gradio server streaming the JPEG frames (multipart MJPEG)
 
 # Multisource pipeline defaults
 MULTISOURCE_APP_TITLE = "Hailo Multisource App"
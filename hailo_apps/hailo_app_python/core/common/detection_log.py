@@ -0,0 +1,81 @@
+# region imports
+# Standard library imports
+import threading
+import time
+from collections import Counter, deque, namedtuple
+from datetime import datetime
+# endregion imports
+
+DETECTION_LOG_CAPACITY = 1000  # Events kept in the ring, the oldest are overwritten
+
+DetectionEvent = namedtuple('DetectionEvent', ['seq', 'timestamp', 'track_id', 'label', 'confidence', 'detection_confidence'])
+
+class DetectionLog:
+    """
+    Ring of the recognition events, written by the pipeline and read by the UI.
+
+    add() only stores the raw fields (O(1), no formatting on the streaming thread) and wakes up the readers. Every event
+    has a sequence number, so a reader asks for the events after the last one it has (read), gets only the delta, and
+    formats it (format_event). The cumulative count per label is kept on add, independently of the ring size.
+    """
+    def __init__(self, capacity=DETECTION_LOG_CAPACITY):
+        self.events = deque(maxlen=capacity)
+        self.condition = threading.Condition()
+        self.last_seq = 0
+        self.label_counts = Counter()
+
+    def add(self, track_id, label, confidence, detection_confidence=None):
+        """
+        Appends a recognition event.
+
+        Args:
+            track_id (int): The track id of the face.
+            label (str): The recognized label, or 'Unknown'.
+            confidence (float): The classification confidence.
+            detection_confidence (float): The face detection confidence.
+        """
+        with self.condition:
+            self.last_seq += 1
+            self.events.append(DetectionEvent(self.last_seq, time.time(), track_id, label, confidence, detection_confidence))
+            self.label_counts[label] += 1
+            self.condition.notify_all()
+
+    def read(self, after_seq=0, label=None, timeout=None):
+        """
+        Returns the events added after after_seq, waiting for one if there is none yet.
+
+        Args:
+            after_seq (int): The sequence number of the last event the reader has, 0 for all the events in the ring.
+            label (str): Only the events of this label, None for all.
+            timeout (float): Seconds to wait at most for a new event, None to wait forever, 0 not to wait.
+
+        Returns:
+            Tuple[List[DetectionEvent], int]: The new events (oldest first, the ones already overwritten in the ring are lost)
+                                              and the sequence number to pass to the next read.
+        """
+        with self.condition:
+            if timeout != 0:
+                self.condition.wait_for(lambda: self.last_seq > after_seq, timeout)
+            new_events = []
+            for event in reversed(self.events):  # The delta is at the end of the ring
+                if event.seq <= after_seq:
+                    break
+                if label is None or event.label == label:
+                    new_events.append(event)
+            new_events.reverse()
+            return new_events, self.last_seq
+
+    def get_label_counts(self):
+        """Returns the number of events per label since the start."""
+        with self.condition:
+            return dict(self.label_counts)
+
+    @staticmethod
+    def format_event(event):
+        """Formats an event as a log line."""
+        text = f'[{datetime.fromtimestamp(event.timestamp).strftime("%Y-%m-%d %H:%M:%S")}]: Face detection ID: {event.track_id}'
+        if event.detection_confidence is not None:
+            text += f' (Confidence: {event.detection_confidence:.1f})'
+        if event.label == 'Unknown':
+            return text + ', Unknown person detected'
+        return text + f', Person recognition: {event.label} (Confidence: {event.confidence:.1f})'
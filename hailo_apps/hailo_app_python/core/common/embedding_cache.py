@@ -0,0 +1,177 @@
+# region imports
+# Standard library imports
+import threading
+
+# Third-party imports
+import numpy as np
+
+# Local application-specific imports
+from hailo_apps.hailo_app_python.core.common.defines import EMBEDDING_DIM, NORM_EPSILON
+# endregion imports
+
+INITIAL_CAPACITY = 64
+
+class EmbeddingCache:
+    """
+    RAM-resident copy of the records' average embeddings, used for the recognition search.
+
+    The avg_embedding vectors are stored L2-normalized in a contiguous float32 matrix, with parallel
+    global_id / label / threshold / timestamp arrays, so a cosine search is one matrix-vector product
+    plus an argpartition. The DatabaseHandler keeps the cache in sync (write-through) on every mutation,
+    or invalidates it for bulk operations, after which it is reloaded on the next search.
+    Rows are removed by moving the last row into the hole, so removals are O(1) as well.
+    """
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.lock = threading.RLock()
+        self.valid = False
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.matrix = np.empty((INITIAL_CAPACITY, self.dim), dtype=np.float32)
+            self.thresholds = np.empty(INITIAL_CAPACITY, dtype=np.float32)
+            self.size = 0
+            self.global_ids = []
+            self.labels = []
+            self.timestamps = []
+            self.rows = {}  # global_id -> row
+
+    def invalidate(self):
+        with self.lock:
+            self.valid = False
+
+    def load(self, records):
+        """
+        Replaces the cache content.
+
+        Args:
+            records (Iterable[Dict[str, Any]]): Records with global_id, label, avg_embedding,
+                classificaiton_confidence_threshold and last_sample_recieved_time.
+        """
+        with self.lock:
+            self.clear()
+            for record in records:
+                self.upsert(record['global_id'], avg_embedding=record['avg_embedding'], label=record['label'],
+                            threshold=record['classificaiton_confidence_threshold'],
+                            timestamp=record['last_sample_recieved_time'])
+            self.valid = True
+
+    def _ensure_capacity(self, size):
+        if size <= len(self.matrix):
+            return
+        capacity = max(size, 2 * len(self.matrix))
+        matrix = np.empty((capacity, self.dim), dtype=np.float32)
+        matrix[:self.size] = self.matrix[:self.size]
+        thresholds = np.empty(capacity, dtype=np.float32)
+        thresholds[:self.size] = self.thresholds[:self.size]
+        self.matrix, self.thresholds = matrix, thresholds
+
+    def upsert(self, global_id, avg_embedding=None, label=None, threshold=None, timestamp=None):
+        """
+        Adds a record or updates some of its fields. A new record must be given all the fields.
+        """
+        with self.lock:
+            row = self.rows.get(global_id)
+            if row is None:
+                if avg_embedding is None or label is None or threshold is None:
+                    self.valid = False  # Partial data for an unknown record, reload on the next search
+                    return
+                row = self.size
+                self._ensure_capacity(row + 1)
+                self.size += 1
+                self.rows[global_id] = row
+                self.global_ids.append(global_id)
+                self.labels.append(label)
+                self.timestamps.append(timestamp)
+            if avg_embedding is not None:
+                vector = np.asarray(avg_embedding, dtype=np.float32).reshape(-1)
+                self.matrix[row] = vector / max(float(np.linalg.norm(vector)), NORM_EPSILON)
+            if label is not None:
+                self.labels[row] = label
+            if threshold is not None:
+                self.thresholds[row] = threshold
+            if timestamp is not None:
+                self.timestamps[row] = timestamp
+
+    def remove(self, global_id):
+        with self.lock:
+            row = self.rows.pop(global_id, None)
+            if row is None:
+                return
+            last = self.size - 1
+            if row != last:  # Move the last row into the removed one
+                self.matrix[row] = self.matrix[last]
+                self.thresholds[row] = self.thresholds[last]
+                self.global_ids[row] = self.global_ids[last]
+                self.labels[row] = self.labels[last]
+                self.timestamps[row] = self.timestamps[last]
+                self.rows[self.global_ids[row]] = row
+            self.global_ids.pop()
+            self.labels.pop()
+            self.timestamps.pop()
+            self.size = last
+
+    def set_all_thresholds(self, threshold):
+        with self.lock:
+            self.thresholds[:self.size] = threshold
+
+    def get(self, global_id):
+        """Returns the cached fields of a record as a dict, or None."""
+        with self.lock:
+            row = self.rows.get(global_id)
+            return self._row_dict(row) if row is not None else None
+
+    def _row_dict(self, row):
+        return {
+            'global_id': self.global_ids[row],
+            'label': self.labels[row],
+            'last_sample_recieved_time': self.timestamps[row],
+            'classificaiton_confidence_threshold': float(self.thresholds[row]),
+        }
+
+    def search(self, embedding, top_k=1):
+        """
+        Cosine similarity search.
+
+        Args:
+            embedding (np.ndarray): The query embedding (any scale).
+            top_k (int): The number of results.
+
+        Returns:
+            List[Tuple[Dict[str, Any], float]]: (cached record fields, cosine similarity), best first.
+        """
+        return self.search_batch(np.asarray(embedding).reshape(1, -1), top_k=top_k)[0]
+
+    def search_batch(self, embeddings, top_k=1):
+        """
+        Cosine similarity search for several queries with one matrix product.
+
+        Args:
+            embeddings (np.ndarray): The query embeddings, shape (N, dim).
+            top_k (int): The number of results per query.
+
+        Returns:
+            List[List[Tuple[Dict[str, Any], float]]]: Per query, (cached record fields, cosine similarity), best first.
+        """
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), NORM_EPSILON)
+        with self.lock:
+            if self.size == 0:
+                return [[] for _ in range(len(queries))]
+            similarities = queries @ self.matrix[:self.size].T  # (N, size)
+            top_k = min(top_k, self.size)
+            if top_k < self.size:
+                candidates = np.argpartition(-similarities, top_k - 1, axis=1)[:, :top_k]
+            else:
+                candidates = np.broadcast_to(np.arange(self.size), (len(queries), self.size))
+            candidate_similarities = np.take_along_axis(similarities, candidates, axis=1)
+            order = np.argsort(-candidate_similarities, axis=1)
+            candidates = np.take_along_axis(candidates, order, axis=1)
+            candidate_similarities = np.take_along_axis(candidate_similarities, order, axis=1)
+            return [[(self._row_dict(row), float(similarity)) for row, similarity in zip(rows, row_similarities)]
+                    for rows, row_similarities in zip(candidates, candidate_similarities)]
+
+    def memory_bytes(self):
+        with self.lock:
+            return self.matrix.nbytes + self.thresholds.nbytes
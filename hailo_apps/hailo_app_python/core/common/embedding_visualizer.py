@@ -1,6 +1,5 @@
 # region imports
 # Standard library imports
-import json
 import os
 import shutil
 from datetime import datetime
@@ -32,6 +31,7 @@ def visualize_embeddings(db_handler):
         db_handler: DatabaseHandler instance for database operations
     """
     records = db_handler.tbl_records.to_pandas()
+    all_samples = db_handler.get_samples()
     
     # Create a FiftyOne dataset
     dataset_name = f"embeddings_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
@@ -43,7 +43,7 @@ def visualize_embeddings(db_handler):
     
     # Add samples to dataset with embeddings
     for idx, record in records.iterrows():
-        pictures = json.loads(record['samples_json']) if record['samples_json'] else []
+        pictures = all_samples.get(record['global_id'], [])
         if pictures and len(pictures) > 0:
             # Create a directory for this person
             person_dir = os.path.join(dummy_dir, str(record['global_id']))
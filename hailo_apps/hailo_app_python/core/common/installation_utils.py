@@ -29,6 +29,8 @@ from .defines import (
     HAILO10H_ARCH_CAPS,
     HAILO10H_ARCH,
 )
+from .startup_cache import cached_value, files_fingerprint
+from .startup_profiler import startup_profiler
 #logger = __import__('logging').getLogger("hailo_install")
 
 def detect_pkg_config_version(pkg_name: str) -> str:
@@ -107,6 +109,25 @@ def detect_hailo_arch() -> str | None:
         return None
     return None
 
+# The Hailo device nodes (recreated when the driver loads, e.g. after a reboot to swap the module) and the HailoRT CLI
+HAILO_ARCH_FINGERPRINT_PATTERNS = ["/dev/hailo*", "/usr/bin/hailortcli", "/usr/local/bin/hailortcli"]
+
+def detect_hailo_arch_cached() -> str | None:
+    """
+    Like detect_hailo_arch, but cached on disk for STARTUP_CACHE_TTL_DEFAULT seconds. Detected again when a Hailo
+    device node or hailortcli changed since the detection (device swap, driver reload, HailoRT reinstall).
+    Used by the applications at startup, installation scripts should call detect_hailo_arch.
+    """
+    detected = []
+    def detect():
+        detected.append(True)
+        return detect_hailo_arch()
+    with startup_profiler.phase("arch detection"):
+        arch = cached_value("hailo_arch", detect, fingerprint=files_fingerprint(HAILO_ARCH_FINGERPRINT_PATTERNS))
+    if arch is not None and not detected:
+        print(f"Using the cached Hailo architecture: {arch} (set HAILO_APPS_DISABLE_STARTUP_CACHE=1 to always detect it)")
+    return arch
+
 def detect_pkg_installed(pkg_name: str) -> bool:
     """
     Check if a package is installed on the system.
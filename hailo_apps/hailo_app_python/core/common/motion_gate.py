@@ -0,0 +1,134 @@
+# region imports
+# Third-party imports
+import numpy as np
+
+# Local application-specific imports
+from hailo_apps.hailo_app_python.core.common.defines import (
+    MOTION_GATE_THRESHOLD_DEFAULT,
+    MOTION_GATE_HEARTBEAT_DEFAULT,
+    MOTION_GATE_PIXEL_THRESHOLD_DEFAULT,
+    MOTION_GATE_LEARNING_RATE_DEFAULT,
+)
+# endregion imports
+
+MOTION_GATE_REASON_INIT = 'init'
+MOTION_GATE_REASON_MOTION = 'motion'
+MOTION_GATE_REASON_HEARTBEAT = 'heartbeat'
+MOTION_GATE_REASON_GATED = 'gated'
+
+class MotionGate:
+    """
+    Decides whether a frame is worth running inference on, based on a cheap frame difference.
+
+    Every frame is compared (as a downscaled luma plane) against a running-average background model.
+    A frame is forwarded when the fraction of changed pixels is above the threshold, or when no frame was
+    forwarded for `heartbeat` frames, so slow changes and objects standing still are still refreshed.
+    Meant for fixed cameras, where most of the frames show an empty scene.
+    """
+    def __init__(self, threshold=MOTION_GATE_THRESHOLD_DEFAULT, heartbeat=MOTION_GATE_HEARTBEAT_DEFAULT,
+                 pixel_threshold=MOTION_GATE_PIXEL_THRESHOLD_DEFAULT, learning_rate=MOTION_GATE_LEARNING_RATE_DEFAULT):
+        """
+        Args:
+            threshold (float): Fraction of changed pixels (0-1) above which a frame counts as motion.
+            heartbeat (int): Forward at least every `heartbeat` frames. 0 disables the heartbeat.
+            pixel_threshold (int): Absolute luma difference above which a pixel counts as changed.
+            learning_rate (float): Weight of the new frame in the running-average background model.
+        """
+        self.threshold = threshold
+        self.heartbeat = heartbeat
+        self.pixel_threshold = pixel_threshold
+        self.learning_rate = learning_rate
+        self.background = None  # float32 running average of the luma plane
+        self.frames_since_forward = 0
+        self.motion_score = 0.0
+        self.last_reason = None
+
+        # Statistics
+        self.frame_count = 0
+        self.forwarded_frames = 0
+        self.motion_frames = 0
+        self.heartbeat_frames = 0
+
+    def update(self, luma: np.ndarray) -> bool:
+        """
+        Updates the background model with a new frame and decides whether to forward it.
+
+        Args:
+            luma (np.ndarray): The (downscaled) luma plane of the frame, uint8 of shape (H, W).
+
+        Returns:
+            bool: True if the frame should be forwarded to inference.
+        """
+        self.frame_count += 1
+        luma = luma.astype(np.float32)
+        if self.background is None or self.background.shape != luma.shape:  # First frame or resolution change
+            self.background = luma
+            self.motion_score = 1.0
+            return self._forward(MOTION_GATE_REASON_INIT)
+
+        diff = np.abs(luma - self.background)
+        self.motion_score = np.count_nonzero(diff > self.pixel_threshold) / diff.size
+        # background = (1 - lr) * background + lr * luma, in place
+        self.background *= (1.0 - self.learning_rate)
+        self.background += self.learning_rate * luma
+
+        if self.motion_score >= self.threshold:
+            self.motion_frames += 1
+            return self._forward(MOTION_GATE_REASON_MOTION)
+        if self.heartbeat and self.frames_since_forward + 1 >= self.heartbeat:
+            self.heartbeat_frames += 1
+            return self._forward(MOTION_GATE_REASON_HEARTBEAT)
+        self.frames_since_forward += 1
+        self.last_reason = MOTION_GATE_REASON_GATED
+        return False
+
+    def _forward(self, reason):
+        self.frames_since_forward = 0
+        self.forwarded_frames += 1
+        self.last_reason = reason
+        return True
+
+    def reset(self):
+        """Drops the background model, e.g. after the camera moved or the source changed."""
+        self.background = None
+        self.frames_since_forward = 0
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Frame counters, the duty cycle (fraction of forwarded frames) and the inference savings.
+        """
+        duty_cycle = self.forwarded_frames / self.frame_count if self.frame_count else 0.0
+        return {
+            'frames': self.frame_count,
+            'forwarded_frames': self.forwarded_frames,
+            'motion_frames': self.motion_frames,
+            'heartbeat_frames': self.heartbeat_frames,
+            'duty_cycle': duty_cycle,
+            'savings': 1.0 - duty_cycle if self.frame_count else 0.0,
+        }
+
+    def report(self):
+        stats = self.get_stats()
+        print(f"Motion gate: frames: {stats['frames']}, forwarded: {stats['forwarded_frames']} "
+              f"(motion: {stats['motion_frames']}, heartbeat: {stats['heartbeat_frames']}), "
+              f"duty cycle: {stats['duty_cycle'] * 100:.1f}%, inference saved: {stats['savings'] * 100:.1f}%")
+
+if __name__ == "__main__":
+    # Synthetic video example: a static noisy scene, with a bright square crossing it during frames 100-160
+    rng = np.random.default_rng(0)
+    height, width, num_frames = 90, 160, 300
+    scene = rng.integers(60, 120, size=(height, width)).astype(np.int16)
+    motion_range = range(100, 160)
+    gate = MotionGate()
+    missed_motion_frames = 0
+    for i in range(num_frames):
+        frame = scene + rng.integers(-5, 6, size=(height, width))  # sensor noise
+        if i in motion_range:
+            x = (i - motion_range.start) * 2
+            frame[30:60, x:x + 30] = 250
+        forward = gate.update(np.clip(frame, 0, 255).astype(np.uint8))
+        if i in motion_range and not forward:
+            missed_motion_frames += 1
+    gate.report()
+    print(f"Motion frames: {len(motion_range)}, missed: {missed_motion_frames}")
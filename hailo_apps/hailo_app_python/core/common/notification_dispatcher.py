@@ -0,0 +1,203 @@
+# region imports
+# Standard library imports
+import queue
+import random
+import threading
+import time
+from io import BytesIO
+
+# Third-party imports
+from PIL import Image
+# endregion imports
+
+NOTIFICATION_QUEUE_SIZE = 32  # Pending notifications at most, the new ones are dropped beyond it
+NOTIFICATION_RATE = 20 / 60  # Messages per second on average (an album is one message), the Telegram limit of a group chat
+NOTIFICATION_BURST = 3  # Messages sent back to back before the rate applies
+NOTIFICATION_COALESCE_DELAY = 1.0  # Seconds a notification waits for others to be sent with it as an album
+NOTIFICATION_ALBUM_MAX = 10  # Photos per album, the Telegram limit
+NOTIFICATION_THUMBNAIL_SIZE = 640  # Longest side of the sent image, in pixels
+NOTIFICATION_JPEG_QUALITY = 80
+NOTIFICATION_MAX_RETRIES = 4
+NOTIFICATION_BACKOFF_BASE = 1.0  # Seconds before the first retry, doubled on every retry (with jitter)
+NOTIFICATION_BACKOFF_MAX = 60.0
+
+class TokenBucket:
+    """Global rate limit: tokens refill at rate per second up to burst, a message takes one."""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last_time = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last_time) * self.rate)
+        self.last_time = now
+
+    def time_until_token(self):
+        """Seconds until a token is available, 0 if one is."""
+        self._refill(time.monotonic())
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill(time.monotonic())
+        self.tokens -= 1
+
+class NotificationDispatcher:
+    """
+    Sends the notifications of a TelegramHandler from its own thread, so a slow or failing HTTP call never blocks the pipeline
+    or the sample saving.
+
+    submit() only puts the frame on a bounded queue (the notification is dropped if the queue is full). The dispatcher thread:
+        - waits up to coalesce_delay for more notifications, and longer while the global rate limit (token bucket) holds
+          the next message, so a burst is sent as albums of up to album_max photos instead of one message per photo,
+        - encodes each frame as a JPEG thumbnail (longest side thumbnail_size) instead of a full size PNG,
+        - retries a failed send up to max_retries times with exponential backoff and jitter, waiting the retry_after given
+          by Telegram on 'Too Many Requests'.
+    The per-identity rate limit is the TelegramHandler's should_send_notification, checked before submitting.
+    """
+    def __init__(self, handler, queue_size=NOTIFICATION_QUEUE_SIZE, rate=NOTIFICATION_RATE, burst=NOTIFICATION_BURST,
+                 coalesce_delay=NOTIFICATION_COALESCE_DELAY, album_max=NOTIFICATION_ALBUM_MAX, thumbnail_size=NOTIFICATION_THUMBNAIL_SIZE,
+                 jpeg_quality=NOTIFICATION_JPEG_QUALITY, max_retries=NOTIFICATION_MAX_RETRIES, backoff_base=NOTIFICATION_BACKOFF_BASE,
+                 backoff_max=NOTIFICATION_BACKOFF_MAX):
+        self.handler = handler
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.rate_limit = TokenBucket(rate, burst)
+        self.coalesce_delay = coalesce_delay
+        self.album_max = album_max
+        self.thumbnail_size = thumbnail_size
+        self.jpeg_quality = jpeg_quality
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.stats = {'submitted': 0, 'dropped': 0, 'sent': 0, 'messages': 0, 'albums': 0, 'retries': 0, 'failed': 0,
+                      'encode_seconds': 0.0, 'sent_bytes': 0}
+        self.thread = threading.Thread(target=self._run, name='notification_dispatcher', daemon=True)
+        self.thread.start()
+
+    def submit(self, name, global_id, confidence, frame):
+        """
+        Queues a notification, without blocking.
+
+        Args:
+            name (str): The recognized label.
+            global_id: The identity of the notification (the caption of the unknown persons).
+            confidence (float): The classification confidence.
+            frame (np.ndarray): The RGB frame, not modified afterwards by the caller.
+
+        Returns:
+            bool: False if the queue was full and the notification dropped.
+        """
+        try:
+            self.queue.put_nowait((self.handler.format_caption(name, global_id, confidence), frame))
+            accepted = True
+        except queue.Full:
+            accepted = False
+        with self.lock:
+            self.stats['submitted' if accepted else 'dropped'] += 1
+        return accepted
+
+    def close(self, timeout=None):
+        """Sends the queued notifications (without retries past the timeout) and stops the dispatcher thread."""
+        if self.thread.is_alive():
+            self.stop_event.set()
+            self.queue.put(None)
+            self.thread.join(timeout)
+
+    # region dispatcher thread
+    def _run(self):
+        pending = []
+        while True:
+            if not pending:
+                item = self.queue.get()
+                if item is None:
+                    break
+                pending.append(item)
+            # Collect until the coalescing delay and a rate limit token are both over, or the album is full
+            deadline = time.monotonic() + max(self.coalesce_delay, self.rate_limit.time_until_token())
+            closed = False
+            while len(pending) < self.album_max and not self.stop_event.is_set():
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    if self.rate_limit.time_until_token() == 0:
+                        break
+                    deadline = time.monotonic() + self.rate_limit.time_until_token()
+                    continue
+                if item is None:
+                    closed = True
+                    break
+                pending.append(item)
+            if self.stop_event.is_set():  # close(): send everything queued now
+                closed = True
+                while True:
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        pending.append(item)
+            album, pending = pending[:self.album_max], pending[self.album_max:]
+            self._send(album)
+            if closed and not pending:
+                break
+
+    def _encode(self, frame):
+        start_time = time.perf_counter()
+        image = Image.fromarray(frame)
+        image.thumbnail((self.thumbnail_size, self.thumbnail_size))  # Keeps the aspect ratio, never upscales
+        output = BytesIO()
+        image.save(output, format='JPEG', quality=self.jpeg_quality)
+        with self.lock:
+            self.stats['encode_seconds'] += time.perf_counter() - start_time
+        return output.getvalue()
+
+    def _send(self, album):
+        photos = [(self._encode(frame), caption) for caption, frame in album]
+        for attempt in range(self.max_retries + 1):
+            if not self.stop_event.is_set():
+                time.sleep(self.rate_limit.time_until_token())
+            self.rate_limit.take()
+            try:
+                if len(photos) == 1:
+                    self.handler.send_photo(*photos[0])
+                else:
+                    self.handler.send_album(photos)
+                with self.lock:
+                    self.stats['sent'] += len(photos)
+                    self.stats['messages'] += 1
+                    self.stats['albums'] += len(photos) > 1
+                    self.stats['sent_bytes'] += sum(len(photo) for photo, _ in photos)
+                return
+            except Exception as e:
+                retry_after = self.handler.retry_after(e)
+                if retry_after == -1 or attempt == self.max_retries or self.stop_event.is_set():
+                    print(f"Error sending Telegram notification ({len(photos)} photos): {e}")
+                    break
+                delay = retry_after or min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.5)
+                with self.lock:
+                    self.stats['retries'] += 1
+                time.sleep(delay)
+        with self.lock:
+            self.stats['failed'] += len(photos)
+    # endregion
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats['pending'] = self.queue.qsize()
+        return stats
+
+    def report(self):
+        stats = self.get_stats()
+        if not stats['submitted'] and not stats['dropped']:
+            return
+        encoded = stats['sent'] + stats['failed']
+        print(f"Notifications: {stats['sent']} sent in {stats['messages']} messages ({stats['albums']} albums), "
+              f"{stats['failed']} failed, {stats['retries']} retries, {stats['dropped']} dropped (queue full), "
+              f"{stats['sent_bytes'] / max(stats['sent'], 1) / 1024:.1f} KB/photo, "
+              f"{stats['encode_seconds'] * 1000 / max(encoded, 1):.1f} ms/encode")
+        dedup = self.handler.ids_msg_sent.get_stats()
+        print(f"Notification dedup: {dedup['size']} identities tracked, {dedup['suppressed']} suppressed, "
+              f"{dedup['expired']} expired, {dedup['evicted']} evicted")
@@ -0,0 +1,139 @@
+# region imports
+# Standard library imports
+import time
+
+# Third-party imports
+import numpy as np
+
+# Local application-specific imports
+from hailo_apps.hailo_app_python.core.common.defines import EMBEDDING_DIM
+# endregion imports
+
+INITIAL_CAPACITY = 256
+PROJECTION_DRIFT_THRESHOLD = 0.05  # Refit when the variance explained by the cached basis drops by this fraction of the variance it explained at fit time
+
+class ProjectionCache:
+    """
+    2-D PCA projection of the sample embeddings, maintained incrementally for the visualization.
+
+    The PCA sufficient statistics (sample count, sum and scatter matrix sum(x x^T), in float64) are updated as samples
+    are added or removed, so the covariance is known at any time without rescanning the gallery. The projection basis
+    (mean and the two principal components) is kept fixed, and so are the 2-D coordinates of the samples (keyed by sample id);
+    new samples are just projected on it. The variance the cached basis explains under the current covariance is checked on
+    every update, and the basis is refit (eigendecomposition of the dim x dim covariance, all the coordinates reprojected)
+    only when it dropped by more than drift_threshold compared to fit time.
+    """
+    def __init__(self, dim=EMBEDDING_DIM, drift_threshold=PROJECTION_DRIFT_THRESHOLD):
+        self.dim = dim
+        self.drift_threshold = drift_threshold
+        self.embeddings = np.empty((INITIAL_CAPACITY, dim), dtype=np.float32)  # Rows of the tracked samples
+        self.coordinates = np.empty((INITIAL_CAPACITY, 2), dtype=np.float32)
+        self.ids = []
+        self.rows = {}  # sample id -> row
+        self.count = 0
+        self.total = np.zeros(dim)
+        self.scatter = np.zeros((dim, dim))
+        self.mean = None  # Basis: the mean and the principal components (dim, 2) at fit time
+        self.components = None
+        self.fit_explained = 0.0
+        self.stats = {'updates': 0, 'refits': 0, 'last_update_ms': 0.0, 'last_refit_ms': 0.0}
+
+    def _ensure_capacity(self, size):
+        if size <= len(self.embeddings):
+            return
+        capacity = max(size, 2 * len(self.embeddings))
+        embeddings = np.empty((capacity, self.dim), dtype=np.float32)
+        embeddings[:self.count] = self.embeddings[:self.count]
+        coordinates = np.empty((capacity, 2), dtype=np.float32)
+        coordinates[:self.count] = self.coordinates[:self.count]
+        self.embeddings, self.coordinates = embeddings, coordinates
+
+    def covariance(self):
+        """Returns the covariance of the tracked samples, from the sufficient statistics."""
+        mean = self.total / self.count
+        return (self.scatter - self.count * np.outer(mean, mean)) / max(self.count - 1, 1)
+
+    def explained_variance_ratio(self, components):
+        """
+        Returns the fraction of the total variance captured by the given components under the current covariance,
+        from the sufficient statistics without forming the covariance matrix.
+        """
+        mean = self.total / self.count
+        total = float(np.trace(self.scatter)) - self.count * float(mean @ mean)
+        projected_mean = mean @ components
+        captured = float(np.einsum('dk,dk->', components, self.scatter @ components)) - self.count * float(projected_mean @ projected_mean)
+        return captured / total if total > 0 else 0.0
+
+    def update(self, samples):
+        """
+        Synchronizes the tracked samples with the current ones: adds the new sample ids, removes the missing ones,
+        and refits the basis if it drifted (or projects the new samples on it).
+
+        Args:
+            samples (Dict[str, np.ndarray]): sample id -> embedding, all the samples to visualize.
+        """
+        start_time = time.perf_counter()
+        removed = [sample_id for sample_id in self.rows if sample_id not in samples]
+        added = [sample_id for sample_id in samples if sample_id not in self.rows]
+        if removed:
+            self._remove(removed)
+        first_added = self.count
+        if added:
+            vectors = np.asarray([samples[sample_id] for sample_id in added], dtype=np.float32).reshape(len(added), self.dim)
+            self._ensure_capacity(self.count + len(added))
+            self.embeddings[self.count:self.count + len(added)] = vectors
+            for sample_id in added:
+                self.rows[sample_id] = len(self.ids)
+                self.ids.append(sample_id)
+            self.count += len(added)
+            self.total += vectors.sum(axis=0, dtype=np.float64)
+            vectors = vectors.astype(np.float64)
+            self.scatter += vectors.T @ vectors
+        if self.count == 0:
+            self.mean = self.components = None
+        elif self.components is None or self._drifted():
+            self.refit()
+        elif added:
+            self.coordinates[first_added:self.count] = self.project(self.embeddings[first_added:self.count])
+        self.stats['updates'] += 1
+        self.stats['last_update_ms'] = (time.perf_counter() - start_time) * 1000
+
+    def _remove(self, sample_ids):
+        rows = [self.rows[sample_id] for sample_id in sample_ids]
+        vectors = self.embeddings[rows].astype(np.float64)
+        self.total -= vectors.sum(axis=0)
+        self.scatter -= vectors.T @ vectors
+        for sample_id in sample_ids:  # Move the last row into the removed one
+            row = self.rows.pop(sample_id)
+            last = self.count - 1
+            if row != last:
+                self.embeddings[row] = self.embeddings[last]
+                self.coordinates[row] = self.coordinates[last]
+                self.ids[row] = self.ids[last]
+                self.rows[self.ids[row]] = row
+            self.ids.pop()
+            self.count = last
+
+    def _drifted(self):
+        if self.count < 3:
+            return True
+        return self.explained_variance_ratio(self.components) < (1 - self.drift_threshold) * self.fit_explained
+
+    def refit(self):
+        """Recomputes the basis from the covariance and reprojects all the samples."""
+        start_time = time.perf_counter()
+        eigenvalues, eigenvectors = np.linalg.eigh(self.covariance())
+        self.components = eigenvectors[:, np.argsort(eigenvalues)[::-1][:2]]
+        self.mean = self.total / self.count
+        self.fit_explained = self.explained_variance_ratio(self.components)
+        self.coordinates[:self.count] = self.project(self.embeddings[:self.count])
+        self.stats['refits'] += 1
+        self.stats['last_refit_ms'] = (time.perf_counter() - start_time) * 1000
+
+    def project(self, embeddings):
+        """Projects embeddings (shape (N, dim) or (dim,)) on the cached basis."""
+        return ((np.asarray(embeddings, dtype=np.float64) - self.mean) @ self.components).astype(np.float32)
+
+    def get_coordinates(self, sample_ids):
+        """Returns the cached 2-D coordinates of the samples, shape (N, 2)."""
+        return self.coordinates[[self.rows[sample_id] for sample_id in sample_ids]]
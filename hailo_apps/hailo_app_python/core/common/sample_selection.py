@@ -0,0 +1,75 @@
+"""
+Selection of the samples kept for a record at enrollment: near-duplicate rejection and a cap on the number
+of samples that keeps a diverse subset (farthest-point / k-center selection in cosine distance).
+"""
+# region imports
+# Third-party imports
+import numpy as np
+
+# Local application-specific imports
+from hailo_apps.hailo_app_python.core.common.defines import NORM_EPSILON
+# endregion imports
+
+
+def normalize_embeddings(embeddings):
+    """Returns the embeddings L2-normalized, as a float32 (N, dim) array."""
+    embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+    return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), NORM_EPSILON)
+
+
+def deduplicate(embeddings, similarity_threshold, existing=None):
+    """
+    Greedy near-duplicate rejection, in order: a sample is kept if its cosine similarity to every sample
+    kept so far (and to the existing samples of the record) is below similarity_threshold.
+
+    Args:
+        embeddings (np.ndarray): The candidate embeddings, shape (N, dim).
+        similarity_threshold (float): Cosine similarity above which a sample is a duplicate.
+        existing (np.ndarray): Embeddings already stored for the record, shape (M, dim), or None.
+
+    Returns:
+        List[int]: The indices of the kept samples.
+    """
+    if len(embeddings) == 0:
+        return []
+    candidates = normalize_embeddings(embeddings)
+    existing = normalize_embeddings(existing) if existing is not None and len(existing) else candidates[:0]
+    reference = np.empty((len(existing) + len(candidates), candidates.shape[1]), dtype=np.float32)  # Existing and kept samples
+    reference[:len(existing)] = existing
+    num_reference = len(existing)
+    kept = []
+    for index, vector in enumerate(candidates):
+        if num_reference and float(np.max(reference[:num_reference] @ vector)) >= similarity_threshold:
+            continue
+        kept.append(index)
+        reference[num_reference] = vector
+        num_reference += 1
+    return kept
+
+
+def farthest_point_selection(embeddings, max_samples):
+    """
+    Chooses max_samples diverse samples (greedy k-center in cosine distance): starts from the sample closest to
+    the centroid, then repeatedly adds the sample farthest from the ones already selected.
+
+    Args:
+        embeddings (np.ndarray): The embeddings, shape (N, dim).
+        max_samples (int): The number of samples to select.
+
+    Returns:
+        List[int]: The indices of the selected samples, in their original order.
+    """
+    if len(embeddings) <= max_samples:
+        return list(range(len(embeddings)))
+    vectors = normalize_embeddings(embeddings)
+    centroid = vectors.mean(axis=0)
+    first = int(np.argmax(vectors @ centroid))
+    selected = [first]
+    min_distance = 1 - vectors @ vectors[first]  # Cosine distance of each sample to the selected set
+    for _ in range(max_samples - 1):
+        min_distance[selected] = -np.inf
+        farthest = int(np.argmax(min_distance))
+        selected.append(farthest)
+        min_distance = np.minimum(min_distance, 1 - vectors @ vectors[farthest])
+    return sorted(selected)
+
@@ -0,0 +1,132 @@
+# region imports
+# Standard library imports
+import os
+import queue
+import threading
+import time
+
+# Third-party imports
+from PIL import Image
+# endregion imports
+
+# format -> (PIL format, file extension, encoder options); WebP method 2 is twice as fast as the default 4 for a 3% larger file
+SAMPLE_FORMATS = {'jpeg': ('JPEG', '.jpeg', {}), 'webp': ('WEBP', '.webp', {'method': 2})}
+SAMPLE_FORMAT_DEFAULT = 'jpeg'
+SAMPLE_QUALITY_DEFAULT = 85
+SAMPLE_WRITER_THREADS_DEFAULT = min(4, os.cpu_count() or 1)
+SAMPLE_WRITER_QUEUE_SIZE = 64  # Samples waiting to be encoded at most, submit blocks beyond it
+
+class SampleWriter:
+    """
+    Encodes and writes the face sample images with a pool of encoder threads (PIL releases the GIL while encoding).
+
+    The queue is bounded: when the encoders fall behind, submit() blocks the producer (backpressure, e.g. the training
+    pipeline slows down to the encoding rate) instead of accumulating frames in memory, or drops the sample if block=False.
+    The time producers spent blocked and the queue high-water mark are reported with the encoding stats.
+    Samples are written as JPEG or WebP, optionally downscaled so their longest side is at most max_size pixels.
+    """
+    def __init__(self, num_threads=SAMPLE_WRITER_THREADS_DEFAULT, queue_size=SAMPLE_WRITER_QUEUE_SIZE, image_format=SAMPLE_FORMAT_DEFAULT,
+                 quality=SAMPLE_QUALITY_DEFAULT, max_size=None):
+        if image_format not in SAMPLE_FORMATS:
+            raise ValueError(f"Unsupported sample format: {image_format}, expected one of {list(SAMPLE_FORMATS)}")
+        self.pil_format, self.extension, self.save_options = SAMPLE_FORMATS[image_format]
+        self.quality = quality
+        self.max_size = max_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.stats = {'submitted': 0, 'written': 0, 'dropped': 0, 'errors': 0, 'bytes': 0, 'encode_seconds': 0.0,
+                      'blocked_seconds': 0.0, 'blocked': 0, 'max_pending': 0}
+        self.threads = [threading.Thread(target=self._run, name=f'sample_writer_{i}', daemon=True) for i in range(max(1, num_threads))]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, frame, image_path, block=True, timeout=None):
+        """
+        Queues a sample image to be written.
+
+        Args:
+            frame (np.ndarray): The RGB image, not modified afterwards by the caller.
+            image_path (str): The file path, with the writer's extension (see self.extension).
+            block (bool): Wait for a free slot when the queue is full, otherwise drop the sample.
+            timeout (float): Seconds to wait at most when blocking, None to wait forever.
+
+        Returns:
+            bool: False if the sample was dropped.
+        """
+        try:
+            self.queue.put_nowait((frame, image_path))
+        except queue.Full:
+            if not block:
+                with self.lock:
+                    self.stats['dropped'] += 1
+                return False
+            start_time = time.perf_counter()
+            try:
+                self.queue.put((frame, image_path), timeout=timeout)
+            except queue.Full:
+                with self.lock:
+                    self.stats['dropped'] += 1
+                return False
+            finally:
+                with self.lock:
+                    self.stats['blocked'] += 1
+                    self.stats['blocked_seconds'] += time.perf_counter() - start_time
+        with self.lock:
+            self.stats['submitted'] += 1
+            self.stats['max_pending'] = max(self.stats['max_pending'], self.queue.qsize())
+        return True
+
+    def flush(self):
+        """Waits until all the submitted samples are written."""
+        self.queue.join()
+
+    def close(self):
+        """Writes the queued samples and stops the encoder threads."""
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            task = self.queue.get()
+            if task is None:
+                self.queue.task_done()
+                break
+            try:
+                self.write(*task)
+            except Exception as e:
+                print(f"Error writing sample {task[1]}: {e}")
+                with self.lock:
+                    self.stats['errors'] += 1
+            finally:
+                self.queue.task_done()
+
+    def write(self, frame, image_path):
+        """Encodes and writes one sample image, in the calling thread."""
+        start_time = time.perf_counter()
+        image = Image.fromarray(frame)
+        if self.max_size:
+            image.thumbnail((self.max_size, self.max_size), resample=Image.BILINEAR)  # Keeps the aspect ratio, never upscales
+        image.save(image_path, format=self.pil_format, quality=self.quality, **self.save_options)
+        size = os.path.getsize(image_path)
+        with self.lock:
+            self.stats['written'] += 1
+            self.stats['bytes'] += size
+            self.stats['encode_seconds'] += time.perf_counter() - start_time
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats['pending'] = self.queue.qsize()
+        return stats
+
+    def report(self):
+        stats = self.get_stats()
+        if not stats['submitted'] and not stats['dropped']:
+            return
+        written = max(stats['written'], 1)
+        print(f"Sample writer ({len(self.threads)} threads, {self.pil_format}): {stats['written']} samples written "
+              f"({stats['bytes'] / written / 1024:.1f} KB, {stats['encode_seconds'] * 1000 / written:.1f} ms each), "
+              f"max {stats['max_pending']} pending, producers blocked {stats['blocked']} times for {stats['blocked_seconds']:.2f} s, "
+              f"{stats['dropped']} dropped, {stats['errors']} errors")
@@ -0,0 +1,90 @@
+"""
+Small on-disk cache for values detected at startup (Hailo architecture, TAPPAS paths),
+so they are not re-detected through subprocesses on every application start.
+Each entry is keyed on a fingerprint of what it was detected from (e.g. the modification times of the installed files),
+so a reinstall or a device change invalidates it without waiting for the TTL.
+Kept free of package imports, it is also used by defines.py.
+"""
+import glob
+import os
+import json
+import time
+import tempfile
+from pathlib import Path
+
+STARTUP_CACHE_PATH_DEFAULT = str(Path.home() / ".cache" / "hailo-apps" / "startup_cache.json")
+STARTUP_CACHE_TTL_DEFAULT = 24 * 60 * 60  # seconds
+STARTUP_CACHE_DISABLE_KEY = "HAILO_APPS_DISABLE_STARTUP_CACHE"  # Set to 1 to always detect
+
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(cache_path, cache):
+    # Write to a temporary file and rename, so concurrent app starts never read a partial file
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # The cache is an optimization only
+
+
+def files_fingerprint(patterns):
+    """
+    Returns the paths and change times of the files matching the glob patterns (a reinstall replaces the files,
+    the device nodes are recreated when the driver loads), as a JSON serializable list. Only stats the files, no subprocess.
+    """
+    fingerprint = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            try:
+                fingerprint.append([path, os.stat(path).st_ctime_ns])
+            except OSError:
+                pass
+    return fingerprint
+
+
+def cached_value(key, compute, ttl=STARTUP_CACHE_TTL_DEFAULT, cache_path=STARTUP_CACHE_PATH_DEFAULT, fingerprint=None, validate=None):
+    """
+    Returns a cached value, or computes and stores it if missing, older than ttl, or detected from another installation.
+
+    Args:
+        key (str): The cache key.
+        compute (callable): Computes the value. Must return a JSON serializable value; None is not cached.
+        ttl (float): Maximum age of the cached value in seconds.
+        cache_path (str): The cache file.
+        fingerprint: JSON serializable identity of what the value is detected from (see files_fingerprint),
+            the cached value is used only if it was stored with the same fingerprint.
+        validate (callable): Checks a cached value (e.g. the directory still exists), recomputed if it returns False.
+
+    Returns:
+        The cached or computed value.
+    """
+    if os.environ.get(STARTUP_CACHE_DISABLE_KEY, "0") not in ("", "0"):
+        return compute()
+    cache = _read_cache(cache_path)
+    entry = cache.get(key)
+    if (isinstance(entry, dict) and time.time() - entry.get("timestamp", 0) < ttl
+            and entry.get("fingerprint") == fingerprint and (validate is None or validate(entry.get("value")))):
+        return entry.get("value")
+    value = compute()
+    if value is not None:
+        cache[key] = {"value": value, "timestamp": time.time(), "fingerprint": fingerprint}
+        _write_cache(cache_path, cache)
+    return value
+
+
+def clear_startup_cache(cache_path=STARTUP_CACHE_PATH_DEFAULT):
+    """Removes the cache file, e.g. after changing the Hailo device or reinstalling TAPPAS."""
+    try:
+        os.remove(cache_path)
+    except FileNotFoundError:
+        pass
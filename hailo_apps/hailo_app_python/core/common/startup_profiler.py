@@ -0,0 +1,92 @@
+"""
+Startup time profiler: where the time to the first frame goes.
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+_MODULE_IMPORT_TIME = time.monotonic()
+
+
+def _process_age():
+    """Returns the seconds since the process started, or None if /proc is not available."""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            # The command name may contain spaces, the fields after it are space separated
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])  # starttime, field 22 in proc(5)
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfiler:
+    """
+    Records the startup phases of an application.
+
+    Phases are either measured explicitly with phase(name), or with mark(name), which charges the time
+    since the previous mark to name, minus the time spent in explicit phases in between.
+    The process start is taken from /proc, so the 'import' phase includes the interpreter start
+    and all the imports before the application starts.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        age = _process_age()
+        self.process_start = (_MODULE_IMPORT_TIME - age) if age is not None else _MODULE_IMPORT_TIME
+        self.last_mark = self.process_start
+        self.phases_since_mark = 0.0  # Time in explicit phases since the last mark
+        self.phases = []  # (name, seconds) in order
+
+    @contextmanager
+    def phase(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            end = time.monotonic()
+            with self.lock:
+                self._add(name, end - start)
+                self.phases_since_mark += end - start
+
+    def mark(self, name):
+        now = time.monotonic()
+        with self.lock:
+            self._add(name, max(0.0, now - self.last_mark - self.phases_since_mark))
+            self.last_mark = now
+            self.phases_since_mark = 0.0
+
+    def _add(self, name, seconds):
+        for i, (phase_name, total) in enumerate(self.phases):
+            if phase_name == name:
+                self.phases[i] = (name, total + seconds)
+                return
+        self.phases.append((name, seconds))
+
+    def elapsed(self):
+        """Returns the seconds since the process started."""
+        return time.monotonic() - self.process_start
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Phase name to milliseconds, and 'total' (process start to the last mark).
+        """
+        with self.lock:
+            stats = {name: seconds * 1000 for name, seconds in self.phases}
+            stats['total'] = (self.last_mark - self.process_start) * 1000
+        return stats
+
+    def report(self):
+        stats = self.get_stats()
+        total = stats.pop('total')
+        print("Startup profile:")
+        for name, ms in stats.items():
+            print(f"  {name:<16} {ms:8.1f} ms")
+        print(f"  {'time to frame':<16} {total:8.1f} ms")
+
+
+# Process wide instance, phases are recorded from several modules
+startup_profiler = StartupProfiler()
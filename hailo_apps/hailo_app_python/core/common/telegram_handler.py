@@ -1,60 +1,155 @@
 # region imports
 # Standard library imports
-from datetime import datetime, timedelta
+import threading
+import time
+from collections import OrderedDict
 from io import BytesIO
 
 # Third-party library imports
 from PIL import Image
 # endregion imports
 
+NOTIFICATION_IDENTITY_INTERVAL = 3600  # Seconds between two notifications of the same global_id
+NOTIFICATION_DEDUP_MAX_IDS = 10000  # Identities remembered at most, the oldest are forgotten first
+
+class ExpiringIdSet:
+    """
+    The identities notified in the last ttl seconds, for the per-identity dedup.
+
+    All the entries have the same TTL, so in insertion order (an identity notified again moves to the end) they also expire
+    in order: each check pops the expired entries from the front, O(1) amortized, and the memory is bounded by the identities
+    notified within one TTL, and by max_ids (the oldest forgotten first) whatever the rate.
+    """
+    def __init__(self, ttl, max_ids=NOTIFICATION_DEDUP_MAX_IDS):
+        self.ttl = ttl
+        self.max_ids = max_ids
+        self.lock = threading.Lock()
+        self.sent_times = OrderedDict()  # identity -> monotonic time of its last notification, oldest first
+        self.stats = {'expired': 0, 'evicted': 0, 'suppressed': 0}
+
+    def _sweep(self, now):
+        while self.sent_times:
+            identity, sent_time = next(iter(self.sent_times.items()))
+            if now - sent_time <= self.ttl:
+                break
+            del self.sent_times[identity]
+            self.stats['expired'] += 1
+
+    def check_and_add(self, identity, ttl=None, now=None):
+        """
+        Returns True (and records the identity as notified now) if the identity was not notified in the last ttl seconds.
+        A ttl longer than the set's one is capped to it (the older entries are already swept).
+        """
+        now = time.monotonic() if now is None else now
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self.lock:
+            self._sweep(now)
+            sent_time = self.sent_times.get(identity)
+            if sent_time is not None and now - sent_time <= ttl:
+                self.stats['suppressed'] += 1
+                return False
+            self.sent_times[identity] = now
+            self.sent_times.move_to_end(identity)
+            while len(self.sent_times) > self.max_ids:
+                self.sent_times.popitem(last=False)
+                self.stats['evicted'] += 1
+            return True
+
+    def __len__(self):
+        return len(self.sent_times)
+
+    def get_stats(self):
+        with self.lock:
+            self._sweep(time.monotonic())
+            stats = dict(self.stats)
+            stats['size'] = len(self.sent_times)
+        return stats
+
 class TelegramHandler:
-    def __init__(self, token, chat_id):
+    def __init__(self, token, chat_id, api_url=None):
         """
         Initialize the TelegramHandler.
         Import telebot and set up the bot only if token and chat_id are provided.
+
+        Args:
+            token (str): The bot token.
+            chat_id (str): The chat to send the notifications to.
+            api_url (str): The Bot API URL template ('.../bot{0}/{1}', token and method), e.g. a local stand-in. None for api.telegram.org.
         """
         self.bot = None
         self.chat_id = chat_id
-        self.ids_msg_sent = {}  # Dictionary to store the last sent time for each person
+        self.ids_msg_sent = ExpiringIdSet(ttl=NOTIFICATION_IDENTITY_INTERVAL)  # The identities notified within the last interval
 
         if token and chat_id:
             try:
                 import telebot
                 self.bot = telebot.TeleBot(token)
+                if api_url:
+                    telebot.apihelper.API_URL = api_url
             except ImportError:
                 raise ImportError("The 'telebot' library is not installed. Install it using 'pip install pyTelegramBotAPI'.")
         else:
             raise ValueError("Telegram token and chat ID must be provided.")
 
-    def should_send_notification(self, global_id):
+    def should_send_notification(self, global_id, interval=NOTIFICATION_IDENTITY_INTERVAL):
         """
-        Check if a notification should be sent for the given global_id.
+        Check if a notification should be sent for the given global_id: at most one every interval seconds per global_id.
         """
-        current_time = datetime.now()
-        last_sent_time = self.ids_msg_sent.get(global_id)
+        # Send notification if it has never been sent or if more than interval seconds have passed
+        return self.ids_msg_sent.check_and_add(global_id, ttl=interval)
 
-        # Send notification if it has never been sent or if more than 1 hour has passed
-        if last_sent_time is None or current_time - last_sent_time > timedelta(hours=1):
-            self.ids_msg_sent[global_id] = current_time  # Update the last sent time
-            return True
-        return False
+    @staticmethod
+    def format_caption(name, global_id, confidence):
+        """Returns the caption of a notification."""
+        if not name:
+            return "🚨 Unknown person detected!"
+        if name == 'Unknown':
+            return f"Detected {global_id} (confidence: {confidence:.2f})"
+        return f"Detected {name} (confidence: {confidence:.2f})"
 
-    def send_notification(self, name, global_id, confidence, frame):
+    def send_photo(self, photo, caption):
         """
-        Send a notification via Telegram with the given details.
+        Sends one photo. Raises the telebot exception on failure (see retry_after).
+
+        Args:
+            photo (bytes): The encoded image.
+            caption (str): The caption.
         """
         if not self.bot:
             raise ValueError("Telegram bot is not initialized. Provide a valid token and chat ID.")
+        self.bot.send_photo(self.chat_id, photo, caption=caption)
 
-        # Determine the caption for the notification
-        if not name:
-            caption = "🚨 Unknown person detected!"
-        else:
-            if name == 'Unknown':
-                caption = f"Detected {global_id} (confidence: {confidence:.2f})"
-            else:
-                caption = f"Detected {name} (confidence: {confidence:.2f})"
+    def send_album(self, photos):
+        """
+        Sends 2 to 10 photos as one album (media group). Raises the telebot exception on failure (see retry_after).
+
+        Args:
+            photos (List[Tuple[bytes, str]]): The encoded images and their captions.
+        """
+        if not self.bot:
+            raise ValueError("Telegram bot is not initialized. Provide a valid token and chat ID.")
+        from telebot.types import InputMediaPhoto
+        self.bot.send_media_group(self.chat_id, [InputMediaPhoto(photo, caption=caption) for photo, caption in photos])
+
+    @staticmethod
+    def retry_after(error):
+        """
+        Returns the seconds to wait before retrying a failed send: the retry_after of a Telegram 'Too Many Requests' error,
+        None for other errors (retried with backoff), or -1 if the request must not be retried (other client errors).
+        """
+        result_json = getattr(error, 'result_json', None)
+        error_code = getattr(error, 'error_code', None)
+        if error_code == 429 and result_json:
+            return float(result_json.get('parameters', {}).get('retry_after', 0)) or None
+        if error_code is not None and 400 <= error_code < 500:
+            return -1
+        return None
 
+    def send_notification(self, name, global_id, confidence, frame):
+        """
+        Send a notification via Telegram with the given details, synchronously (see NotificationDispatcher for the
+        asynchronous path used by the pipeline).
+        """
         # Convert the frame to an image and send it
         image = Image.fromarray(frame)
         image_byte_array = BytesIO()
@@ -62,6 +157,6 @@ class TelegramHandler:
         image_byte_array.seek(0)
 
         try:
-            self.bot.send_photo(self.chat_id, image_byte_array, caption)
+            self.send_photo(image_byte_array, self.format_caption(name, global_id, confidence))
         except Exception as e:
-            print(f"Error sending Telegram notification: {str(e)}")
\ No newline at end of file
+            print(f"Error sending Telegram notification: {str(e)}")
@@ -0,0 +1,165 @@
+# region imports
+# Standard library imports
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Third-party imports
+import numpy as np
+
+# Local application-specific imports
+from hailo_apps.hailo_app_python.core.common.defines import NORM_EPSILON
+# endregion imports
+
+class TrackIdentityCache:
+    """
+    Identity of the tracked faces, so a track is not searched in the database again while its identity is confident.
+
+    Per track id it keeps the recognition result (label, global_id, confidence, the record's threshold) and an exponential
+    moving average (EMA) of the track's face embeddings. A track is searched again when:
+        - its EMA drifted from the embedding of the last search (cosine similarity below drift_similarity), e.g. another
+          face took over the track,
+        - its confidence, halved every confidence_half_life seconds since the search, fell below the record's threshold,
+        - it is 'Unknown', every unknown_retry_frames frames (it may be recognized in a better frame).
+    New tracks are not searched during their first skip_frames frames (blurry, the person is entering the frame).
+    Tracks not seen for ttl seconds are evicted, and the least recently seen ones beyond max_tracks.
+    """
+    def __init__(self, skip_frames, unknown_retry_frames, max_tracks=256, ttl=2.0, drift_similarity=0.8,
+                 confidence_half_life=10.0, ema_weight=0.3, report_interval=30.0):
+        self.skip_frames = skip_frames
+        self.unknown_retry_frames = unknown_retry_frames
+        self.max_tracks = max_tracks
+        self.ttl = ttl
+        self.drift_similarity = drift_similarity
+        self.confidence_half_life = confidence_half_life
+        self.ema_weight = ema_weight
+        self.report_interval = report_interval
+        self.lock = threading.Lock()
+        self.tracks = OrderedDict()  # track_id -> entry, least recently seen first
+        self.stats = {'searches': 0, 'avoided': 0, 'evicted': 0}
+        self.start_time = self.last_report_time = time.monotonic()
+
+    def touch(self, track_id, now=None):
+        """
+        Marks a track as seen in the current frame and evicts the expired tracks.
+
+        Returns:
+            bool: True if the track is past its first skip_frames frames.
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            entry = self.tracks.get(track_id)
+            if entry is None:
+                entry = self.tracks[track_id] = {'frames': 0, 'last_seen': now, 'embedding_ema': None, 'query_embedding': None,
+                                                 'label': None, 'global_id': None, 'confidence': 0.0, 'threshold': None,
+                                                 'query_time': None, 'query_frame': None}
+            else:
+                self.tracks.move_to_end(track_id)
+            entry['frames'] += 1
+            entry['last_seen'] = now
+            self._evict(now)
+            warmed_up = entry['frames'] > self.skip_frames
+            report = self.report_interval and now - self.last_report_time >= self.report_interval
+        if report:
+            self.report()
+        return warmed_up
+
+    def _evict(self, now):
+        while self.tracks:
+            track_id, entry = next(iter(self.tracks.items()))
+            if len(self.tracks) <= self.max_tracks and now - entry['last_seen'] <= self.ttl:
+                break
+            del self.tracks[track_id]
+            self.stats['evicted'] += 1
+
+    def needs_search(self, track_id, embedding, now=None):
+        """
+        Folds a new embedding of the track into its EMA and decides if the track must be searched again.
+
+        Args:
+            track_id (int): The track id (see touch).
+            embedding (np.ndarray): The face embedding of the current frame.
+
+        Returns:
+            np.ndarray or None: The embedding to search with (the normalized EMA), or None if the cached identity holds.
+        """
+        now = time.monotonic() if now is None else now
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        vector = vector / max(float(np.linalg.norm(vector)), NORM_EPSILON)
+        with self.lock:
+            entry = self.tracks.get(track_id)
+            if entry is None:
+                return vector
+            if entry['embedding_ema'] is None:
+                entry['embedding_ema'] = vector
+            else:
+                ema = (1 - self.ema_weight) * entry['embedding_ema'] + self.ema_weight * vector
+                entry['embedding_ema'] = ema / max(float(np.linalg.norm(ema)), NORM_EPSILON)
+            if not self._is_stale(entry, now):
+                self.stats['avoided'] += 1
+                return None
+            self.stats['searches'] += 1
+            return entry['embedding_ema']
+
+    def _is_stale(self, entry, now):
+        if entry['query_embedding'] is None:
+            return True
+        if entry['label'] == 'Unknown':
+            return entry['frames'] - entry['query_frame'] >= self.unknown_retry_frames
+        if float(entry['embedding_ema'] @ entry['query_embedding']) < self.drift_similarity:
+            return True
+        decayed = entry['confidence'] * 0.5 ** ((now - entry['query_time']) / self.confidence_half_life)
+        return decayed <= (entry['threshold'] or 0.0)
+
+    def store(self, track_id, person, confidence, now=None):
+        """
+        Caches the search result of a track.
+
+        Args:
+            track_id (int): The track id.
+            person (Dict[str, Any]): The matched record (or the 'Unknown' result), see DatabaseHandler.resolve_match.
+            confidence (float): The classification confidence of the match.
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            entry = self.tracks.get(track_id)
+            if entry is None:
+                return
+            entry.update({'label': person['label'], 'global_id': person['global_id'], 'confidence': confidence,
+                          'threshold': person['classificaiton_confidence_threshold'], 'query_embedding': entry['embedding_ema'],
+                          'query_time': now, 'query_frame': entry['frames']})
+
+    def get(self, track_id):
+        """Returns the cached label, global_id and confidence of a track, or None."""
+        with self.lock:
+            entry = self.tracks.get(track_id)
+            if entry is None or entry['label'] is None:
+                return None
+            return {'label': entry['label'], 'global_id': entry['global_id'], 'confidence': entry['confidence']}
+
+    def memory_bytes(self):
+        """Approximate memory of the cached tracks (entries and embeddings)."""
+        with self.lock:
+            entries = sum(sys.getsizeof(entry) for entry in self.tracks.values())
+            vectors = sum(entry['embedding_ema'].nbytes for entry in self.tracks.values() if entry['embedding_ema'] is not None)
+            return sys.getsizeof(self.tracks) + entries + vectors
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['tracks'] = len(self.tracks)
+            elapsed = time.monotonic() - self.start_time
+        stats['avoided_per_second'] = stats['avoided'] / elapsed if elapsed > 0 else 0.0
+        stats['memory_bytes'] = self.memory_bytes()
+        return stats
+
+    def report(self):
+        stats = self.get_stats()
+        with self.lock:
+            self.last_report_time = time.monotonic()
+        total = stats['searches'] + stats['avoided']
+        if not total:
+            return
+        print(f"Track identity cache: {stats['avoided']}/{total} searches avoided ({stats['avoided_per_second']:.1f}/s), "
+              f"{stats['searches']} searches, {stats['tracks']} tracks, {stats['evicted']} evicted, {stats['memory_bytes'] / 1024:.1f} KB")
@@ -0,0 +1,180 @@
+# region imports
+# Standard library imports
+import math
+import threading
+import time
+# endregion imports
+
+INDEX_MIN_ROWS = 256  # Below this size the table is searched exhaustively (brute force), an index does not pay off
+INDEX_CHURN_FRACTION = 0.2  # Rebuild when the rows changed since the last build exceed this fraction of the indexed rows
+IVF_PQ_MIN_ROWS = 5000  # From this size the index uses product quantization (IVF_PQ), below it IVF_FLAT (exact distances)
+IVF_NPROBES_FRACTION = 0.1  # Fraction of the IVF partitions probed per query
+IVF_MIN_NPROBES = 8
+PQ_REFINE_FACTOR = 10  # IVF_PQ candidates re-ranked with the exact distance: limit * PQ_REFINE_FACTOR
+REBUILD_RETRY_DELAY = 60  # Seconds before a failed build is retried, doubled on every consecutive failure
+REBUILD_RETRY_DELAY_MAX = 3600
+
+class VectorIndexManager:
+    """
+    Lifecycle of the ANN index of a LanceDB vector column.
+
+    Writers report the number of changed rows with note_changes(); the table size is read from the table metadata
+    (count_rows), never by scanning. Once the changes since the last build pass INDEX_CHURN_FRACTION of the indexed
+    rows, the index is rebuilt in a background thread with IVF parameters chosen from the table size. Rows written
+    after a build are still found by LanceDB (they are searched exhaustively and merged), so a stale index costs
+    latency, not correctness. Tables smaller than INDEX_MIN_ROWS are not indexed and are searched by brute force.
+    After a failed build, no rebuild is started for REBUILD_RETRY_DELAY seconds (doubled on every consecutive failure).
+    """
+    def __init__(self, table, vector_column, metric='cosine', dim=512, min_rows=INDEX_MIN_ROWS, churn_fraction=INDEX_CHURN_FRACTION):
+        self.table = table
+        self.vector_column = vector_column
+        self.metric = metric
+        self.dim = dim
+        self.min_rows = min_rows
+        self.churn_fraction = churn_fraction
+        self.lock = threading.Lock()
+        self.rebuild_thread = None
+        self.index_params = None  # Parameters of the current index, None if the column is not indexed
+        self.indexed_rows = 0
+        self.changes = 0  # Rows changed since the last build
+        self.builds = 0
+        self.last_build_ms = None
+        self.failures = 0  # Consecutive failed builds
+        self.retry_time = 0.0  # Monotonic time before which no rebuild is started, after a failed build
+        self._load_state()
+
+    def _load_state(self):
+        """Picks up an index built in a previous run."""
+        try:
+            for index in self.table.list_indices():
+                if self.vector_column in index.columns:
+                    stats = self.table.index_stats(index.name)
+                    self.index_params = {**self.ivf_params(stats.num_indexed_rows), 'index_type': stats.index_type, 'name': index.name}
+                    self.indexed_rows = stats.num_indexed_rows
+                    self.changes = stats.num_unindexed_rows
+        except Exception as e:
+            print(f"Warning: could not read the index state of '{self.vector_column}': {e}")
+
+    def count_rows(self):
+        """Returns the number of rows of the table, from the table metadata."""
+        return self.table.count_rows()
+
+    def ivf_params(self, num_rows):
+        """
+        Chooses the index parameters for a table size: about sqrt(num_rows) partitions, exact vectors (IVF_FLAT)
+        for small tables and product quantization (IVF_PQ, dim / 16 sub-vectors of 8 bits) for large ones.
+
+        Returns:
+            dict: index_type, num_partitions, num_sub_vectors (IVF_PQ only) and nprobes.
+        """
+        num_partitions = max(1, int(round(math.sqrt(num_rows))))
+        params = {
+            'index_type': 'IVF_PQ' if num_rows >= IVF_PQ_MIN_ROWS else 'IVF_FLAT',
+            'num_partitions': num_partitions,
+            'nprobes': min(num_partitions, max(IVF_MIN_NPROBES, int(math.ceil(num_partitions * IVF_NPROBES_FRACTION)))),
+        }
+        if params['index_type'] == 'IVF_PQ':
+            params['num_sub_vectors'] = self.dim // 16
+        return params
+
+    def note_changes(self, num_rows=1):
+        """
+        Reports written, updated or deleted rows, and starts a background rebuild if the churn threshold is passed.
+        """
+        with self.lock:
+            self.changes += num_rows
+            if not self._rebuild_due():
+                return
+            check_size = self.index_params is None
+        num_rows = self.count_rows() if check_size else None  # Outside the lock, reads the table metadata
+        with self.lock:
+            if not self._rebuild_due():  # Another writer may have started a rebuild meanwhile
+                return
+            if check_size and num_rows < self.min_rows:
+                self.changes = 0  # Nothing to rebuild, check the size again after the next batch of changes
+                return
+            self.rebuild_thread = threading.Thread(target=self.rebuild, daemon=True)
+            self.rebuild_thread.start()
+
+    def _rebuild_due(self):
+        """Whether a rebuild should be started now. Called with the lock held."""
+        if self.rebuild_thread is not None and self.rebuild_thread.is_alive():
+            return False
+        if time.monotonic() < self.retry_time:
+            return False
+        return self.changes >= self.churn_fraction * max(self.indexed_rows, self.min_rows)
+
+    def rebuild(self):
+        """Rebuilds the index synchronously (drops it if the table became smaller than min_rows)."""
+        start_time = time.perf_counter()
+        with self.lock:
+            changes_at_start = self.changes
+        num_rows = self.count_rows()
+        try:
+            if num_rows < self.min_rows:
+                if self.index_params is not None:
+                    self.table.drop_index(self.index_params.get('name', f"{self.vector_column}_idx"))
+                params = None
+            else:
+                params = self.ivf_params(num_rows)
+                self.table.create_index(
+                    metric=self.metric, vector_column_name=self.vector_column, replace=True, index_type=params['index_type'],
+                    num_partitions=params['num_partitions'], num_sub_vectors=params.get('num_sub_vectors'))
+                params['name'] = f"{self.vector_column}_idx"
+        except Exception as e:
+            with self.lock:
+                self.failures += 1
+                delay = min(REBUILD_RETRY_DELAY_MAX, REBUILD_RETRY_DELAY * 2 ** (self.failures - 1))
+                self.retry_time = time.monotonic() + delay
+            print(f"Error: rebuilding the index of '{self.vector_column}' failed: {e}, retrying in {delay} s at the earliest")
+            return
+        with self.lock:
+            self.failures = 0
+            self.retry_time = 0.0
+            self.index_params = params
+            self.indexed_rows = num_rows if params else 0
+            self.changes -= changes_at_start  # Changes made during the build are not in the index
+            self.builds += 1
+            self.last_build_ms = (time.perf_counter() - start_time) * 1000
+
+    def wait(self, timeout=None):
+        """Waits for a background rebuild to finish."""
+        thread = self.rebuild_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def configure(self, query, metric=None):
+        """
+        Applies the search parameters of the current index to a LanceDB vector query,
+        or forces an exhaustive search if the table is not indexed or another metric is requested.
+        """
+        with self.lock:
+            params = self.index_params
+        if params is None or (metric is not None and metric != self.metric):
+            return query.bypass_vector_index()
+        if 'nprobes' in params:
+            query = query.nprobes(params['nprobes'])
+        if params['index_type'] == 'IVF_PQ':
+            query = query.refine_factor(PQ_REFINE_FACTOR)
+        return query
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'indexed': self.index_params is not None,
+                'index_params': dict(self.index_params) if self.index_params else None,
+                'indexed_rows': self.indexed_rows,
+                'changes_since_build': self.changes,
+                'builds': self.builds,
+                'failures': self.failures,
+                'last_build_ms': self.last_build_ms,
+            }
+
+    def report(self):
+        stats = self.get_stats()
+        if not stats['indexed']:
+            print(f"Vector index '{self.vector_column}': none (brute-force search), {stats['changes_since_build']} changes")
+            return
+        build = f", last build {stats['last_build_ms']:.0f} ms" if stats['last_build_ms'] is not None else ""
+        print(f"Vector index '{self.vector_column}': {stats['index_params']}, {stats['indexed_rows']} indexed rows, "
+              f"{stats['changes_since_build']} changes since build, {stats['builds']} builds{build}")
@@ -0,0 +1,40 @@
+/**
+ * Copyright (c) 2021-2022 Hailo Technologies Ltd. All rights reserved.
+ * Distributed under the LGPL license (https://www.gnu.org/licenses/old-licenses/lgpl-2.1.txt)
+ **/
+#include <vector>
+#include <string>
+#include "decimation_croppers.hpp"
+
+// Must match INFERENCE_DECIMATION_SKIP_TYPE in defines.py
+#define DECIMATION_SKIP_TYPE "inference_decimation"
+
+/**
+ * @brief Whole buffer cropper that honors the inference decimation tag.
+ *
+ * Behaves like the whole_buffer create_crops function (the full frame is sent to the inner pipeline),
+ * unless the Python decimation probe tagged the frame with a classification of type DECIMATION_SKIP_TYPE.
+ * Tagged frames get no crops, so they only pass through the bypass branch of the hailocropper / hailoaggregator
+ * pair and the network is not run on them. The tag is removed so it never reaches the overlay.
+ *
+ * @param image The original picture (cv::Mat).
+ * @param roi The main ROI of this picture.
+ * @return std::vector<HailoROIPtr> The main ROI, or an empty vector for skipped frames.
+ */
+std::vector<HailoROIPtr> decimation_crop(std::shared_ptr<HailoMat> image, HailoROIPtr roi)
+{
+    std::vector<HailoROIPtr> crop_rois;
+    bool skip_inference = false;
+    for (auto obj : roi->get_objects_typed(HAILO_CLASSIFICATION))
+    {
+        HailoClassificationPtr classification = std::dynamic_pointer_cast<HailoClassification>(obj);
+        if (classification && std::string(DECIMATION_SKIP_TYPE) == classification->get_classification_type())
+        {
+            roi->remove_object(obj);
+            skip_inference = true;
+        }
+    }
+    if (!skip_inference)
+        crop_rois.emplace_back(roi);
+    return crop_rois;
+}
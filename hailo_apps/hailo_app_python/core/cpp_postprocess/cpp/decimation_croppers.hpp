@@ -0,0 +1,13 @@
+/**
+* Copyright (c) 2021-2022 Hailo Technologies Ltd. All rights reserved.
+* Distributed under the LGPL license (https://www.gnu.org/licenses/old-licenses/lgpl-2.1.txt)
+**/
+#pragma once
+#include <vector>
+#include "hailo_objects.hpp"
+#include "hailo_common.hpp"
+#include "hailomat.hpp"
+
+__BEGIN_DECLS
+std::vector<HailoROIPtr> decimation_crop(std::shared_ptr<HailoMat> image, HailoROIPtr roi);
+__END_DECLS
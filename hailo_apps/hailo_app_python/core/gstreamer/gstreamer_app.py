@@ -19,6 +19,19 @@ from gi.repository import Gst, GLib, GObject
 from hailo_apps.hailo_app_python.core.gstreamer.gstreamer_helper_pipelines import (
     get_source_type,
 )
+from hailo_apps.hailo_app_python.core.gstreamer.gstreamer_decimation import (
+    InferenceDecimator,
+    MotionGateProbe,
+)
+from hailo_apps.hailo_app_python.core.gstreamer.gstreamer_reconfigure import (
+    PipelineReconfigurator,
+)
+from hailo_apps.hailo_app_python.core.gstreamer.gstreamer_loop import (
+    SegmentLooper,
+    LoopStallMeter,
+)
+from hailo_apps.hailo_app_python.core.common.motion_gate import MotionGate
+from hailo_apps.hailo_app_python.core.common.startup_profiler import startup_profiler
 
 # Absolute imports for your common utilities
 from hailo_apps.hailo_app_python.core.common.defines import (
@@ -31,12 +44,16 @@ from hailo_apps.hailo_app_python.core.common.defines import (
     BASIC_PIPELINES_VIDEO_EXAMPLE_NAME,
     USB_CAMERA,
     RPI_NAME_I,
+    RESOURCES_SO_DIR_NAME,
+    INFERENCE_DECIMATION_SO_FILENAME,
+    UI_STREAM_REPORT_INTERVAL,
 )
 from hailo_apps.hailo_app_python.core.common.camera_utils import (
     get_usb_video_devices,
 )
 from hailo_apps.hailo_app_python.core.common.core import (
     load_environment,
+    get_resource_path,
 )
 from hailo_apps.hailo_app_python.core.common.buffer_utils import (
     get_caps_from_pad,
@@ -49,6 +66,8 @@ try:
 except ImportError:
     pass # Available only on Pi OS
 
+SHUTDOWN_STATE_TIMEOUT_SEC = 2  # Upper bound for each asynchronous state change during shutdown
+
 # -----------------------------------------------------------------------------------------------
 # User-defined class to be used in the callback function
 # -----------------------------------------------------------------------------------------------
@@ -99,6 +118,7 @@ def dummy_callback(pad, info, user_data):
 # -----------------------------------------------------------------------------------------------
 class GStreamerApp:
     def __init__(self, args, user_data: app_callback_class):
+        startup_profiler.mark("import")
         # Set the process title
         setproctitle.setproctitle("Hailo Python App")
 
@@ -110,7 +130,8 @@ class GStreamerApp:
 
         # Load environment variables
         x=os.environ.get("HAILO_ENV_FILE")
-        load_environment(x)
+        with startup_profiler.phase("env"):
+            load_environment(x)
 
         # Initialize variables
         tappas_post_process_dir = Path(os.environ.get(TAPPAS_POSTPROC_PATH_KEY, ''))
@@ -138,6 +159,9 @@ class GStreamerApp:
         self.user_data = user_data
         self.video_sink = GST_VIDEO_SINK
         self.pipeline = None
+        self.reconfigurator = None
+        self.looper = None
+        self.loop_stall_meter = None
         self.loop = None
         self.threads = []
         self.error_occurred = False
@@ -161,6 +185,15 @@ class GStreamerApp:
             os.environ["GST_DEBUG_DUMP_DOT_DIR"] = os.getcwd()
         
         self.webrtc_frames_queue = None  # for appsink & GUI mode
+        self.ui_stream_report_time = time.monotonic()
+
+        # Inference decimation: apps pass self.decimation_so to INFERENCE_PIPELINE_WRAPPER
+        # Motion gating is applied through the same decimation stage
+        self.decimator = None
+        self.motion_gate = None
+        self.decimation_so = None
+        if self.options_menu.decimation > 1 or self.options_menu.adaptive_decimation or self.options_menu.motion_gate:
+            self.decimation_so = str(get_resource_path(pipeline_name=None, resource_type=RESOURCES_SO_DIR_NAME, model=INFERENCE_DECIMATION_SO_FILENAME))
 
     def appsink_callback_x(self, appsink):
         """
@@ -192,27 +225,48 @@ class GStreamerApp:
         """
         Callback function for the appsink element in the GStreamer pipeline.
         This function is called when a new sample (frame) is available in the appsink (output from the pipeline).
+        With the UI_APPSINK_PIPELINE jpeg encoding the frame is delivered as the JPEG bytes, copied once out of the buffer.
         """
         sample = appsink.emit('pull-sample')
         if sample:
             buffer = sample.get_buffer()
             if buffer:
-                format, width, height = get_caps_from_pad(appsink.get_static_pad("sink"))
-                frame = get_numpy_from_buffer(buffer, format, width, height)
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)  # convert from BGR to RGB
+                if sample.get_caps().get_structure(0).get_name() == 'image/jpeg':
+                    frame = buffer.extract_dup(0, buffer.get_size())
+                else:
+                    format, width, height = get_caps_from_pad(appsink.get_static_pad("sink"))
+                    frame = get_numpy_from_buffer(buffer, format, width, height)
+                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)  # convert from BGR to RGB
                 try:
                     self.webrtc_frames_queue.put(frame)  # Add the frame to the queue (non-blocking)
                 except queue.Full:
                     print("Frame queue is full. Dropping frame.")  # Drop the frame if the queue is full
+                self.report_ui_stream_stats()
         return Gst.FlowReturn.OK
 
+    def report_ui_stream_stats(self, force=False):
+        """Prints the UI stream rate and bandwidth every UI_STREAM_REPORT_INTERVAL seconds (if the frames queue counts them)."""
+        if not hasattr(self.webrtc_frames_queue, 'get_stats'):
+            return
+        now = time.monotonic()
+        if not force and now - self.ui_stream_report_time < UI_STREAM_REPORT_INTERVAL:
+            return
+        self.ui_stream_report_time = now
+        stats = self.webrtc_frames_queue.get_stats()
+        if stats['frames']:
+            print(f"UI stream: {stats['fps']:.1f} fps, {stats['bytes_per_frame'] / 1024:.1f} KB/frame, "
+                  f"{stats['bytes_per_second'] / (1024 * 1024):.2f} MB/s, {stats['replaced']} frames replaced before the UI took them")
+        self.webrtc_frames_queue.reset_stats()
+
     def on_fps_measurement(self, sink, fps, droprate, avgfps):
         print(f"FPS: {fps:.2f}, Droprate: {droprate:.2f}, Avg FPS: {avgfps:.2f}")
         return True
 
     def create_pipeline(self):
+        startup_profiler.mark("app init")
         # Initialize GStreamer
         Gst.init(None)
+        startup_profiler.mark("gst init")
         print("Creating pipeline")
         pipeline_string = self.get_pipeline_string()
         try:
@@ -220,6 +274,8 @@ class GStreamerApp:
         except Exception as e:
             print(f"Error creating pipeline: {e}", file=sys.stderr)
             sys.exit(1)
+        startup_profiler.mark("parse_launch")
+        self.reconfigurator = PipelineReconfigurator(self.pipeline)
 
         # Connect to hailo_display fps-measurements
         if self.show_fps:
@@ -235,6 +291,10 @@ class GStreamerApp:
         if t == Gst.MessageType.EOS:
             print("End-of-stream")
             self.on_eos()
+        elif t == Gst.MessageType.SEGMENT_DONE:
+            # Gapless file looping, see SegmentLooper
+            if self.looper is not None and self.looper.enabled:
+                self.looper.on_segment_done()
         elif t == Gst.MessageType.ERROR:
             err, debug = message.parse_error()
             print(f"Error: {err}, {debug}", file=sys.stderr)
@@ -281,14 +341,24 @@ class GStreamerApp:
     def shutdown(self, signum=None, frame=None):
         print("Shutting down... Hit Ctrl-C again to force quit.")
         signal.signal(signal.SIGINT, signal.SIG_DFL)
-        self.pipeline.set_state(Gst.State.PAUSED)
-        GLib.usleep(100000)  # 0.1 second delay
+        # Each step waits for the state change to complete instead of sleeping a fixed time
+        for state in (Gst.State.PAUSED, Gst.State.READY, Gst.State.NULL):
+            self.set_state_and_wait(state)
+        GLib.idle_add(self.loop.quit)
 
-        self.pipeline.set_state(Gst.State.READY)
-        GLib.usleep(100000)  # 0.1 second delay
+    def set_state_and_wait(self, state, timeout=SHUTDOWN_STATE_TIMEOUT_SEC):
+        """
+        Sets the pipeline state and, for asynchronous changes, waits until it completes (or the timeout expires).
 
-        self.pipeline.set_state(Gst.State.NULL)
-        GLib.idle_add(self.loop.quit)
+        Returns:
+            Gst.StateChangeReturn: The result of the state change.
+        """
+        ret = self.pipeline.set_state(state)
+        if ret == Gst.StateChangeReturn.ASYNC:
+            ret, _, _ = self.pipeline.get_state(timeout * Gst.SECOND)
+            if ret == Gst.StateChangeReturn.ASYNC:
+                print(f"Warning: pipeline did not reach {state.value_nick} within {timeout} seconds")
+        return ret
    
     def update_fps_caps(self, new_fps=30, source_name='source'):
         """Updates the FPS by setting max-rate on videorate element directly"""
@@ -324,11 +394,87 @@ class GStreamerApp:
         # Update frame_rate property
         self.frame_rate = new_fps
 
+    def set_element_properties(self, element_name, properties):
+        """Updates properties of a named element without stopping the pipeline, see PipelineReconfigurator."""
+        return self.reconfigurator.set_element_properties(element_name, properties)
+
+    def update_tracker(self, name='hailo_tracker', **params):
+        """Updates hailotracker parameters (TRACKER_PIPELINE argument names) without stopping the pipeline."""
+        return self.reconfigurator.update_tracker(name=name, **params)
+
+    def update_nms_thresholds(self, score_threshold=None, iou_threshold=None, name='inference_hailonet'):
+        """Updates the hailonet NMS thresholds without stopping the pipeline."""
+        return self.reconfigurator.update_nms_thresholds(score_threshold, iou_threshold, name=name)
+
+    def switch_source(self, video_source, source_name='source', no_webcam_compression=False):
+        """
+        Switches the input source of the running pipeline (pad-blocking swap of the source elements).
+        The inference part of the pipeline keeps running, the network is not reloaded.
+
+        Args:
+            video_source (str): The new input, as in the --input flag.
+            source_name (str): The name given to SOURCE_PIPELINE. Defaults to 'source'.
+            no_webcam_compression (bool): As given to SOURCE_PIPELINE for USB cameras.
+
+        Returns:
+            bool: True if the switch was started.
+        """
+        if video_source == USB_CAMERA:
+            usb_devices = get_usb_video_devices()
+            if not usb_devices:
+                print("No available USB cameras found.")
+                return False
+            video_source = usb_devices[0]
+        started = self.reconfigurator.switch_source(
+            video_source, self.video_width, self.video_height, name=source_name,
+            no_webcam_compression=no_webcam_compression, video_format=self.video_format)
+        if started:
+            self.video_source = video_source
+            self.source_type = get_source_type(video_source)
+        return started
+
 
     def get_pipeline_string(self):
         # This is a placeholder function that should be overridden by the child class
         return ""
 
+    def on_startup_state_changed(self, bus, message):
+        # Sync handler, called from the thread posting the message so the timestamps are exact
+        if message.type != Gst.MessageType.STATE_CHANGED or message.src != self.pipeline:
+            return
+        _, new_state, _ = message.parse_state_changed()
+        if new_state == Gst.State.PAUSED:
+            startup_profiler.mark("PAUSED preroll")
+        elif new_state == Gst.State.PLAYING:
+            startup_profiler.mark("PLAYING")
+            bus.disconnect_by_func(self.on_startup_state_changed)
+            if not self.startup_first_buffer_probe:
+                startup_profiler.report()
+
+    def on_startup_first_buffer(self, pad, info):
+        startup_profiler.mark("first buffer")
+        startup_profiler.report()
+        return Gst.PadProbeReturn.REMOVE
+
+    def connect_startup_profiler(self, bus):
+        """Records the preroll and first buffer phases, the profile is printed on the first displayed buffer."""
+        bus.enable_sync_message_emission()
+        bus.connect("sync-message", self.on_startup_state_changed)
+        first_buffer_pad = self.get_output_pad()
+        self.startup_first_buffer_probe = first_buffer_pad is not None
+        if self.startup_first_buffer_probe:
+            first_buffer_pad.add_probe(Gst.PadProbeType.BUFFER, self.on_startup_first_buffer)
+        else:
+            print("Warning: no display, ui_sink or identity_callback element, the startup profile ends at PLAYING.")
+
+    def get_output_pad(self):
+        """Returns the pad where output frames are observed: the display (or UI appsink) sink pad, or the identity_callback src pad."""
+        for name, pad_name in (("hailo_display", "sink"), ("ui_sink", "sink"), ("identity_callback", "src")):
+            element = self.pipeline.get_by_name(name)
+            if element is not None and element.get_static_pad(pad_name) is not None:
+                return element.get_static_pad(pad_name)
+        return None
+
     def dump_dot_file(self):
         print("Dumping dot file...")
         Gst.debug_bin_to_dot_file(self.pipeline, Gst.DebugGraphDetails.ALL, "pipeline")
@@ -350,6 +496,26 @@ class GStreamerApp:
                 identity_pad = identity.get_static_pad("src")
                 identity_pad.add_probe(Gst.PadProbeType.BUFFER, self.app_callback, self.user_data)
 
+        # Connect the inference decimation / motion gating probes
+        if self.options_menu.motion_gate:
+            self.motion_gate = MotionGateProbe(MotionGate(
+                threshold=self.options_menu.motion_threshold,
+                heartbeat=self.options_menu.motion_heartbeat,
+            ))
+        if self.decimation_so is not None:
+            self.decimator = InferenceDecimator(
+                factor=self.options_menu.decimation,
+                adaptive=self.options_menu.adaptive_decimation,
+                target_fps=self.frame_rate,
+                frame_selector=self.motion_gate.frame_selector if self.motion_gate is not None else None,
+            )
+            if not self.decimator.attach(self.pipeline):
+                self.decimator = None
+                # Pipelines without hailo inference may gate the CPU inference branch instead
+                if self.motion_gate is None or not self.motion_gate.attach(self.pipeline):
+                    print("Warning: decimation element not found, this app does not support --decimation / --motion-gate. Running inference on every frame.")
+                    self.motion_gate = None
+
         hailo_display = self.pipeline.get_by_name("hailo_display")
         if hailo_display is None and not getattr(self.options_menu, 'ui', False):
             print("Warning: hailo_display element not found, add <fpsdisplaysink name=hailo_display> to your pipeline to support fps display.")
@@ -367,9 +533,23 @@ class GStreamerApp:
             self.threads.append(picam_thread)
             picam_thread.start()
 
+        startup_profiler.mark("app setup")
+        if self.options_menu.profile_startup:
+            self.connect_startup_profiler(bus)
+
         # Set the pipeline to PAUSED to ensure elements are initialized
         self.pipeline.set_state(Gst.State.PAUSED)
 
+        # Gapless looping of file sources, falls back to the rewind in on_eos
+        if self.source_type == "file" and self.options_menu.loop_mode == "segment":
+            self.looper = SegmentLooper(self.pipeline)
+            self.looper.start()
+        if self.source_type == "file":
+            output_pad = self.get_output_pad()
+            if output_pad is not None:
+                self.loop_stall_meter = LoopStallMeter()
+                self.loop_stall_meter.attach(output_pad)
+
         # Set pipeline latency
         new_latency = self.pipeline_latency * Gst.MSECOND  # Convert milliseconds to nanoseconds
         self.pipeline.set_latency(new_latency)
@@ -387,6 +567,13 @@ class GStreamerApp:
         # Clean up
         try:
             self.user_data.running = False
+            if self.decimator is not None:
+                self.decimator.report()
+            if self.motion_gate is not None:
+                self.motion_gate.report()
+            self.reconfigurator.report()
+            if self.loop_stall_meter is not None:
+                self.loop_stall_meter.report()
             self.pipeline.set_state(Gst.State.NULL)
             if self.options_menu.use_frame:
                 display_process.terminate()
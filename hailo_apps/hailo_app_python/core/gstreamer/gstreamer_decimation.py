@@ -0,0 +1,267 @@
+import time
+import threading
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+# hailo_app_python/core/gstreamer/gstreamer_decimation.py
+
+import hailo
+from hailo_apps.hailo_app_python.core.common.defines import (
+    INFERENCE_DECIMATION_SKIP_TYPE,
+    INFERENCE_DECIMATION_MAX_FACTOR_DEFAULT,
+    INFERENCE_DECIMATION_REPORT_INTERVAL,
+    MOTION_GATE_DOWNSCALE_STEP_DEFAULT,
+)
+from hailo_apps.hailo_app_python.core.common.buffer_utils import get_caps_from_pad, get_luma_from_buffer
+from hailo_apps.hailo_app_python.core.common.motion_gate import MOTION_GATE_REASON_HEARTBEAT
+
+DECIMATION_ELEMENT_SUFFIX = "_decimation"
+MOTION_GATE_ELEMENT_SUFFIX = "_motion_gate"
+TRACKER_FACTORY_NAME = "hailotracker"
+ADAPT_WINDOW_SEC = 1.0  # How often the decimation factor is re-evaluated
+ADAPT_SLOW_RATIO = 0.9  # Below this fraction of the target FPS the factor is increased
+ADAPT_OK_RATIO = 0.98  # Above this fraction of the target FPS the window counts as keeping up
+ADAPT_RECOVER_WINDOWS = 5  # Consecutive windows keeping up before the factor is decreased
+MAX_PENDING_SKIPPED = 1000  # Bound for the skipped frames bookkeeping (frames in flight)
+
+
+class InferenceDecimator:
+    """
+    Pipeline-level inference decimation.
+
+    A probe on the '<wrapper>_decimation' identity element (see INFERENCE_PIPELINE_WRAPPER with decimation_so)
+    decides for every frame whether it is sent to the network. Skipped frames are tagged with a classification
+    of type INFERENCE_DECIMATION_SKIP_TYPE; the decimation cropper passes them only through the bypass branch,
+    and the hailotracker carries the boxes across them.
+
+    By default every Nth frame is inferred. An optional frame_selector(buffer, pad) callable can force inference
+    on a frame (return True) or skip it (return False), e.g. a motion heuristic; returning None keeps the
+    every-Nth decision. In adaptive mode N starts at 1 and follows the measured throughput against the target
+    frame rate, up to max_factor.
+    """
+    def __init__(self, factor=1, adaptive=False, max_factor=INFERENCE_DECIMATION_MAX_FACTOR_DEFAULT,
+                 target_fps=30, frame_selector=None, report_interval=INFERENCE_DECIMATION_REPORT_INTERVAL):
+        self.factor = max(1, int(factor))
+        self.adaptive = adaptive
+        self.max_factor = self.factor
+        if adaptive:  # Start from inference on every frame, the given factor (if any) is the upper limit
+            self.max_factor = self.factor if self.factor > 1 else max(1, int(max_factor))
+            self.factor = 1
+        self.target_fps = target_fps
+        self.frame_selector = frame_selector
+        self.report_interval = report_interval
+        self.lock = threading.Lock()
+
+        # Counters
+        self.frame_count = 0
+        self.inferred_frames = 0
+        self.skipped_frames = 0
+        self.frames_since_inference = 0
+        self.inferred_frames_detections = 0  # Detections after the tracker on inferred frames
+        self.skipped_frames_detections = 0  # Detections carried by the tracker on skipped frames
+        self.tracked_inferred_frames = 0
+        self.tracked_skipped_frames = 0
+        self.factor_changes = 0
+        self.start_time = None
+        self.pending_skipped = set()  # PTS of skipped frames not yet seen by the tracker probe
+
+        # Adaptive mode state
+        self.window_start = None
+        self.window_frames = 0
+        self.ok_windows = 0
+
+    def attach(self, pipeline):
+        """
+        Connects the decimation probe to the '*_decimation' identity element and, if present,
+        a statistics probe after the hailotracker.
+
+        Returns:
+            bool: True if a decimation element was found in the pipeline.
+        """
+        decimation_element, tracker = None, None
+        it = pipeline.iterate_elements()
+        while True:
+            result, element = it.next()
+            if result != Gst.IteratorResult.OK:
+                break
+            if element.get_name().endswith(DECIMATION_ELEMENT_SUFFIX):
+                decimation_element = element
+            factory = element.get_factory()
+            if factory is not None and factory.get_name() == TRACKER_FACTORY_NAME:
+                tracker = element
+
+        if decimation_element is None:
+            return False
+        decimation_element.get_static_pad("src").add_probe(Gst.PadProbeType.BUFFER, self.decimation_probe)
+        if tracker is not None:
+            tracker.get_static_pad("src").add_probe(Gst.PadProbeType.BUFFER, self.tracker_probe)
+        mode = f"adaptive 1-{self.max_factor}" if self.adaptive else f"every {self.factor} frames"
+        print(f"Inference decimation enabled on {decimation_element.get_name()} ({mode})")
+        return True
+
+    def should_infer(self, buffer, pad):
+        """Per-frame decision: inference on every Nth frame unless the frame selector decides otherwise."""
+        if self.frame_selector is not None:
+            decision = self.frame_selector(buffer, pad)
+            if decision is not None:
+                return decision
+        return self.frames_since_inference + 1 >= self.factor
+
+    def decimation_probe(self, pad, info):
+        buffer = info.get_buffer()
+        if buffer is None:
+            return Gst.PadProbeReturn.OK
+        now = time.monotonic()
+        with self.lock:
+            if self.start_time is None:
+                self.start_time = now
+            self.frame_count += 1
+            if self.adaptive:
+                self.adapt_factor(now)
+            if self.should_infer(buffer, pad):
+                self.inferred_frames += 1
+                self.frames_since_inference = 0
+            else:
+                self.skipped_frames += 1
+                self.frames_since_inference += 1
+                roi = hailo.get_roi_from_buffer(buffer)
+                roi.add_object(hailo.HailoClassification(type=INFERENCE_DECIMATION_SKIP_TYPE, label='skip', confidence=1.0))
+                if len(self.pending_skipped) < MAX_PENDING_SKIPPED:
+                    self.pending_skipped.add(buffer.pts)
+            if self.report_interval and self.frame_count % self.report_interval == 0:
+                self.report()
+        return Gst.PadProbeReturn.OK
+
+    def tracker_probe(self, pad, info):
+        buffer = info.get_buffer()
+        if buffer is None:
+            return Gst.PadProbeReturn.OK
+        detections = len(hailo.get_roi_from_buffer(buffer).get_objects_typed(hailo.HAILO_DETECTION))
+        with self.lock:
+            if buffer.pts in self.pending_skipped:
+                self.pending_skipped.discard(buffer.pts)
+                self.tracked_skipped_frames += 1
+                self.skipped_frames_detections += detections
+            else:
+                self.tracked_inferred_frames += 1
+                self.inferred_frames_detections += detections
+        return Gst.PadProbeReturn.OK
+
+    def adapt_factor(self, now):
+        """
+        Increases N when the pipeline falls behind the target frame rate and probes a smaller N
+        after it kept up for ADAPT_RECOVER_WINDOWS consecutive windows.
+        """
+        if self.window_start is None:
+            self.window_start = now
+        self.window_frames += 1
+        elapsed = now - self.window_start
+        if elapsed < ADAPT_WINDOW_SEC:
+            return
+        fps = self.window_frames / elapsed
+        self.window_start, self.window_frames = now, 0
+        if fps < self.target_fps * ADAPT_SLOW_RATIO:
+            self.ok_windows = 0
+            if self.factor < self.max_factor:
+                self.factor += 1
+                self.factor_changes += 1
+        elif fps >= self.target_fps * ADAPT_OK_RATIO:
+            self.ok_windows += 1
+            if self.ok_windows >= ADAPT_RECOVER_WINDOWS and self.factor > 1:
+                self.factor -= 1
+                self.factor_changes += 1
+                self.ok_windows = 0
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Inference savings and the detection retention on skipped frames (accuracy proxy).
+        """
+        elapsed = (time.monotonic() - self.start_time) if self.start_time else 0
+        avg_inferred = self.inferred_frames_detections / self.tracked_inferred_frames if self.tracked_inferred_frames else 0.0
+        avg_skipped = self.skipped_frames_detections / self.tracked_skipped_frames if self.tracked_skipped_frames else 0.0
+        return {
+            'frames': self.frame_count,
+            'inferred_frames': self.inferred_frames,
+            'skipped_frames': self.skipped_frames,
+            'inference_savings': self.skipped_frames / self.frame_count if self.frame_count else 0.0,
+            'inference_fps': self.inferred_frames / elapsed if elapsed else 0.0,
+            'factor': self.factor,
+            'factor_changes': self.factor_changes,
+            'avg_detections_inferred': avg_inferred,
+            'avg_detections_skipped': avg_skipped,
+            'detection_retention': avg_skipped / avg_inferred if avg_inferred else 0.0,
+        }
+
+    def report(self):
+        stats = self.get_stats()
+        print(f"Decimation: frames: {stats['frames']}, inferred: {stats['inferred_frames']}, "
+              f"skipped: {stats['skipped_frames']} ({stats['inference_savings'] * 100:.1f}% inference saved), "
+              f"inference FPS: {stats['inference_fps']:.2f}, N: {stats['factor']}, "
+              f"avg detections inferred/skipped: {stats['avg_detections_inferred']:.2f}/{stats['avg_detections_skipped']:.2f} "
+              f"(retention {stats['detection_retention'] * 100:.1f}%)")
+
+
+class MotionGateProbe:
+    """
+    Connects a MotionGate to a pipeline.
+
+    With hailo inference the gate is used as the frame_selector of an InferenceDecimator: static frames skip
+    the network but still reach the tracker and the display. Pipelines without a decimation element (e.g. the
+    CPU inference branch) can instead attach() it to a '*_motion_gate' identity element, where static frames
+    are dropped before inference.
+    """
+    def __init__(self, motion_gate, step=MOTION_GATE_DOWNSCALE_STEP_DEFAULT, report_interval=INFERENCE_DECIMATION_REPORT_INTERVAL):
+        self.motion_gate = motion_gate
+        self.step = step
+        self.report_interval = report_interval
+        self.lock = threading.Lock()
+
+    def frame_selector(self, buffer, pad):
+        """
+        InferenceDecimator frame selector.
+
+        Returns:
+            bool or None: False for a static frame, True on a heartbeat, None on motion
+            (leaves the decision to the decimation factor).
+        """
+        format, width, height = get_caps_from_pad(pad)
+        if format is None:
+            return None
+        luma = get_luma_from_buffer(buffer, format, width, height, self.step)
+        with self.lock:
+            forward = self.motion_gate.update(luma)
+            if self.report_interval and self.motion_gate.frame_count % self.report_interval == 0:
+                self.motion_gate.report()
+        if not forward:
+            return False
+        return True if self.motion_gate.last_reason == MOTION_GATE_REASON_HEARTBEAT else None
+
+    def attach(self, pipeline):
+        """
+        Connects a dropping probe to the '*_motion_gate' identity element.
+
+        Returns:
+            bool: True if a motion gate element was found in the pipeline.
+        """
+        it = pipeline.iterate_elements()
+        while True:
+            result, element = it.next()
+            if result != Gst.IteratorResult.OK:
+                return False
+            if element.get_name().endswith(MOTION_GATE_ELEMENT_SUFFIX):
+                element.get_static_pad("src").add_probe(Gst.PadProbeType.BUFFER, self.gate_probe)
+                print(f"Motion gating enabled on {element.get_name()}")
+                return True
+
+    def gate_probe(self, pad, info):
+        buffer = info.get_buffer()
+        if buffer is None:
+            return Gst.PadProbeReturn.OK
+        if self.frame_selector(buffer, pad) is False:
+            return Gst.PadProbeReturn.DROP
+        return Gst.PadProbeReturn.OK
+
+    def report(self):
+        self.motion_gate.report()
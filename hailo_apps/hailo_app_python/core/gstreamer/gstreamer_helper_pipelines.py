@@ -3,6 +3,10 @@ from hailo_apps.hailo_app_python.core.common.defines import (
     TAPPAS_POSTPROC_PATH_KEY,
     GST_VIDEO_SINK,
     TAPPAS_POSTPROC_PATH_DEFAULT,
+    INFERENCE_DECIMATION_FUNCTION,
+    UI_STREAM_FORMAT_RAW,
+    UI_STREAM_FORMAT_JPEG,
+    UI_STREAM_JPEG_QUALITY_DEFAULT,
 )
 
 
@@ -52,23 +56,24 @@ def get_camera_resulotion(video_width=640, video_height=640):
         return 3840, 2160
 
 
-def SOURCE_PIPELINE(video_source, video_width=640, video_height=640,
-                    name='source', no_webcam_compression=False, 
-                    frame_rate=30, sync=True, 
-                    video_format='RGB'):
+def SOURCE_ELEMENT_PIPELINE(video_source, video_width=640, video_height=640,
+                            name='source', no_webcam_compression=False,
+                            video_format='RGB'):
     """
-    Creates a GStreamer pipeline string for the video source with a separate fps caps
-    for frame rate control.
+    Creates the source specific part of SOURCE_PIPELINE (source element and decoding),
+    up to the common scaling and conversion elements.
+    Also used to build a replacement source when switching sources at runtime.
 
     Args:
         video_source (str): The path or device name of the video source.
         video_width (int, optional): The width of the video. Defaults to 640.
         video_height (int, optional): The height of the video. Defaults to 640.
-        video_format (str, optional): The video format. Defaults to 'RGB'.
         name (str, optional): The prefix name for the pipeline elements. Defaults to 'source'.
+        no_webcam_compression (bool, optional): Use the uncompressed USB camera format. Defaults to False.
+        video_format (str, optional): The video format. Defaults to 'RGB'.
 
     Returns:
-        str: A string representing the GStreamer pipeline for the video source.
+        str: A string representing the source elements, ending with a link ('! ').
     """
     source_type = get_source_type(video_source)
 
@@ -113,6 +118,30 @@ def SOURCE_PIPELINE(video_source, video_width=640, video_height=640,
             f'decodebin name={name}_decodebin ! '
         )
 
+    return source_element
+
+def SOURCE_PIPELINE(video_source, video_width=640, video_height=640,
+                    name='source', no_webcam_compression=False, 
+                    frame_rate=30, sync=True, 
+                    video_format='RGB'):
+    """
+    Creates a GStreamer pipeline string for the video source with a separate fps caps
+    for frame rate control.
+
+    Args:
+        video_source (str): The path or device name of the video source.
+        video_width (int, optional): The width of the video. Defaults to 640.
+        video_height (int, optional): The height of the video. Defaults to 640.
+        video_format (str, optional): The video format. Defaults to 'RGB'.
+        name (str, optional): The prefix name for the pipeline elements. Defaults to 'source'.
+
+    Returns:
+        str: A string representing the GStreamer pipeline for the video source.
+    """
+    source_element = SOURCE_ELEMENT_PIPELINE(video_source, video_width, video_height,
+                                             name=name, no_webcam_compression=no_webcam_compression,
+                                             video_format=video_format)
+
     # Set up the fps caps.
     # If sync is True, constrain the rate with the given frame_rate.
     # Otherwise, pass through (no framerate limitation).
@@ -212,7 +241,7 @@ def INFERENCE_PIPELINE(
 
     return inference_pipeline
 
-def INFERENCE_PIPELINE_WRAPPER(inner_pipeline, bypass_max_size_buffers=20, name='inference_wrapper'):
+def INFERENCE_PIPELINE_WRAPPER(inner_pipeline, bypass_max_size_buffers=20, name='inference_wrapper', decimation_so=None):
     """
     Creates a GStreamer pipeline string that wraps an inner pipeline with a hailocropper and hailoaggregator.
     This allows to keep the original video resolution and color-space (format) of the input frame.
@@ -222,18 +251,28 @@ def INFERENCE_PIPELINE_WRAPPER(inner_pipeline, bypass_max_size_buffers=20, name=
         inner_pipeline (str): The inner pipeline string to be wrapped.
         bypass_max_size_buffers (int, optional): The maximum number of buffers for the bypass queue. Defaults to 20.
         name (str, optional): The prefix name for the pipeline elements. Defaults to 'inference_wrapper'.
+        decimation_so (str, optional): Path to the decimation cropper .so. When set, an identity element named
+            '{name}_decimation' is added in front of the wrapper and frames tagged there by InferenceDecimator
+            skip the inner pipeline (only the bypass branch is used). Place a tracker after the wrapper to carry
+            detections across the skipped frames. Defaults to None (every frame is inferred).
 
     Returns:
         str: A string representing the GStreamer pipeline for the inference wrapper.
     """
-    # Get the directory for post-processing shared objects
-    tappas_post_process_dir = os.environ.get(TAPPAS_POSTPROC_PATH_KEY, TAPPAS_POSTPROC_PATH_DEFAULT)
-    whole_buffer_crop_so = os.path.join(tappas_post_process_dir, 'cropping_algorithms/libwhole_buffer.so')
+    if decimation_so:
+        crop_so, crop_function = decimation_so, INFERENCE_DECIMATION_FUNCTION
+        decimation_pipeline = f'identity name={name}_decimation ! '
+    else:
+        # Get the directory for post-processing shared objects
+        tappas_post_process_dir = os.environ.get(TAPPAS_POSTPROC_PATH_KEY, TAPPAS_POSTPROC_PATH_DEFAULT)
+        crop_so, crop_function = os.path.join(tappas_post_process_dir, 'cropping_algorithms/libwhole_buffer.so'), 'create_crops'
+        decimation_pipeline = ''
 
     # Construct the inference wrapper pipeline string
     inference_wrapper_pipeline = (
+        f'{decimation_pipeline}'
         f'{QUEUE(name=f"{name}_input_q")} ! '
-        f'hailocropper name={name}_crop so-path={whole_buffer_crop_so} function-name=create_crops use-letterbox=true resize-method=inter-area internal-offset=true '
+        f'hailocropper name={name}_crop so-path={crop_so} function-name={crop_function} use-letterbox=true resize-method=inter-area internal-offset=true '
         f'hailoaggregator name={name}_agg '
         f'{name}_crop. ! {QUEUE(max_size_buffers=bypass_max_size_buffers, name=f"{name}_bypass_q")} ! {name}_agg.sink_0 '
         f'{name}_crop. ! {inner_pipeline} ! {name}_agg.sink_1 '
@@ -318,7 +357,8 @@ def CPU_INFERENCE_PIPELINE(
     input_height=640,
     confidence_threshold=0.5,
     nms_threshold=0.4,
-    name='cpu_inference'
+    name='cpu_inference',
+    motion_gate=False
 ):
     """
     Creates a GStreamer pipeline string for CPU-based YOLO inference using appsink.
@@ -331,12 +371,19 @@ def CPU_INFERENCE_PIPELINE(
         confidence_threshold (float): Confidence threshold for detections. Defaults to 0.5.
         nms_threshold (float): NMS threshold for filtering overlapping boxes. Defaults to 0.4.
         name (str): Prefix name for pipeline elements. Defaults to 'cpu_inference'.
+        motion_gate (bool): Add a '{name}_motion_gate' identity element (behind a leaky queue), where the app drops frames
+            without motion. Defaults to False.
 
     Returns:
         str: A string representing the GStreamer pipeline for CPU inference.
     """
+    # The gate runs on its own streaming thread behind a leaky queue, not on the tee's: a slow gate drops frames of this
+    # branch (like the appsink does) instead of stalling the display branch
+    motion_gate_pipeline = (f'{QUEUE(name=f"{name}_motion_gate_q", max_size_buffers=1, leaky="downstream")} ! '
+                            f'identity name={name}_motion_gate ! ') if motion_gate else ''
     # CPU inference pipeline using appsink to get frames in Python
     cpu_inference_pipeline = (
+        f'{motion_gate_pipeline}'
         f'{QUEUE(name=f"{name}_scale_q")} ! '
         f'videoscale name={name}_videoscale n-threads=2 qos=false ! '
         f'{QUEUE(name=f"{name}_convert_q")} ! '
@@ -488,28 +535,44 @@ def VIDEO_SHMSRC_PIPELINE(socket_path=None):
     """
     return (f"shmsrc socket-path={socket_path} do-timestamp=true ! video/x-raw,format=RGB,width=640,height=480,framerate=30/1 ! videoconvert ! autovideosink")
 
-def UI_APPSINK_PIPELINE(name='ui_sink', sync='true', show_fps='false'):
+def UI_APPSINK_PIPELINE(name='ui_sink', sync='true', show_fps='false', encoding=UI_STREAM_FORMAT_RAW, width=None, height=None, quality=UI_STREAM_JPEG_QUALITY_DEFAULT):
     """
     Creates a GStreamer pipeline string for the UI appsink element.
     This pipeline is used to send video frames to a UI application.
-    And convert the video format to JPEG for display.
     It includes the hailooverlay plugin to draw bounding boxes and labels on the video.
+    With encoding='jpeg' the frames are optionally scaled and encoded by jpegenc in the pipeline (in the streaming thread of
+    the leaky queue, so a slow encoder drops frames instead of stalling the inference), and the appsink delivers the JPEG bytes.
+    The appsink keeps only the newest buffer.
     Args:
         name (str, optional): The prefix name for the pipeline elements. Defaults to 'ui_sink'.
         sync (str, optional): The sync property for the appsink. Defaults to 'true'.
+        encoding (str, optional): 'raw' (RGB frames) or 'jpeg'. Defaults to 'raw'.
+        width (int, optional): The width of the streamed frames, None keeps the video width (or the aspect ratio if height is set).
+        height (int, optional): The height of the streamed frames, None keeps the video height (or the aspect ratio if width is set).
+        quality (int, optional): The JPEG quality (0-100). Defaults to UI_STREAM_JPEG_QUALITY_DEFAULT.
     Returns:
         str: A string representing the GStreamer pipeline for the UI appsink element.
     """
+    scale_caps = ', '.join(f'{key}={value}' for key, value in (('width', width), ('height', height)) if value)
+    scale_pipeline = f'videoscale name={name}_videoscale n-threads=2 ! video/x-raw, {scale_caps} ! ' if scale_caps else ''
+    if encoding == UI_STREAM_FORMAT_JPEG:
+        format_pipeline = (
+            f'{QUEUE(name=f"{name}_encoder_q", max_size_buffers=1, leaky="downstream")} ! '
+            f'{scale_pipeline}'
+            f'videoconvert name={name}_videoconvert n-threads=2 qos=false ! '
+            f'jpegenc name={name}_jpegenc quality={quality} ! '
+            f'image/jpeg ! '
+        )
+    else:
+        format_pipeline = (
+            f'{QUEUE(name=f"{name}_videoconvert_q")} ! '
+            f'{scale_pipeline}'
+            f'video/x-raw, format=RGB ! '
+        )
     # Construct the UI appsink pipeline string
     ui_appsink_pipeline = (
         f'{OVERLAY_PIPELINE(name=f"{name}_overlay")} ! '
-        f'{QUEUE(name=f"{name}_videoconvert_q")} ! '
-        # f'videoconvert name={name}_videoconvert n-threads=2 qos=false ! '
-        # f'encodebin name={name}_encodebin ! '
-        # f'jpegenc name={name}_jpegenc quality=100 ! '
-        # f'image/jpeg ! '
-        # f'{QUEUE(name=f"{name}_q")} ! '
-        f'video/x-raw, format=RGB ! '
-        f'appsink name={name} sync={sync} drop=true emit-signals=true '
+        f'{format_pipeline}'
+        f'appsink name={name} sync={sync} max-buffers=1 drop=true emit-signals=true '
     )
     return ui_appsink_pipeline
@@ -0,0 +1,101 @@
+import time
+import threading
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+# hailo_app_python/core/gstreamer/gstreamer_loop.py
+
+PREROLL_TIMEOUT_SEC = 5  # Max wait for the file source to preroll before the first segment seek
+INTERVAL_EMA_WEIGHT = 0.1  # Weight of a new frame interval in the average frame interval
+
+
+class SegmentLooper:
+    """
+    Gapless looping of file sources using segment seeks.
+
+    A flushing segment seek is done once, after preroll. When the source reaches the end of the segment it posts
+    SEGMENT_DONE instead of EOS, and a non-flushing segment seek to the start is queued behind the buffers still
+    in flight. The running time keeps increasing across loops, so synced sinks neither wait nor drop frames.
+    Demuxers without segment seek support fall back to the EOS rewind.
+    """
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.enabled = False
+        self.loop_count = 0
+
+    def start(self):
+        """
+        Must be called in PAUSED, before going to PLAYING.
+
+        Returns:
+            bool: True if segment looping is active.
+        """
+        ret, _, _ = self.pipeline.get_state(PREROLL_TIMEOUT_SEC * Gst.SECOND)
+        if ret == Gst.StateChangeReturn.FAILURE:
+            return False
+        self.enabled = self.pipeline.seek(
+            1.0, Gst.Format.TIME, Gst.SeekFlags.FLUSH | Gst.SeekFlags.SEGMENT,
+            Gst.SeekType.SET, 0, Gst.SeekType.NONE, -1)
+        if not self.enabled:
+            print("Segment seek not supported by this source, looping with a rewind at end of stream.")
+        return self.enabled
+
+    def on_segment_done(self):
+        """Handles the SEGMENT_DONE message: queues the next loop without flushing."""
+        self.loop_count += 1
+        if not self.pipeline.seek(1.0, Gst.Format.TIME, Gst.SeekFlags.SEGMENT,
+                                  Gst.SeekType.SET, 0, Gst.SeekType.NONE, -1):
+            print("Error: segment seek failed, stopping the loop.")
+            self.enabled = False
+            return False
+        return True
+
+
+class LoopStallMeter:
+    """
+    Measures the output stall at loop boundaries.
+
+    A pad probe records the buffer arrival times; a loop boundary is detected by the PTS going back
+    (the source restarted from the beginning), and the gap before the first buffer of the new loop
+    is compared to the average frame interval.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_pts = None
+        self.last_time = None
+        self.avg_interval = None
+        self.stalls = []  # Extra delay at each loop boundary, in seconds
+
+    def attach(self, pad):
+        pad.add_probe(Gst.PadProbeType.BUFFER, self.buffer_probe)
+
+    def buffer_probe(self, pad, info):
+        buffer = info.get_buffer()
+        if buffer is None or buffer.pts == Gst.CLOCK_TIME_NONE:
+            return Gst.PadProbeReturn.OK
+        now = time.monotonic()
+        with self.lock:
+            if self.last_time is not None:
+                interval = now - self.last_time
+                if buffer.pts < self.last_pts:  # Loop boundary
+                    expected = self.avg_interval or interval
+                    stall = max(0.0, interval - expected)
+                    self.stalls.append(stall)
+                    print(f"Loop {len(self.stalls)}: boundary gap {interval * 1000:.1f} ms, "
+                          f"stall {stall * 1000:.1f} ms (avg frame interval {expected * 1000:.1f} ms)")
+                elif self.avg_interval is None:
+                    self.avg_interval = interval
+                else:
+                    self.avg_interval += INTERVAL_EMA_WEIGHT * (interval - self.avg_interval)
+            self.last_pts = buffer.pts
+            self.last_time = now
+        return Gst.PadProbeReturn.OK
+
+    def report(self):
+        with self.lock:
+            stalls = list(self.stalls)
+        if not stalls:
+            return
+        print(f"Loops: {len(stalls)}, boundary stall avg: {sum(stalls) / len(stalls) * 1000:.1f} ms, "
+              f"max: {max(stalls) * 1000:.1f} ms")
@@ -0,0 +1,210 @@
+import time
+import threading
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst, GLib
+
+# hailo_app_python/core/gstreamer/gstreamer_reconfigure.py
+
+from hailo_apps.hailo_app_python.core.gstreamer.gstreamer_helper_pipelines import (
+    get_source_type,
+    SOURCE_ELEMENT_PIPELINE,
+)
+
+# hailotracker properties which can be changed while the pipeline is running
+TRACKER_PROPERTIES = (
+    'class-id', 'kalman-dist-thr', 'iou-thr', 'init-iou-thr',
+    'keep-new-frames', 'keep-tracked-frames', 'keep-lost-frames', 'keep-past-metadata',
+)
+NMS_SCORE_THRESHOLD_PROPERTY = 'nms-score-threshold'
+NMS_IOU_THRESHOLD_PROPERTY = 'nms-iou-threshold'
+SOURCE_SWAP_OUTPUT_SUFFIX = "_swap_out"
+SOURCE_SWAP_BIN_SUFFIX = "_swap_bin"
+SOURCE_SWAP_LINK_SUFFIX = "_scale_q"  # First element after the source specific part of SOURCE_PIPELINE
+
+
+class PipelineReconfigurator:
+    """
+    Live reconfiguration of a running pipeline, without going through the NULL state.
+
+    Supported changes:
+    - Property updates on named elements (e.g. hailonet NMS thresholds, hailotracker parameters).
+    - Source switching: the source part of SOURCE_PIPELINE is blocked, replaced by a new source bin
+      and relinked, while the rest of the pipeline (and the loaded network) keeps running.
+    For every change the downtime is measured: the time from the request until the first buffer
+    produced with the new configuration.
+    """
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.lock = threading.Lock()
+        self.history = []  # (kind, target, downtime_ms)
+        self.swap_count = 0
+
+    def set_element_properties(self, element_name, properties):
+        """
+        Sets properties on a named element of the running pipeline.
+
+        Args:
+            element_name (str): The name of the element.
+            properties (dict): Property name (as in gst-inspect-1.0) to new value. Strings are converted to caps for caps properties.
+
+        Returns:
+            bool: True if all the properties were set.
+        """
+        element = self.pipeline.get_by_name(element_name)
+        if element is None:
+            print(f"Element {element_name} not found in the pipeline.")
+            return False
+        for prop in properties:
+            if element.find_property(prop) is None:
+                print(f"Element {element_name} has no property '{prop}'.")
+                return False
+
+        start_time = time.monotonic()
+        for prop, value in properties.items():
+            if isinstance(value, str) and element.find_property(prop).value_type == Gst.Caps.__gtype__:
+                value = Gst.Caps.from_string(value)
+            element.set_property(prop, value)
+            print(f"Updated {element_name} {prop} to: {element.get_property(prop)}")
+        self._measure_downtime('properties', element_name, element.get_static_pad("src"), start_time)
+        return True
+
+    def update_tracker(self, name='hailo_tracker', **params):
+        """
+        Updates hailotracker parameters. Takes the TRACKER_PIPELINE argument names, e.g. iou_thr=0.8.
+
+        Returns:
+            bool: True if the tracker was updated.
+        """
+        properties = {key.replace('_', '-'): value for key, value in params.items()}
+        unknown = [prop for prop in properties if prop not in TRACKER_PROPERTIES]
+        if unknown:
+            print(f"Unsupported tracker parameters: {unknown}")
+            return False
+        return self.set_element_properties(name, properties)
+
+    def update_nms_thresholds(self, score_threshold=None, iou_threshold=None, name='inference_hailonet'):
+        """
+        Updates the NMS thresholds of a hailonet with on-chip NMS.
+
+        Returns:
+            bool: True if the thresholds were updated.
+        """
+        properties = {}
+        if score_threshold is not None:
+            properties[NMS_SCORE_THRESHOLD_PROPERTY] = float(score_threshold)
+        if iou_threshold is not None:
+            properties[NMS_IOU_THRESHOLD_PROPERTY] = float(iou_threshold)
+        if not properties:
+            return False
+        return self.set_element_properties(name, properties)
+
+    def switch_source(self, video_source, video_width=640, video_height=640, name='source',
+                      no_webcam_compression=False, video_format='RGB'):
+        """
+        Replaces the source part of SOURCE_PIPELINE with a new source, using a pad-blocking swap.
+        The parameters match SOURCE_PIPELINE. The swap itself runs from the GLib main loop.
+
+        Returns:
+            bool: True if the swap was started.
+        """
+        if get_source_type(video_source) == 'rpi':
+            print("Switching to a Raspberry Pi camera source at runtime is not supported.")
+            return False
+        link_element = self.pipeline.get_by_name(f"{name}{SOURCE_SWAP_LINK_SUFFIX}")
+        if link_element is None:
+            print(f"Element {name}{SOURCE_SWAP_LINK_SUFFIX} not found in the pipeline, cannot switch source.")
+            return False
+        link_pad = link_element.get_static_pad("sink")
+        old_src_pad = link_pad.get_peer()
+        if old_src_pad is None:
+            print("Source is not linked, cannot switch source.")
+            return False
+
+        self.swap_count += 1
+        source_description = (
+            SOURCE_ELEMENT_PIPELINE(video_source, video_width, video_height, name=name,
+                                    no_webcam_compression=no_webcam_compression, video_format=video_format) +
+            f'identity name={name}{SOURCE_SWAP_OUTPUT_SUFFIX}'
+        )
+        start_time = time.monotonic()
+
+        def on_blocked(pad, info):
+            # Called from the streaming thread, the swap must run from another thread
+            GLib.idle_add(self._swap_source, old_src_pad, link_pad, source_description, name, video_source, start_time)
+            return Gst.PadProbeReturn.OK  # Keep the old source blocked until it is removed
+
+        old_src_pad.add_probe(Gst.PadProbeType.IDLE, on_blocked)
+        return True
+
+    def _swap_source(self, old_src_pad, link_pad, source_description, name, video_source, start_time):
+        old_elements = self._upstream_elements(old_src_pad)
+        old_src_pad.unlink(link_pad)
+        for element in old_elements:
+            element.set_state(Gst.State.NULL)  # Also releases the blocked streaming thread
+            self.pipeline.remove(element)
+
+        try:
+            new_bin = Gst.parse_bin_from_description(source_description, True)
+        except GLib.Error as e:
+            print(f"Error creating the new source: {e}")
+            return False
+        new_bin.set_name(f"{name}{SOURCE_SWAP_BIN_SUFFIX}{self.swap_count}")
+        self.pipeline.add(new_bin)
+        new_src_pad = new_bin.get_static_pad("src")
+        # The new source starts its timestamps from 0, shift them to the current running time
+        clock = self.pipeline.get_clock()
+        if clock is not None:
+            new_src_pad.set_offset(clock.get_time() - self.pipeline.get_base_time())
+        new_src_pad.link(link_pad)
+        new_bin.sync_state_with_parent()
+        print(f"Switched source to {video_source}")
+        self._measure_downtime('source', video_source, link_pad.get_parent_element().get_static_pad("src"), start_time)
+        return False  # Run once
+
+    def _upstream_elements(self, src_pad):
+        """Collects the pipeline children feeding src_pad (the source part of the pipeline)."""
+        elements = []
+        pending = [src_pad]
+        while pending:
+            pad = pending.pop()
+            element = pad.get_parent_element()
+            # Ghost pads of bins report the bin as parent, stop at the pipeline level children
+            while element is not None and element.get_parent() is not self.pipeline:
+                element = element.get_parent()
+            if element is None or element in elements:
+                continue
+            elements.append(element)
+            it = element.iterate_sink_pads()
+            while True:
+                result, sink_pad = it.next()
+                if result != Gst.IteratorResult.OK:
+                    break
+                peer = sink_pad.get_peer()
+                if peer is not None:
+                    pending.append(peer)
+        return elements
+
+    def _measure_downtime(self, kind, target, pad, start_time):
+        """Adds a one-shot probe reporting the time until the first buffer after the change."""
+        if pad is None:
+            return
+
+        def on_buffer(pad, info):
+            downtime_ms = (time.monotonic() - start_time) * 1000
+            with self.lock:
+                self.history.append((kind, target, downtime_ms))
+            print(f"Reconfiguration ({kind} {target}) downtime: {downtime_ms:.1f} ms")
+            return Gst.PadProbeReturn.REMOVE
+
+        pad.add_probe(Gst.PadProbeType.BUFFER, on_buffer)
+
+    def report(self):
+        with self.lock:
+            history = list(self.history)
+        if not history:
+            return
+        downtimes = [downtime for _, _, downtime in history]
+        print(f"Reconfigurations: {len(history)}, downtime avg: {sum(downtimes) / len(downtimes):.1f} ms, "
+              f"max: {max(downtimes):.1f} ms")
+
@@ -0,0 +1,96 @@
+# region imports
+# Standard library imports
+import logging
+
+# Third-party imports
+import numpy as np
+import pytest
+
+# Local application-specific imports
+from hailo_apps.hailo_app_python.core.common import calibration
+from hailo_apps.hailo_app_python.core.common.calibration import (
+    THRESHOLD_MAX, THRESHOLD_MIN, area_thresholds, margin_thresholds, segment_means, spread_areas)
+# endregion imports
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('test_calibration')
+
+DIM = 32
+DEFAULT_THRESHOLD = 0.5
+
+@pytest.fixture
+def gallery():
+    """Records with 0 to 12 samples around their own center, as (embeddings, offsets)."""
+    rng = np.random.default_rng(0)
+    counts = [5, 0, 1, 12, 2, 7, 3, 0, 9]
+    segments = [rng.standard_normal(DIM) + rng.uniform(0.05, 0.5) * rng.standard_normal((count, DIM)) for count in counts]
+    embeddings = np.concatenate(segments).astype(np.float32)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    return embeddings, offsets
+
+@pytest.fixture(params=[calibration.CALIBRATION_CHUNK_VALUES, 1])
+def chunk_values(request, monkeypatch):
+    """The default chunk size, and one record (one Gram matrix row) per chunk."""
+    monkeypatch.setattr(calibration, 'CALIBRATION_CHUNK_VALUES', request.param)
+    return request.param
+
+def naive_area(samples):
+    """The per-record PCA the calibration replaced: project on the top 2 covariance eigenvectors, pi * std * std."""
+    centered = samples - samples.mean(axis=0)
+    eigenvalues, eigenvectors = np.linalg.eigh(np.cov(centered, rowvar=False))
+    projected = centered @ eigenvectors[:, np.argsort(eigenvalues)[::-1][:2]]
+    std = np.std(projected, axis=0)
+    return np.pi * std[0] * std[1]
+
+def naive_margin(segments, default_threshold):
+    centroids = {index: samples.mean(axis=0) / np.linalg.norm(samples.mean(axis=0)) for index, samples in enumerate(segments) if len(samples)}
+    thresholds = []
+    for index, samples in enumerate(segments):
+        if index not in centroids or len(centroids) < 2:
+            thresholds.append(default_threshold)
+            continue
+        own = np.mean([sample @ centroids[index] / np.linalg.norm(sample) for sample in samples])
+        nearest_other = max(centroids[index] @ centroid for other, centroid in centroids.items() if other != index)
+        thresholds.append(np.clip((own + nearest_other) / 2, THRESHOLD_MIN, THRESHOLD_MAX))
+    return np.array(thresholds)
+
+def split(embeddings, offsets):
+    return [embeddings[offsets[i]:offsets[i + 1]].astype(np.float64) for i in range(len(offsets) - 1)]
+
+def test_segment_means(gallery):
+    embeddings, offsets = gallery
+    means, counts = segment_means(embeddings, offsets)
+    assert counts.tolist() == np.diff(offsets).tolist()
+    for mean, samples in zip(means, split(embeddings, offsets)):
+        np.testing.assert_allclose(mean, samples.mean(axis=0) if len(samples) else np.zeros(DIM), atol=1e-5)
+
+def test_spread_areas_match_the_per_record_pca(gallery, chunk_values):
+    embeddings, offsets = gallery
+    expected = [naive_area(samples) if len(samples) >= 2 else 0.0 for samples in split(embeddings, offsets)]
+    np.testing.assert_allclose(spread_areas(embeddings, offsets), expected, rtol=1e-4, atol=1e-7)
+
+def test_area_thresholds(gallery):
+    embeddings, offsets = gallery
+    areas = spread_areas(embeddings, offsets)
+    thresholds = area_thresholds(embeddings, offsets)
+    assert thresholds[np.argmin(areas)] == pytest.approx(THRESHOLD_MAX)
+    assert thresholds[np.argmax(areas)] == pytest.approx(THRESHOLD_MIN)
+    order = np.argsort(areas, kind='stable')
+    assert np.all(np.diff(thresholds[order]) <= 1e-12)  # The larger the spread, the lower the threshold
+
+def test_area_thresholds_of_equal_areas():
+    embeddings = np.ones((3, DIM), dtype=np.float32)
+    np.testing.assert_allclose(area_thresholds(embeddings, np.array([0, 1, 2, 3])), THRESHOLD_MAX)
+
+def test_margin_thresholds_match_a_naive_loop(gallery, chunk_values):
+    embeddings, offsets = gallery
+    expected = naive_margin(split(embeddings, offsets), DEFAULT_THRESHOLD)
+    np.testing.assert_allclose(margin_thresholds(embeddings, offsets, DEFAULT_THRESHOLD), expected, atol=1e-5)
+
+def test_margin_thresholds_of_a_single_record(gallery):
+    embeddings, offsets = gallery
+    thresholds = margin_thresholds(embeddings[:offsets[1]], offsets[:2], DEFAULT_THRESHOLD)
+    np.testing.assert_allclose(thresholds, [DEFAULT_THRESHOLD])
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
@@ -0,0 +1,97 @@
+# region imports
+# Standard library imports
+import json
+import logging
+import os
+
+# Third-party imports
+import lancedb
+import numpy as np
+import pytest
+from lancedb.pydantic import Vector, LanceModel
+
+# Local application-specific imports
+from hailo_apps.hailo_app_python.core.common.db_handler import DatabaseHandler, Record
+from hailo_apps.hailo_app_python.core.common.defines import EMBEDDING_DIM
+# endregion imports
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('test_db_migration')
+
+DB_NAME = 'test.db'
+TABLE_NAME = 'records'
+
+# The records schema before the samples table: the samples are a JSON list in the record, there are no running sums
+class SamplesJsonRecord(LanceModel):
+    global_id: str
+    label: str
+    avg_embedding: Vector(512)  # type: ignore
+    last_sample_recieved_time: int
+    samples_json: str
+    classificaiton_confidence_threshold: float
+    value: float = 0.0
+
+@pytest.fixture
+def legacy_database(tmp_path):
+    """A database written by the samples_json-era code, returns the expected samples per global ID."""
+    rng = np.random.default_rng(0)
+    database_dir = str(tmp_path / 'database')
+    os.makedirs(database_dir)
+    records, expected = [], {}
+    for index, num_samples in enumerate([3, 1, 0]):
+        global_id = f'record_{index}'
+        samples = [{'id': f'{global_id}_sample_{number}', 'embedding': rng.standard_normal(EMBEDDING_DIM).astype(np.float32).tolist(),
+                    'sample_path': f'{global_id}_{number}.jpeg'} for number in range(num_samples)]
+        expected[global_id] = samples
+        records.append(SamplesJsonRecord(
+            global_id=global_id, label=f'person_{index}',
+            avg_embedding=np.mean([sample['embedding'] for sample in samples], axis=0).tolist() if samples else np.zeros(EMBEDDING_DIM).tolist(),
+            last_sample_recieved_time=1000 + index, samples_json=json.dumps(samples), classificaiton_confidence_threshold=0.5))
+    db = lancedb.connect(uri=os.path.join(database_dir, DB_NAME))
+    table = db.create_table(TABLE_NAME, schema=SamplesJsonRecord)
+    table.add(records)
+    return database_dir, expected
+
+def open_database(tmp_path, database_dir):
+    return DatabaseHandler(db_name=DB_NAME, table_name=TABLE_NAME, schema=Record, threshold=0.5,
+                           database_dir=database_dir, samples_dir=str(tmp_path / 'samples'))
+
+def check_migrated(db_handler, expected):
+    assert 'samples_json' not in db_handler.tbl_records.schema.names
+    samples = db_handler.get_samples()
+    assert sum(len(record_samples) for record_samples in samples.values()) == sum(len(record_samples) for record_samples in expected.values())
+    for global_id, expected_samples in expected.items():
+        record = db_handler.get_record_by_id(global_id)
+        assert [sample['id'] for sample in record['samples']] == [sample['id'] for sample in expected_samples]  # Order kept
+        assert [sample['sample_path'] for sample in record['samples']] == [sample['sample_path'] for sample in expected_samples]
+        assert all(sample['timestamp'] == record['last_sample_recieved_time'] for sample in record['samples'])
+        assert record['num_samples'] == len(expected_samples)
+        expected_sum = np.sum([sample['embedding'] for sample in expected_samples], axis=0) if expected_samples else np.zeros(EMBEDDING_DIM)
+        np.testing.assert_allclose(record['embedding_sum'], expected_sum, atol=1e-5)
+        for sample, expected_sample in zip(record['samples'], expected_samples):
+            np.testing.assert_allclose(sample['embedding'], expected_sample['embedding'], atol=1e-6)
+
+def test_samples_json_migration(tmp_path, legacy_database):
+    database_dir, expected = legacy_database
+    check_migrated(open_database(tmp_path, database_dir), expected)
+
+def test_migration_runs_once(tmp_path, legacy_database):
+    """Reopening a migrated database neither duplicates the samples nor changes the running sums."""
+    database_dir, expected = legacy_database
+    open_database(tmp_path, database_dir)
+    check_migrated(open_database(tmp_path, database_dir), expected)
+
+def test_migrated_record_takes_new_samples(tmp_path, legacy_database):
+    database_dir, expected = legacy_database
+    db_handler = open_database(tmp_path, database_dir)
+    record = db_handler.get_record_by_id('record_0')
+    embedding = np.ones(EMBEDDING_DIM, dtype=np.float32)
+    db_handler.insert_new_sample(record, embedding, 'new.jpeg', 2000)
+    record = db_handler.get_record_by_id('record_0')
+    assert record['num_samples'] == 4
+    assert record['samples'][-1]['sample_path'] == 'new.jpeg'
+    expected_mean = np.mean([sample['embedding'] for sample in expected['record_0']] + [embedding], axis=0)
+    np.testing.assert_allclose(record['avg_embedding'], expected_mean, atol=1e-5)
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
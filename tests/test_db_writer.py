@@ -0,0 +1,120 @@
+# region imports
+# Standard library imports
+import logging
+
+# Third-party imports
+import numpy as np
+import pytest
+
+# Local application-specific imports
+from hailo_apps.hailo_app_python.core.common.db_handler import DatabaseHandler, Record
+from hailo_apps.hailo_app_python.core.common.db_writer import DatabaseWriter
+from hailo_apps.hailo_app_python.core.common.defines import EMBEDDING_DIM
+# endregion imports
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('test_db_writer')
+
+BATCH_DELAY = 5.0  # Long enough for all the mutations of a test to land in one batch
+FLUSH_TIMEOUT = 30.0
+
+def random_embedding(rng):
+    embedding = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+    return embedding / np.linalg.norm(embedding)
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+@pytest.fixture
+def db_handler(tmp_path):
+    return DatabaseHandler(db_name='test.db', table_name='records', schema=Record, threshold=0.5,
+                           database_dir=str(tmp_path / 'database'), samples_dir=str(tmp_path / 'samples'))
+
+@pytest.fixture
+def writer(db_handler):
+    writer = DatabaseWriter(db_handler, max_delay=BATCH_DELAY)
+    yield writer
+    writer.close(timeout=FLUSH_TIMEOUT)
+
+def test_flush_is_a_barrier(db_handler, writer, rng):
+    """The table reads see every mutation submitted before flush(), without waiting for the batch delay."""
+    embeddings = [random_embedding(rng) for _ in range(3)]
+    global_id = writer.create_record(embeddings[0], 'sample_0.jpeg', 1, label='Bob')
+    writer.insert_new_sample(global_id, embeddings[1], 'sample_1.jpeg', 2)
+    writer.insert_new_sample(global_id, embeddings[2], 'sample_2.jpeg', 3)
+    assert db_handler.get_record_by_id(global_id) is None  # Still in the queue: the batch waits for BATCH_DELAY
+    assert writer.flush(timeout=FLUSH_TIMEOUT)
+    record = db_handler.get_record_by_id(global_id)
+    assert record is not None
+    assert record['label'] == 'Bob'
+    assert record['num_samples'] == 3
+    assert record['last_sample_recieved_time'] == 3
+    assert [sample['sample_path'] for sample in record['samples']] == ['sample_0.jpeg', 'sample_1.jpeg', 'sample_2.jpeg']
+    np.testing.assert_allclose(record['avg_embedding'], np.mean(embeddings, axis=0), atol=1e-6)
+    assert writer.get_stats()['pending'] == 0
+    assert not writer.pending_centroids  # Committed: the table holds the running sum
+
+def test_delete_then_create_of_the_same_id(db_handler, writer, rng):
+    """create -> sample -> delete -> create of one global ID in one batch ends with the second record only."""
+    first, second, third = (random_embedding(rng) for _ in range(3))
+    global_id = writer.create_record(first, 'first.jpeg', 1, label='Bob')
+    writer.insert_new_sample(global_id, second, 'second.jpeg', 2)
+    writer.delete_record(global_id)
+    writer._submit('create', global_id, embedding=third, sample='third.jpeg', timestamp=3, label='Alice')  # Not reachable through create_record, which draws a new ID
+    assert writer.flush(timeout=FLUSH_TIMEOUT)
+    stats = writer.get_stats()
+    assert stats['batches'] == 2  # The batch is cut after the deletion followed by another mutation of the record
+    assert stats['committed'] == 4
+    assert stats['errors'] == 0
+    record = db_handler.get_record_by_id(global_id)
+    assert record['label'] == 'Alice'
+    assert record['num_samples'] == 1
+    assert [sample['sample_path'] for sample in record['samples']] == ['third.jpeg']
+    np.testing.assert_allclose(record['avg_embedding'], third, atol=1e-6)
+    assert len(db_handler.get_all_records()) == 1
+
+def test_sample_after_delete_is_dropped(db_handler, writer, rng):
+    global_id = writer.create_record(random_embedding(rng), 'first.jpeg', 1)
+    writer.delete_record(global_id)
+    writer.insert_new_sample(global_id, random_embedding(rng), 'second.jpeg', 2)
+    assert writer.flush(timeout=FLUSH_TIMEOUT)
+    assert db_handler.get_record_by_id(global_id) is None
+    assert db_handler.get_samples([global_id]) == {}
+
+def test_labels_of_existing_records(db_handler, writer, rng):
+    """Samples and labels of committed records are coalesced, the last label wins."""
+    global_id = writer.create_record(random_embedding(rng), 'first.jpeg', 1)
+    assert writer.flush(timeout=FLUSH_TIMEOUT)
+    writer.update_record_label(global_id, 'Bob')
+    writer.insert_new_sample(global_id, random_embedding(rng), 'second.jpeg', 2)
+    writer.update_record_label(global_id, 'Alice')
+    assert writer.flush(timeout=FLUSH_TIMEOUT)
+    record = db_handler.get_record_by_id(global_id)
+    assert record['label'] == 'Alice'
+    assert record['num_samples'] == 2
+    assert writer.get_stats()['batches'] == 2
+
+def test_embedding_cache_reads_its_writes(db_handler, writer, rng):
+    """The search sees a created record before it is committed."""
+    embedding = random_embedding(rng)
+    global_id = writer.create_record(embedding, 'first.jpeg', 1, label='Bob')
+    assert db_handler.get_record_by_id(global_id) is None
+    result = db_handler.search_record(embedding)
+    assert result['global_id'] == global_id
+    assert result['label'] == 'Bob'
+
+def test_failed_commit_invalidates_the_cache(db_handler, writer, rng, monkeypatch):
+    def failing_add_records_batch(new_records):
+        raise RuntimeError('disk full')
+    monkeypatch.setattr(db_handler, 'add_records_batch', failing_add_records_batch)
+    global_id = writer.create_record(random_embedding(rng), 'first.jpeg', 1)
+    assert writer.flush(timeout=FLUSH_TIMEOUT)
+    assert writer.get_stats()['errors'] == 1
+    assert not writer.pending_centroids
+    assert not db_handler.embedding_cache.valid  # Reloaded from the table on the next search
+    monkeypatch.undo()
+    assert global_id not in db_handler.get_embedding_cache().global_ids
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
@@ -0,0 +1,124 @@
+# region imports
+# Standard library imports
+import logging
+
+# Third-party imports
+import numpy as np
+import pytest
+
+# Local application-specific imports
+from hailo_apps.hailo_app_python.core.common.db_handler import DatabaseHandler, Record
+from hailo_apps.hailo_app_python.core.common.defines import EMBEDDING_DIM
+from hailo_apps.hailo_app_python.core.common.embedding_cache import INITIAL_CAPACITY, EmbeddingCache
+# endregion imports
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('test_embedding_cache')
+
+DIM = 16
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+def make_records(rng, count, dim=DIM):
+    return [{'global_id': f'id_{index}', 'label': f'person_{index}', 'avg_embedding': rng.standard_normal(dim),
+             'classificaiton_confidence_threshold': 0.5, 'last_sample_recieved_time': index} for index in range(count)]
+
+def brute_force(records, query, top_k):
+    """Cosine similarities of every record, best first."""
+    similarities = [(record['global_id'], float(np.dot(record['avg_embedding'], query) / np.linalg.norm(record['avg_embedding']) / np.linalg.norm(query)))
+                    for record in records]
+    return sorted(similarities, key=lambda item: -item[1])[:top_k]
+
+def check_search(cache, records, rng, top_k=3):
+    for _ in range(10):
+        query = rng.standard_normal(DIM) * 7.0  # Any scale
+        results = cache.search(query, top_k=top_k)
+        expected = brute_force(records, query, top_k)
+        assert [fields['global_id'] for fields, _ in results] == [global_id for global_id, _ in expected]
+        np.testing.assert_allclose([similarity for _, similarity in results], [similarity for _, similarity in expected], atol=1e-5)
+
+def test_search_matches_brute_force(rng):
+    records = make_records(rng, 2 * INITIAL_CAPACITY + 5)  # Grows the matrix twice
+    cache = EmbeddingCache(dim=DIM)
+    cache.load(records)
+    assert cache.valid
+    assert cache.size == len(records)
+    check_search(cache, records, rng)
+    check_search(cache, records, rng, top_k=len(records) + 10)  # More than the records: all of them
+
+def test_search_batch(rng):
+    records = make_records(rng, 20)
+    cache = EmbeddingCache(dim=DIM)
+    cache.load(records)
+    queries = rng.standard_normal((4, DIM))
+    for query, results in zip(queries, cache.search_batch(queries, top_k=2)):
+        single = cache.search(query, top_k=2)
+        assert [fields for fields, _ in results] == [fields for fields, _ in single]
+        np.testing.assert_allclose([similarity for _, similarity in results], [similarity for _, similarity in single], atol=1e-6)
+
+def test_empty_cache():
+    cache = EmbeddingCache(dim=DIM)
+    assert cache.search(np.ones(DIM)) == []
+    assert cache.search_batch(np.ones((2, DIM))) == [[], []]
+
+def test_remove_moves_the_last_row(rng):
+    records = make_records(rng, 10)
+    cache = EmbeddingCache(dim=DIM)
+    cache.load(records)
+    for global_id in ['id_3', 'id_9', 'id_0', 'missing']:
+        cache.remove(global_id)
+    records = [record for record in records if record['global_id'] not in ('id_3', 'id_9', 'id_0')]
+    assert sorted(cache.global_ids) == sorted(record['global_id'] for record in records)
+    assert all(cache.global_ids[row] == global_id for global_id, row in cache.rows.items())
+    assert cache.get('id_3') is None
+    assert cache.get('id_5')['label'] == 'person_5'
+    check_search(cache, records, rng)
+
+def test_upsert_updates_some_fields(rng):
+    records = make_records(rng, 5)
+    cache = EmbeddingCache(dim=DIM)
+    cache.load(records)
+    records[2]['avg_embedding'] = rng.standard_normal(DIM)
+    cache.upsert('id_2', avg_embedding=records[2]['avg_embedding'], timestamp=100)
+    cache.upsert('id_4', label='Bob', threshold=0.7)
+    assert cache.get('id_2') == {'global_id': 'id_2', 'label': 'person_2', 'last_sample_recieved_time': 100,
+                                 'classificaiton_confidence_threshold': 0.5}
+    assert cache.get('id_4')['label'] == 'Bob'
+    assert cache.get('id_4')['classificaiton_confidence_threshold'] == pytest.approx(0.7)
+    check_search(cache, records, rng)
+
+def test_partial_upsert_of_unknown_record_invalidates(rng):
+    cache = EmbeddingCache(dim=DIM)
+    cache.load(make_records(rng, 3))
+    cache.upsert('unknown', label='Bob')
+    assert not cache.valid
+    assert cache.get('unknown') is None
+
+def test_zero_embedding_does_not_divide_by_zero():
+    cache = EmbeddingCache(dim=DIM)
+    cache.upsert('zero', avg_embedding=np.zeros(DIM), label='Unknown', threshold=0.5, timestamp=0)
+    results = cache.search(np.ones(DIM))
+    assert results[0][1] == 0.0
+
+def test_handler_keeps_the_cache_in_sync(tmp_path, rng):
+    """After write-through mutations the cache holds what a reload from the table would."""
+    db_handler = DatabaseHandler(db_name='test.db', table_name='records', schema=Record, threshold=0.5,
+                                 database_dir=str(tmp_path / 'database'), samples_dir=str(tmp_path / 'samples'))
+    embeddings = rng.standard_normal((4, EMBEDDING_DIM)).astype(np.float32)
+    records = [db_handler.create_record(embedding, f'sample_{index}.jpeg', index) for index, embedding in enumerate(embeddings)]
+    db_handler.insert_new_sample(db_handler.get_record_by_id(records[0]['global_id']), embeddings[1], 'extra.jpeg', 10)
+    db_handler.update_record_label(records[1]['global_id'], 'Bob')
+    db_handler.update_record_classificaiton_confidence_threshold(records[2]['global_id'], 0.8)
+    db_handler.delete_record(records[3]['global_id'])
+    cache = db_handler.get_embedding_cache()
+    reloaded = EmbeddingCache()
+    reloaded.load(db_handler.tbl_records.to_arrow().to_pylist())
+    assert sorted(cache.global_ids) == sorted(reloaded.global_ids)
+    for global_id in reloaded.global_ids:
+        assert cache.get(global_id) == reloaded.get(global_id)
+        np.testing.assert_allclose(cache.matrix[cache.rows[global_id]], reloaded.matrix[reloaded.rows[global_id]], atol=1e-6)
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])
@@ -0,0 +1,91 @@
+# region imports
+# Standard library imports
+import logging
+import random
+import time
+
+# Third-party imports
+import pytest
+
+# Local application-specific imports
+from hailo_apps.hailo_app_python.core.common.telegram_handler import ExpiringIdSet
+# endregion imports
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('test_expiring_id_set')
+
+TTL = 10.0
+
+def test_suppressed_within_ttl():
+    ids = ExpiringIdSet(ttl=TTL)
+    assert ids.check_and_add('a', now=0.0)
+    assert not ids.check_and_add('a', now=TTL)  # The TTL is inclusive
+    assert ids.check_and_add('b', now=1.0)
+    assert ids.check_and_add('a', now=TTL + 0.5)
+    assert ids.stats['suppressed'] == 1
+
+def test_suppression_does_not_refresh():
+    """A suppressed identity keeps its first notification time."""
+    ids = ExpiringIdSet(ttl=TTL)
+    assert ids.check_and_add('a', now=0.0)
+    assert not ids.check_and_add('a', now=9.0)
+    assert ids.check_and_add('a', now=10.5)
+
+def test_expired_entries_are_swept():
+    ids = ExpiringIdSet(ttl=TTL)
+    for index in range(5):
+        ids.check_and_add(f'id_{index}', now=float(index))
+    assert len(ids) == 5
+    ids.check_and_add('late', now=13.5)  # id_0 ... id_3 are older than the TTL
+    assert len(ids) == 2
+    assert ids.stats['expired'] == 4
+
+def test_renotified_identity_moves_to_the_end():
+    ids = ExpiringIdSet(ttl=TTL)
+    ids.check_and_add('a', now=0.0)
+    ids.check_and_add('b', now=5.0)
+    ids.check_and_add('a', now=11.0)  # Expired, swept, then added again at the end
+    ids.check_and_add('c', now=15.5)  # b expires, a does not
+    assert list(ids.sent_times) == ['a', 'c']
+
+def test_shorter_ttl_per_call():
+    ids = ExpiringIdSet(ttl=TTL)
+    ids.check_and_add('a', now=0.0)
+    assert not ids.check_and_add('a', ttl=5.0, now=4.0)
+    assert ids.check_and_add('a', ttl=5.0, now=6.0)
+    assert not ids.check_and_add('a', ttl=100.0, now=15.0)  # Capped to the set's TTL
+
+def test_max_ids_evicts_the_oldest():
+    ids = ExpiringIdSet(ttl=TTL, max_ids=3)
+    for index in range(5):
+        assert ids.check_and_add(f'id_{index}', now=0.0)
+    assert list(ids.sent_times) == ['id_2', 'id_3', 'id_4']
+    assert ids.stats['evicted'] == 2
+    assert ids.check_and_add('id_0', now=1.0)  # Forgotten: notified again
+
+def test_get_stats():
+    ids = ExpiringIdSet(ttl=TTL)
+    now = time.monotonic()
+    ids.check_and_add('a', now=now - 2 * TTL)
+    ids.check_and_add('b', now=now)
+    ids.check_and_add('b', now=now)
+    stats = ids.get_stats()
+    assert stats == {'expired': 1, 'evicted': 0, 'suppressed': 1, 'size': 1}
+
+def test_matches_a_naive_model():
+    """Random checks against a dict of the last notification times, without sweeping or eviction."""
+    rng = random.Random(0)
+    ids = ExpiringIdSet(ttl=TTL)
+    sent_times = {}
+    now = 0.0
+    for _ in range(5000):
+        now += rng.uniform(0.0, 0.5)
+        identity = rng.randrange(50)
+        expected = identity not in sent_times or now - sent_times[identity] > TTL
+        if expected:
+            sent_times[identity] = now
+        assert ids.check_and_add(identity, now=now) == expected
+        assert len(ids) == sum(now - sent_time <= TTL for sent_time in sent_times.values())
+
+if __name__ == "__main__":
+    pytest.main(["-v", __file__])